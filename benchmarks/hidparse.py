@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Measures how long it takes to decode HID reports using scc.lib.hidparse.
+
+Fields are described by report descriptor read from given file, which may
+be copied from /sys/class/hidraw/hidrawN/device/report_descriptor. Decoded
+are reports recorded by starting daemon with SCC_RECORD environment variable
+set (see benchmarks/replay.py) or, if no recording is given, random reports.
+Without descriptor, one of joystick with unaligned 10bit axes is used.
+
+Reported is time per report, in microseconds, for decoding every field with
+its own Parser.decode call and with CompiledParsers.
+
+Usage: python3 benchmarks/hidparse.py [--descriptor FILE] [recording ...]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from scc import replay
+from scc.lib.hidparse import CompiledParsers, make_parsers
+
+# Joystick with 10 buttons, 10bit X and Y axes, 8bit throttle and hatswitch
+DESCRIPTOR = bytes([
+	0x05, 0x01, 0x09, 0x04, 0xA1, 0x01,
+	0x05, 0x09, 0x19, 0x01, 0x29, 0x0A, 0x15, 0x00, 0x25, 0x01,
+	0x75, 0x01, 0x95, 0x0A, 0x81, 0x02,
+	0x05, 0x01, 0x09, 0x30, 0x09, 0x31, 0x26, 0xFF, 0x03,
+	0x75, 0x0A, 0x95, 0x02, 0x81, 0x02,
+	0x09, 0x36, 0x26, 0xFF, 0x00, 0x75, 0x08, 0x95, 0x01, 0x81, 0x02,
+	0x09, 0x39, 0x25, 0x07, 0x75, 0x04, 0x95, 0x01, 0x81, 0x42,
+	0xC0,
+])
+
+
+def decode_each(parsers, reports):
+	for data in reports:
+		for p in parsers:
+			p.decode(data)
+
+
+def decode_compiled(parsers, reports):
+	decode = CompiledParsers(parsers).decode
+	for data in reports:
+		decode(data)
+
+
+def bench(fn, parsers, reports, repeat):
+	""" Returns time per report in seconds """
+	best = None
+	for i in range(repeat):
+		start = time.perf_counter()
+		fn(parsers, reports)
+		duration = time.perf_counter() - start
+		best = duration if best is None else min(best, duration)
+	return best / max(1, len(reports))
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Measures HID report decoding")
+	parser.add_argument("recordings", nargs="*", help="files recorded with SCC_RECORD")
+	parser.add_argument("--descriptor", help="file with raw HID report descriptor")
+	parser.add_argument("--reports", type=int, default=100000,
+		help="number of random reports")
+	parser.add_argument("--repeat", type=int, default=3)
+	args = parser.parse_args()
+
+	descriptor = DESCRIPTOR
+	if args.descriptor:
+		with open(args.descriptor, "rb") as f:
+			descriptor = f.read()
+	size, parsers = make_parsers(descriptor)
+
+	reports = []
+	for filename in args.recordings:
+		for stream in replay.load(filename):
+			reports += [ memoryview(data) for t, data in stream.packets if len(data) >= size ]
+	if not reports:
+		rnd = random.Random(1)
+		reports = [ memoryview(bytes(rnd.getrandbits(8) for x in range(size)))
+			for i in range(args.reports) ]
+
+	print("%i fields in %i byte report, %i reports" % (len(parsers), size, len(reports)))
+	print("%-12s %12s" % ("decoder", "us/report"))
+	for name, fn in (("each", decode_each), ("compiled", decode_compiled)):
+		print("%-12s %12.3f" % (name, bench(fn, parsers, reports, args.repeat) * 1e6))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Measures how long it takes to parse action strings.
+
+Every action string found in default_profiles/ and default_menus/ (or in
+given profile and menu files) is split to tokens and parsed, both with
+ActionParser and with tokenize module that ActionParser used before.
+
+Reported is time per single action string, in microseconds, and number of
+action strings processed per second.
+
+Usage: python3 benchmarks/parser.py [--repeat N] [file ...]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from scc import parser as scc_parser
+from scc.parser import ActionParser, ParseError
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+DEFAULT_FILES = (
+	glob.glob(os.path.join(ROOT, "default_profiles", "*.sccprofile"))
+	+ glob.glob(os.path.join(ROOT, "default_menus", "*.menu"))
+)
+
+
+class TokenizeActionParser(ActionParser):
+	""" ActionParser splitting strings to tokens using tokenize module """
+
+	def restart(self, s):
+		if type(s) is bytes:
+			s = s.decode("utf-8")
+		self.tokens = scc_parser._tokenize(s)
+		self.index = 0
+		return self
+
+
+def find_actions(data, rv):
+	""" Collects every action string from loaded profile or menu """
+	if isinstance(data, dict):
+		for key, value in data.items():
+			if key == "action" and isinstance(value, str):
+				rv.append(value)
+			else:
+				find_actions(value, rv)
+	elif isinstance(data, list):
+		for value in data:
+			find_actions(value, rv)
+	return rv
+
+
+def parse_all(p, strings):
+	for s in strings:
+		try:
+			p.restart(s).parse()
+		except ParseError:
+			pass
+
+
+def bench(name, fn, strings, repeat):
+	start = time.perf_counter()
+	for i in range(repeat):
+		fn(strings)
+	duration = (time.perf_counter() - start) / repeat / len(strings)
+	print("%-20s %10.2f %12.0f" % (name, duration * 1e6, 1.0 / duration))
+	return duration
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Measures action parsing")
+	parser.add_argument("files", nargs="*", help="profile or menu files")
+	parser.add_argument("--repeat", type=int, default=200, metavar="N",
+		help="parse every string N times")
+	args = parser.parse_args()
+
+	strings = []
+	for filename in args.files or sorted(DEFAULT_FILES):
+		with open(filename, "r") as f:
+			find_actions(json.loads(f.read()), strings)
+	if not strings:
+		print("No action strings found")
+		return 1
+	print("%s action strings, %.1f characters on average" % (
+		len(strings), sum(len(s) for s in strings) / len(strings)))
+
+	new, old = ActionParser(), TokenizeActionParser()
+	tokenize_all = lambda strings: [ scc_parser._tokenize(s) for s in strings ]
+	lex_all = lambda strings: [ scc_parser._lex(s) for s in strings ]
+	print("%-20s %10s %12s" % ("", "us/action", "actions/s"))
+	t_old = bench("tokenize", tokenize_all, strings, args.repeat)
+	t_new = bench("lexer", lex_all, strings, args.repeat)
+	p_old = bench("parse (tokenize)", lambda s: parse_all(old, s), strings, args.repeat)
+	p_new = bench("parse (lexer)", lambda s: parse_all(new, s), strings, args.repeat)
+	print("speedup: tokens %.1fx, parse %.1fx" % (t_old / t_new, p_old / p_new))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Replays recorded controller input through drivers and Mapper.
+
+Input is recorded by starting daemon with SCC_RECORD environment variable
+set to name of output file, for example:
+
+	SCC_RECORD=/tmp/input.scrc scc-daemon debug
+
+Every recorded controller is then replayed with every given profile
+(all profiles from default_profiles/ by default) and following is reported:
+
+	frames/s  - packets processed per second
+	p50..max  - time spent processing single packet, in microseconds
+	alloc     - average peak of memory allocated while processing one packet
+	blocks    - average number of memory blocks left allocated after packet
+	events    - number of events that were sent to emulated devices
+
+Without recording, '--synthetic N' generates N packets of Steam Controller
+input with all sticks, pads, triggers and gyro moving and buttons
+being pressed.
+
+Usage: python3 benchmarks/replay.py [--synthetic N] [--save file]
+			[--profile file ...] [recording ...]
+"""
+import argparse
+import glob
+import logging
+import math
+import os
+import sys
+import time
+import tracemalloc
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from scc import replay
+from scc.constants import SCButtons
+from scc.drivers.sc_dongle import SCInput, SCStatus
+from scc.parser import ActionParser
+from scc.profile import Profile
+
+DEFAULT_PROFILES = os.path.join(os.path.dirname(__file__), "..", "default_profiles")
+PERCENTILES = (50, 90, 99)
+BUTTONS = (SCButtons.A, SCButtons.B, SCButtons.LB, SCButtons.RB,
+	SCButtons.LPADTOUCH, SCButtons.RPADTOUCH)
+
+
+def synthetic_stream(count):
+	""" Generates Steam Controller input, one packet per millisecond """
+	stream = replay.Stream("sc", "sc", None)
+	state = SCInput()
+	state.status = SCStatus.INPUT
+	for i in range(count):
+		a = i * 0.01
+		state.seq = i & 0xFFFF
+		state.buttons = sum(b for n, b in enumerate(BUTTONS) if (i >> (6 + n)) & 1)
+		state.ltrig = int(127 + 127 * math.sin(a))
+		state.rtrig = int(127 + 127 * math.cos(a))
+		state.lpad_x = state.rpad_x = int(20000 * math.sin(a))
+		state.lpad_y = state.rpad_y = int(20000 * math.cos(a))
+		state.gpitch = int(1000 * math.sin(a * 3))
+		state.groll = int(1000 * math.cos(a * 3))
+		state.gyaw = int(500 * math.sin(a * 5))
+		state.q1, state.q2, state.q3, state.q4 = 32767, 0, 0, 0
+		stream.packets.append((i * 0.001, bytes(state)))
+	return stream
+
+
+def load_profile(filename):
+	profile = Profile(ActionParser()).load(filename)
+	profile.compress()
+	return profile
+
+
+def bench_time(stream, profile):
+	""" Returns array of per-packet durations in seconds and event count """
+	durations = array("d")
+	perf_counter = time.perf_counter
+	def measure(step, data):
+		start = perf_counter()
+		step(data)
+		durations.append(perf_counter() - start)
+
+	r = replay.Replayer(stream, profile)
+	r.replay(measure)
+	return durations, r.get_event_count()
+
+
+def bench_alloc(stream, profile):
+	"""
+	Returns average peak of memory allocated per packet, in bytes, and
+	average number of blocks that stayed allocated.
+	"""
+	peaks = [ 0 ]
+	def measure(step, data):
+		tracemalloc.reset_peak()
+		before = tracemalloc.get_traced_memory()[0]
+		step(data)
+		peaks[0] += tracemalloc.get_traced_memory()[1] - before
+
+	r = replay.Replayer(stream, profile)
+	blocks = sys.getallocatedblocks()
+	tracemalloc.start()
+	try:
+		r.replay(measure)
+	finally:
+		tracemalloc.stop()
+	blocks = sys.getallocatedblocks() - blocks
+	count = max(1, len(stream.packets))
+	return peaks[0] / count, blocks / count
+
+
+def report(name, stream, profile_name, profile_file):
+	durations, events = bench_time(stream, load_profile(profile_file))
+	alloc, blocks = bench_alloc(stream, load_profile(profile_file))
+	count = len(durations)
+	if count == 0:
+		return
+	values = sorted(durations)
+	total = sum(values)
+	row = [ "%.0f" % (count / total,) ]
+	for p in PERCENTILES:
+		row.append("%.1f" % (values[min(count - 1, count * p // 100)] * 1e6,))
+	row.append("%.1f" % (values[-1] * 1e6,))
+	row += [ "%.0fB" % (alloc,), "%.2f" % (blocks,), str(events) ]
+	print("%-12s %-32s %10s %8s %8s %8s %8s %8s %7s %8s" % tuple(
+		[ name, profile_name[:32] ] + row))
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Replays recorded controller input")
+	parser.add_argument("recordings", nargs="*", help="files recorded with SCC_RECORD")
+	parser.add_argument("--profile", action="append", help="profile to replay with")
+	parser.add_argument("--synthetic", type=int, metavar="N",
+		help="generate N packets of Steam Controller input")
+	parser.add_argument("--save", metavar="FILE", help="save synthetic input to FILE")
+	args = parser.parse_args()
+	# Replayed mapper has no daemon to handle special actions and complains
+	logging.basicConfig(level=logging.ERROR)
+
+	streams = []
+	for filename in args.recordings:
+		streams += [ ("%s#%s" % (os.path.basename(filename), i), s)
+			for i, s in enumerate(replay.load(filename)) ]
+	if args.synthetic or not streams:
+		stream = synthetic_stream(args.synthetic or 10000)
+		if args.save:
+			replay.save(args.save, [ stream ])
+		streams.append(("synthetic", stream))
+
+	profiles = args.profile or sorted(glob.glob(os.path.join(DEFAULT_PROFILES, "*.sccprofile")))
+	print("%-12s %-32s %10s %8s %8s %8s %8s %8s %7s %8s" % (
+		"input", "profile", "frames/s", "p50", "p90", "p99", "max",
+		"alloc", "blocks", "events"))
+	for name, stream in streams:
+		for filename in profiles:
+			try:
+				report(name, stream, os.path.basename(filename).rsplit(".", 1)[0], filename)
+			except ValueError as e:
+				print("%-12s %s" % (name, e))
+				break
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""Measures cost and accuracy of gyro sensor fusion.
+
+Sensor data are taken from DS4 and DS5 input recorded by starting daemon
+with SCC_RECORD environment variable set (see benchmarks/replay.py) or, if
+no recording is given, from synthetic trace of controller being waved
+around, with gyro bias and noise added.
+
+Reported is time per sample, in microseconds, for SensorFusion and for
+trigonometric gyro integration that DS5 driver used before. For synthetic
+trace, where real orientation is known, also reported is average and
+maximal error of computed tilt, in degrees, after first 5 seconds.
+
+Usage: python3 benchmarks/sensor_fusion.py [--seconds N] [recording ...]
+"""
+import argparse
+import math
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from scc import replay
+from scc.sensor_fusion import ACCEL_RES_PER_G, GYRO_RES_IN_DEG_SEC, SensorClock, SensorFusion
+
+RATE = 250
+# Raw gyro (x, y, z) and accelerometer (x, y, z), sensor timestamp, its size
+# in bits and resolution in USB reports
+SENSORS = {
+	"ds4": (struct.Struct("<13x6h"), struct.Struct("<10xH"), 16, 16.0 / 3.0 / 1000000.0),
+	"ds5": (struct.Struct("<16x6h"), struct.Struct("<28xI"), 32, 1.0 / 3.0 / 1000000.0),
+}
+
+
+class TrigIntegration:
+	""" Gyro integration as done by DS5 driver before SensorFusion was used """
+
+	def __init__(self):
+		self.quat = (1.0, 0.0, 0.0, 0.0)
+
+
+	def update(self, pitch, yaw, roll, accel_x, accel_y, accel_z, dt):
+		yaw_rad = yaw / GYRO_RES_IN_DEG_SEC * dt * math.pi / 180.0
+		pitch_rad = pitch / GYRO_RES_IN_DEG_SEC * dt * math.pi / 180.0
+		roll_rad = roll / GYRO_RES_IN_DEG_SEC * dt * math.pi / 180.0
+		qx = math.sin(roll_rad/2) * math.cos(pitch_rad/2) * math.cos(yaw_rad/2) - math.cos(roll_rad/2) * math.sin(pitch_rad/2) * math.sin(yaw_rad/2)
+		qy = math.cos(roll_rad/2) * math.sin(pitch_rad/2) * math.cos(yaw_rad/2) + math.sin(roll_rad/2) * math.cos(pitch_rad/2) * math.sin(yaw_rad/2)
+		qz = math.cos(roll_rad/2) * math.cos(pitch_rad/2) * math.sin(yaw_rad/2) - math.sin(roll_rad/2) * math.sin(pitch_rad/2) * math.cos(yaw_rad/2)
+		qw = math.cos(roll_rad/2) * math.cos(pitch_rad/2) * math.cos(yaw_rad/2) + math.sin(roll_rad/2) * math.sin(pitch_rad/2) * math.sin(yaw_rad/2)
+		(old_qw, old_qx, old_qy, old_qz) = self.quat
+		self.quat = (
+			old_qw * qw - old_qx * qx - old_qy * qy - old_qz * qz,
+			old_qw * qx + old_qx * qw + old_qy * qz - old_qz * qy,
+			old_qw * qy - old_qx * qz + old_qy * qw + old_qz * qx,
+			old_qw * qz + old_qx * qy - old_qy * qx + old_qz * qw,
+		)
+
+
+def _qmul(a, b):
+	return (
+		a[0] * b[0] - a[1] * b[1] - a[2] * b[2] - a[3] * b[3],
+		a[0] * b[1] + a[1] * b[0] + a[2] * b[3] - a[3] * b[2],
+		a[0] * b[2] - a[1] * b[3] + a[2] * b[0] + a[3] * b[1],
+		a[0] * b[3] + a[1] * b[2] - a[2] * b[1] + a[3] * b[0],
+	)
+
+
+def _gravity(q):
+	""" Direction of gravity in controller axes """
+	w, x, y, z = q
+	return (2 * (x * z - w * y), 2 * (w * x + y * z), w * w - x * x - y * y + z * z)
+
+
+def synthetic_trace(seconds):
+	"""
+	Returns list of samples (pitch, yaw, roll, accel_x, accel_y, accel_z, dt)
+	and list of real orientations of controller after every sample.
+	"""
+	def orientation(t):
+		def rotation(x, y, z, angle):
+			s = math.sin(angle / 2)
+			return (math.cos(angle / 2), x * s, y * s, z * s)
+		q = rotation(0, 0, 1, 2.0 * math.sin(0.3 * t))
+		q = _qmul(q, rotation(0, 1, 0, 0.8 * math.sin(0.9 * t + 1)))
+		return _qmul(q, rotation(1, 0, 0, 0.7 * math.sin(1.7 * t)))
+
+	rnd = random.Random(1)
+	bias = [ rnd.uniform(-30, 30) for x in range(3) ]
+	dt = 1.0 / RATE
+	scale = 180.0 / math.pi * GYRO_RES_IN_DEG_SEC
+	samples, truth = [], []
+	q = orientation(0.0)
+	for i in range(int(seconds * RATE)):
+		next = orientation((i + 1) * dt)
+		w, x, y, z = _qmul((q[0], -q[1], -q[2], -q[3]), next)
+		vx, vy, vz = _gravity(next)
+		samples.append((
+			2.0 * y / dt * scale + bias[0] + rnd.gauss(0, 4),
+			2.0 * z / dt * scale + bias[1] + rnd.gauss(0, 4),
+			2.0 * x / dt * scale + bias[2] + rnd.gauss(0, 4),
+			(-vy + rnd.gauss(0, 0.02)) * ACCEL_RES_PER_G,
+			(-vx + rnd.gauss(0, 0.02)) * ACCEL_RES_PER_G,
+			(vz + rnd.gauss(0, 0.02)) * ACCEL_RES_PER_G,
+			dt,
+		))
+		truth.append(next)
+		q = next
+	return samples, truth
+
+
+def recorded_trace(stream):
+	""" Returns list of samples from recorded DS4 or DS5 stream """
+	sensors, timestamp, bits, resolution = SENSORS[stream.driver]
+	clock = SensorClock(bits, resolution)
+	samples = []
+	for t, data in stream.packets:
+		if len(data) < max(sensors.size, timestamp.size):
+			continue
+		(gx, gy, gz, ax, ay, az) = sensors.unpack_from(data)
+		# Axes changed to match Steam Controller, same as in drivers
+		samples.append((gx, -gy, -gz, ax * 2, az * -2, ay * 2,
+			clock.get_delta(timestamp.unpack_from(data)[0])))
+	return samples
+
+
+def bench_time(cls, samples, repeat):
+	""" Returns time per sample in seconds """
+	best = None
+	for i in range(repeat):
+		f = cls()
+		update = f.update
+		start = time.perf_counter()
+		for sample in samples:
+			update(*sample)
+		duration = time.perf_counter() - start
+		best = duration if best is None else min(best, duration)
+	return best / max(1, len(samples))
+
+
+def tilt_errors(samples, truth, **kwargs):
+	""" Returns average and maximal tilt error in degrees """
+	f = SensorFusion(**kwargs)
+	f.qw, f.qx, f.qy, f.qz = truth[0]
+	errors = []
+	for i, sample in enumerate(samples):
+		f.update(*sample)
+		if i >= RATE * 5:
+			a, b = _gravity(truth[i]), _gravity((f.qw, f.qx, f.qy, f.qz))
+			dot = max(-1.0, min(1.0, sum(x * y for x, y in zip(a, b))))
+			errors.append(math.degrees(math.acos(dot)))
+	if not errors:
+		return 0.0, 0.0
+	return sum(errors) / len(errors), max(errors)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Measures gyro sensor fusion")
+	parser.add_argument("recordings", nargs="*", help="files recorded with SCC_RECORD")
+	parser.add_argument("--seconds", type=int, default=120,
+		help="length of synthetic trace")
+	parser.add_argument("--repeat", type=int, default=3)
+	args = parser.parse_args()
+
+	traces = []
+	for filename in args.recordings:
+		traces += [ ("%s#%s" % (os.path.basename(filename), i), recorded_trace(s), None)
+			for i, s in enumerate(replay.load(filename)) if s.driver in SENSORS ]
+	if not traces:
+		samples, truth = synthetic_trace(args.seconds)
+		traces.append(("synthetic", samples, truth))
+
+	print("%-16s %8s %12s %12s %10s %10s %10s" % ("input", "samples",
+		"fusion us", "trig us", "err avg", "err max", "gyro err"))
+	for name, samples, truth in traces:
+		row = [ name, len(samples),
+			bench_time(SensorFusion, samples, args.repeat) * 1e6,
+			bench_time(TrigIntegration, samples, args.repeat) * 1e6 ]
+		if truth:
+			avg, max_ = tilt_errors(samples, truth)
+			row += [ "%.2f" % (avg,), "%.2f" % (max_,),
+				"%.2f" % (tilt_errors(samples, truth, kp=0.0)[1],) ]
+		else:
+			row += [ "-", "-", "-" ]
+		print("%-16s %8s %12.2f %12.2f %10s %10s %10s" % tuple(row))
+
+
+if __name__ == "__main__":
+	main()
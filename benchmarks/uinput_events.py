@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of uinput event generation.
+
+Measures per-event cost of generating gamepad events. Events are written to
+/dev/null instead of real uinput device, so no permissions are needed and
+only cost of getting events from Python to write() is measured.
+
+	before   - one unprototyped libuinput call per event, with every
+			   argument wrapped in new ctypes object
+	buffered - UInput.axisEvent / relEvent, one write() per synEvent
+	emit     - UInput.emit with prepared array('i'), one write() per synEvent
+
+Usage: python3 benchmarks/uinput_events.py [frames]
+"""
+import ctypes
+import os
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from scc.tools import find_library
+from scc.uinput import EV_ABS, EV_REL, Axes, Rels, UInput
+
+# Events in one frame; roughly what mouse + gyro + stick generate
+FRAME = [ (EV_ABS, Axes.ABS_X), (EV_ABS, Axes.ABS_Y), (EV_ABS, Axes.ABS_RX),
+	(EV_ABS, Axes.ABS_RY), (EV_REL, Rels.REL_X), (EV_REL, Rels.REL_Y) ]
+
+
+def bench_before(fd, frames):
+	# Separate CDLL instance, so prototypes declared by _load_library
+	# don't apply
+	lib = ctypes.CDLL(find_library("libuinput")._name)
+	for i in range(frames):
+		for type, code in FRAME:
+			if type == EV_ABS:
+				lib.uinput_abs(fd, ctypes.c_uint16(code), ctypes.c_int32(i))
+			else:
+				lib.uinput_rel(fd, ctypes.c_uint16(code), ctypes.c_int32(i))
+		lib.uinput_syn(fd)
+
+
+def bench_buffered(fd, frames):
+	dev = UInput.from_fd(fd)
+	for i in range(frames):
+		for type, code in FRAME:
+			if type == EV_ABS:
+				dev.axisEvent(code, i)
+			else:
+				dev.relEvent(code, i)
+		dev.synEvent()
+
+
+def bench_emit(fd, frames):
+	dev = UInput.from_fd(fd)
+	# Prepared once; emit doesn't skip repeated ABS values
+	events = array("i", [ x for type, code in FRAME for x in (type, code, 1) ])
+	for i in range(frames):
+		dev.emit(events)
+		dev.synEvent()
+
+
+def main():
+	frames = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+	events = frames * len(FRAME)
+	fd = os.open(os.devnull, os.O_WRONLY)
+	try:
+		for name, fn in (("before", bench_before), ("buffered", bench_buffered), ("emit", bench_emit)):
+			start = time.perf_counter()
+			fn(fd, frames)
+			elapsed = time.perf_counter() - start
+			print("%-10s %8.3f us/event  %8.3f us/frame" % (
+				name, elapsed * 1e6 / events, elapsed * 1e6 / frames))
+	finally:
+		os.close(fd)
+
+
+if __name__ == "__main__":
+	main()
@@ -35,6 +35,8 @@ class Config:
 			"ds4drv": True,			# At least one of hiddrv or evdevdrv has to be enabled as well
 			"ds5drv": True,
 		},
+		"evdev_automap": False,		# If True, evdev gamepads that were not registered
+									# in GUI are configured using gamecontrollerdb
 		"fix_xinput" : True,		# If True, attempt is done to deatach emulated controller
 									# from 'Virtual core pointer' core device.
 		"gui": {
@@ -5,7 +5,10 @@ init(daemon) methods from every module that defines it.
 
 Drivers then can use daemon.add_mainloop() method to add code that should
 be run in every mainloop iteration and daemon.add_controller() to add and
-daemon.remove_controller() to remove Controller instances.
+daemon.remove_controller() to remove Controller instances. Mainloop iterates
+only when some file descriptor registered in poller becomes ready, scheduled
+task is due or daemon.wakeup() is called, so code that has to run
+periodically should schedule itself using daemon.get_scheduler() instead.
 
 Additionaly, start(daemon) method is called from each module that defines it
 just before daemon startup is complete.
@@ -8,6 +8,7 @@ import logging
 import sys
 from typing import TYPE_CHECKING
 
+from scc import replay
 from scc.constants import STICK_PAD_MAX, STICK_PAD_MIN, ControllerFlags, SCButtons
 from scc.drivers.evdevdrv import (
 	HAVE_EVDEV,
@@ -31,6 +32,7 @@ from scc.drivers.hiddrv import (
 	hiddrv_test,
 )
 from scc.drivers.usb import register_hotplug_device
+from scc.sensor_fusion import SensorClock
 from scc.tools import init_logging, set_logging_level
 
 if TYPE_CHECKING:
@@ -64,8 +66,7 @@ class DS4Controller(HIDController):
 		SCButtons.CPADPRESS,
 	)
 
-	flags = ( ControllerFlags.EUREL_GYROS
-			| ControllerFlags.HAS_RSTICK
+	flags = ( ControllerFlags.HAS_RSTICK
 			| ControllerFlags.HAS_CPAD
 			| ControllerFlags.HAS_DPAD
 			| ControllerFlags.SEPARATE_STICK
@@ -146,10 +147,15 @@ class DS4Controller(HIDController):
 				self._decoder.buttons.button_map[x] = self.button_to_bit(sc)
 
 		self._packet_size = 64
+		# Sensor timestamp is 16bit number, increasing every 16/3 us
+		self._sensor_clock = SensorClock(16, 16.0 / 3.0 / 1000000.0)
 
 	def input(self, endpoint: int, data: bytearray) -> None:
+		if replay.recorder is not None:
+			replay.recorder.packet(self, "ds4", data)
 		# Special override for CPAD touch button
 		if _lib.decode(ctypes.byref(self._decoder), bytes(data)):
+			self._fuse_ds4_gyro(self._sensor_clock.get_delta(data[10] | (data[11] << 8)))
 			if self.mapper:
 				if data[35] >> 7:
 					# cpad is not touched
@@ -268,6 +274,7 @@ class DS4EvdevController(EvdevController):
 			config['buttons'] = DS4EvdevController.BUTTON_MAP_OLD
 		self._gyro = gyro
 		self._touchpad = touchpad
+		self._gyro_dropped = self._touchpad_dropped = False
 		for device in (self._gyro, self._touchpad):
 			if device:
 				device.grab()
@@ -278,63 +285,57 @@ class DS4EvdevController(EvdevController):
 
 
 	def _gyro_input(self, *a):
-		new_state = self._state
+		new_state = self._pending
 		try:
 			for event in self._gyro.read():
-				if event.type == self.ECODES.EV_ABS:
+				if event.type == self.ECODES.EV_SYN:
+					self._gyro_dropped = self.syn(event.code, self._gyro_dropped)
+				elif self._gyro_dropped:
+					continue
+				elif event.type == self.ECODES.EV_ABS:
 					axis, factor = DS4EvdevController.GYRO_MAP[event.code]
 					if axis:
-						new_state = new_state._replace(
-								**{ axis : int(event.value * factor) })
+						setattr(new_state, axis, int(event.value * factor))
+						self._dirty = True
 		except OSError:
 			# Errors here are not even reported, evdev class handles important ones
 			return
 
-		if new_state is not self._state:
-			old_state, self._state = self._state, new_state
-			if self.mapper:
-				self.mapper.input(self, old_state, new_state)
-
 
 	def _touchpad_input(self, *a):
-		new_state = self._state
+		new_state = self._pending
 		try:
 			for event in self._touchpad.read():
-				if event.type == self.ECODES.EV_ABS:
+				if event.type == self.ECODES.EV_SYN:
+					self._touchpad_dropped = self.syn(event.code, self._touchpad_dropped)
+				elif self._touchpad_dropped:
+					continue
+				elif event.type == self.ECODES.EV_ABS:
 					if event.code == self.ECODES.ABS_MT_POSITION_X:
 						value = event.value * DS4EvdevController.TOUCH_FACTOR_X
-						value = STICK_PAD_MIN + int(value)
-						new_state = new_state._replace(cpad_x = value)
+						new_state.cpad_x = STICK_PAD_MIN + int(value)
+						self._dirty = True
 					elif event.code == self.ECODES.ABS_MT_POSITION_Y:
 						value = event.value * DS4EvdevController.TOUCH_FACTOR_Y
-						value = STICK_PAD_MAX - int(value)
-						new_state = new_state._replace(cpad_y = value)
-				elif event.type == 0:
-					pass
+						new_state.cpad_y = STICK_PAD_MAX - int(value)
+						self._dirty = True
 				elif event.code == self.ECODES.BTN_LEFT:
 					if event.value == 1:
-						b = new_state.buttons | SCButtons.CPADPRESS
-						new_state = new_state._replace(buttons = b)
+						new_state.buttons |= SCButtons.CPADPRESS
 					else:
-						b = new_state.buttons & ~SCButtons.CPADPRESS
-						new_state = new_state._replace(buttons = b)
+						new_state.buttons &= ~SCButtons.CPADPRESS
+					self._dirty = True
 				elif event.code == self.ECODES.BTN_TOUCH:
 					if event.value == 1:
-						b = new_state.buttons | SCButtons.CPADTOUCH
-						new_state = new_state._replace(buttons = b)
+						new_state.buttons |= SCButtons.CPADTOUCH
 					else:
-						b = new_state.buttons & ~SCButtons.CPADTOUCH
-						new_state = new_state._replace(buttons = b,
-								cpad_x = 0, cpad_y = 0)
+						new_state.buttons &= ~SCButtons.CPADTOUCH
+						new_state.cpad_x, new_state.cpad_y = 0, 0
+					self._dirty = True
 		except OSError:
 			# Errors here are not even reported, evdev class handles important ones
 			return
 
-		if new_state is not self._state:
-			old_state, self._state = self._state, new_state
-			if self.mapper:
-				self.mapper.input(self, old_state, new_state)
-
 
 	def close(self):
 		EvdevController.close(self)
@@ -5,13 +5,14 @@ Extends HID driver with DS5-specific options.
 
 import ctypes
 import logging
-import math
 import os
+import struct
 import sys
 import time
 import zlib
 from enum import IntEnum
 
+from scc import replay
 from scc.constants import (
 	OUTPUT_360_STICK_MAX,
 	OUTPUT_360_STICK_MIN,
@@ -48,6 +49,7 @@ from scc.drivers.hiddrv import (
 from scc.drivers.usb import register_hotplug_device
 from scc.lib.hidraw import HIDRaw
 from scc.sccdaemon import SCCDaemon
+from scc.sensor_fusion import SensorClock, SensorFusion
 from scc.tools import init_logging, set_logging_level
 
 log = logging.getLogger("DS5")
@@ -185,6 +187,98 @@ ICON_COLORS = [
 	(1.0, 0.0, 1.0),  # 6
 ]
 
+# Input report sent by DS5 over Bluetooth, with sticks, triggers, three bytes
+# of buttons, gyro (pitch, yaw, roll), accelerometer (x, z, y) and first
+# touch on touchpad. Rest of report is not used.
+BT_INPUT_REPORT_ID = 0x31
+BT_INPUT_REPORT_SIZE = 78
+BT_INPUT_REPORT = struct.Struct("<2x6Bx3B5x6h5x4B")
+# Raw gyro (x, y, z), accelerometer (x, y, z) and sensor timestamp
+BT_SENSORS = struct.Struct("<17x6hI")
+# Sensor timestamp in report received over USB
+DS5_SENSOR_TIMESTAMP = struct.Struct("<28xI")
+
+
+def _stick_axis_scale(value, invert=False):
+	result = value - 128
+	tempRatio = (result / 127.0) if (value >= 128) else (result / (128.0))
+	if invert:
+		tempRatio = -tempRatio
+
+	tempRatio = (tempRatio + 1.0) * 0.5
+	return int(tempRatio * STICK_PAD_RES + STICK_PAD_MIN)
+
+
+def _button_table(bits, mask=0xFF):
+	"""
+	Returns table translating every value of report byte to SCButtons.
+	'bits' maps bit number to button; bits not in 'mask' are ignored.
+	"""
+	return tuple(
+		sum([ int(button) for bit, button in bits.items() if value & mask & (1 << bit) ])
+		for value in range(256)
+	)
+
+
+# Lookup tables used to decode report, indexed by byte from report.
+# Low 4 bits of 1st button byte are dpad; 8 means that nothing is pressed
+BT_BUTTONS_1 = tuple(
+	buttons if value & 0x0F == 8 else buttons | SCButtons.LPAD | SCButtons.LPADTOUCH
+	for value, buttons in enumerate(_button_table({
+		7: SCButtons.Y, 6: SCButtons.B, 5: SCButtons.A, 4: SCButtons.X,
+	}))
+)
+BT_BUTTONS_2 = _button_table({
+	7: SCButtons.RPAD, 6: SCButtons.STICKPRESS, 5: SCButtons.START,
+	4: SCButtons.BACK, 3: SCButtons.RT, 2: SCButtons.LT,
+	1: SCButtons.RB, 0: SCButtons.LB,
+})
+BT_BUTTONS_3 = _button_table({ 0: SCButtons.C, 1: SCButtons.CPADPRESS })
+# Highest bit of touch byte is set while touchpad is _not_ touched
+BT_TOUCH = tuple(0 if value & 0x80 else int(SCButtons.CPADTOUCH) for value in range(256))
+# (x, y) values, indexed by low 4 bits of 1st button byte
+BT_DPAD = (
+	(0, STICK_PAD_MAX),					# Up
+	(STICK_PAD_MAX, STICK_PAD_MAX),		# UpRight
+	(STICK_PAD_MAX, 0),					# Right
+	(STICK_PAD_MAX, STICK_PAD_MIN),		# DownRight
+	(0, STICK_PAD_MIN),					# Down
+	(STICK_PAD_MIN, STICK_PAD_MIN),		# DownLeft
+	(STICK_PAD_MIN, 0),					# Left
+	(STICK_PAD_MIN, STICK_PAD_MAX),		# UpLeft
+) + ((0, 0),) * 8						# Centered
+BT_STICK_AXIS = tuple(_stick_axis_scale(value, False) for value in range(256))
+BT_STICK_AXIS_INVERTED = tuple(_stick_axis_scale(value, True) for value in range(256))
+
+
+def decode_bt_input(data, state):
+	"""
+	Decodes input report received over Bluetooth into DualSenseBTControllerInput.
+	All fields but quaternion are overwritten, so same state object can be
+	reused for every report.
+	"""
+	(lx, ly, rx, ry, state.ltrig, state.rtrig, b1, b2, b3,
+		state.gpitch, gyaw, groll, accel_x, accel_z, accel_y,
+		touch, c1, c2, c3) = BT_INPUT_REPORT.unpack_from(data)
+	state.stick_x = BT_STICK_AXIS[lx]
+	state.stick_y = BT_STICK_AXIS_INVERTED[ly]
+	state.rpad_x = BT_STICK_AXIS[rx]
+	state.rpad_y = BT_STICK_AXIS_INVERTED[ry]
+	state.buttons = BT_BUTTONS_1[b1] | BT_BUTTONS_2[b2] | BT_BUTTONS_3[b3] | BT_TOUCH[touch]
+	state.lpad_x, state.lpad_y = BT_DPAD[b1 & 0x0F]
+	# Change gyro dir values to match Steam Controller
+	state.gyaw = -gyaw
+	state.groll = -groll
+	# Change accel axes to match Steam Controller (flip pitch and roll)
+	# Scale values for 2G instead of 1G. Pitch is inverted
+	state.accel_x = accel_x * 2
+	state.accel_y = accel_y * -2
+	state.accel_z = accel_z * 2
+	state.cpad_x = ((c2 & 0x0F) << 8) | c1
+	state.cpad_y = ((c3 & 0x0F) << 4) | (c2 >> 4)
+	return state
+
+
 
 class DS5Controller(HIDController):
 	# Most of axes are the same
@@ -206,7 +300,6 @@ class DS5Controller(HIDController):
 	)
 
 	flags = (
-		ControllerFlags.EUREL_GYROS |
 		ControllerFlags.HAS_RSTICK |
 		ControllerFlags.HAS_CPAD |
 		ControllerFlags.HAS_DPAD |
@@ -341,10 +434,15 @@ class DS5Controller(HIDController):
 				self._decoder.buttons.button_map[x] = self.button_to_bit(sc)
 
 		self._packet_size = 64
+		# Sensor timestamp is 32bit number, increasing every 1/3 us
+		self._sensor_clock = SensorClock(32, 1.0 / 3.0 / 1000000.0)
 
 	def input(self, endpoint: int, data: bytearray) -> None:
+		if replay.recorder is not None:
+			replay.recorder.packet(self, "ds5", data)
 		# Special override for CPAD touch button
 		if _lib.decode(ctypes.byref(self._decoder), bytes(data)):
+			self._fuse_ds4_gyro(self._sensor_clock.get_delta(DS5_SENSOR_TIMESTAMP.unpack_from(data)[0]))
 			if self.mapper:
 				if data[33] >> 7:
 					# cpad is not touched
@@ -446,6 +544,7 @@ class DS5Controller(HIDController):
 
 	def schedule_output(self, output_id, output):
 		self._outputs[output_id] = output
+		self.request_flush()
 
 	def flush(self):
 		super(DS5Controller, self).flush()
@@ -480,39 +579,6 @@ class DS5HidRawDriver:
 
 
 class DS5HidRawController(Controller):
-	class _DPadOutputValues:
-		def __init__(self, x, y):
-			self.x = x
-			self.y = y
-
-	"""# (x, y) values
-	DPAD_STATE_TYPES = {
-		0: (0, STICK_PAD_MAX), # Up
-		1: (STICK_PAD_MAX, STICK_PAD_MAX), # UpRight
-		2: (STICK_PAD_MAX, 0), # Right
-		3: (STICK_PAD_MAX, STICK_PAD_MIN), # DownRight
-		4: (0, STICK_PAD_MIN), # Down
-		5: (STICK_PAD_MIN, STICK_PAD_MIN), # DownLeft
-		6: (STICK_PAD_MIN, 0), # Left
-		7: (STICK_PAD_MIN, STICK_PAD_MAX), # UpLeft
-		8: (0, 0) # Centered
-	}
-	"""
-
-	# (x, y) values
-	DPAD_STATE_TYPES = {
-		0: _DPadOutputValues(0, STICK_PAD_MAX), # Up
-		1: _DPadOutputValues(STICK_PAD_MAX, STICK_PAD_MAX), # UpRight
-		2: _DPadOutputValues(STICK_PAD_MAX, 0), # Right
-		3: _DPadOutputValues(STICK_PAD_MAX, STICK_PAD_MIN), # DownRight
-		4: _DPadOutputValues(0, STICK_PAD_MIN), # Down
-		5: _DPadOutputValues(STICK_PAD_MIN, STICK_PAD_MIN), # DownLeft
-		6: _DPadOutputValues(STICK_PAD_MIN, 0), # Left
-		7: _DPadOutputValues(STICK_PAD_MIN, STICK_PAD_MAX), # UpLeft
-		8: _DPadOutputValues(0, 0) # Centered
-	}
-
-	DPAD_CENTERED_STATE = _DPadOutputValues(0, 0)
 	# Leading byte not included in sent output report data.
 	# Needed to add for proper CRC32 computation that controller
 	# will accept
@@ -522,8 +588,7 @@ class DS5HidRawController(Controller):
 	# report data (for IMU calibration data)
 	BT_CALIBRATION_CRC32_HEAD = b"\xA3"
 
-	flags = ( ControllerFlags.EUREL_GYROS
-			| ControllerFlags.HAS_RSTICK
+	flags = ( ControllerFlags.HAS_RSTICK
 			| ControllerFlags.HAS_CPAD
 			| ControllerFlags.HAS_DPAD
 			| ControllerFlags.SEPARATE_STICK
@@ -548,20 +613,27 @@ class DS5HidRawController(Controller):
 		)
 		self._feedback_cancel_task = None
 		self._outputs = {}
-		# Use empty struct for starting state
+		# '_state' and '_old_state' are passed to mapper and swapped
+		# with every report, so decoding never overwrites state that
+		# mapper still uses as old one
+		self._state = DualSenseBTControllerInput()
 		self._old_state = DualSenseBTControllerInput()
+		self._report = bytearray(BT_INPUT_REPORT_SIZE)
+		self._spare_report = bytearray(BT_INPUT_REPORT_SIZE)
 
 		self._device_name = hidrawdev.getName()
 		self._hidrawdev = hidrawdev
 		self._fileno = hidrawdev._device.fileno()
 		self._id = self._generate_id() if driver else "-"
-		self._previous_quat = [1.0, 0.0, 0.0, 0.0]
-		self._delta_time = time.time()
-		self._previous_time = time.time()
+		self._fusion = SensorFusion()
+		# Sensor timestamp is 32bit number, increasing every 1/3 us
+		self._sensor_clock = SensorClock(32, 1.0 / 3.0 / 1000000.0)
 
 		#time.sleep(1)
 		self._set_operational()
 		self.read_serial()
+		# Reports are read directly from descriptor, until there is none left
+		os.set_blocking(self._fileno, False)
 		#self.configure()
 		self._poller = self.daemon.get_poller()
 		if self._poller:
@@ -707,174 +779,38 @@ class DS5HidRawController(Controller):
 		self._feedback_cancel_task = self.mapper.schedule(duration, clear_feedback)
 
 	def _input(self, *a):
-		#log.debug("FOUND INPUT")
-		tempdata = self._hidrawdev.read(78)
-		# Skip over packet if not a DS5 mode input packet
-		if tempdata[0] != 0x31:
+		# Reads every report that is already waiting, so reports don't pile
+		# up when controller sends them faster than daemon wakes up. Only
+		# newest report is passed to mapper, but sensor data from all of
+		# them is used to compute orientation.
+		received = False
+		while True:
+			try:
+				size = os.readv(self._fileno, (self._spare_report,))
+			except BlockingIOError:
+				break
+			if size == 0:
+				break
+			# Skip over packet if not a DS5 mode input packet
+			if size >= BT_INPUT_REPORT.size and self._spare_report[0] == BT_INPUT_REPORT_ID:
+				(gx, gy, gz, ax, ay, az, timestamp) = BT_SENSORS.unpack_from(self._spare_report)
+				# Axes changed to match Steam Controller, same as in decode_bt_input
+				self._fusion.update(gx, -gy, -gz, ax * 2, az * -2, ay * 2,
+					self._sensor_clock.get_delta(timestamp))
+				self._report, self._spare_report = self._spare_report, self._report
+				received = True
+		if not received:
 			return
 
-		#log.debug(tempdata)
-		old_state = self._old_state
-		current_time = time.time()
-		self._delta_time = current_time - self._previous_time
-		#hamtaro = DualSenseHIDInputBT.from_buffer_copy(tempdata)
-		#log.debug("LX: {} {}".format(hamtaro.lx, tempdata[2]))
-		state_data = self._convert_input_data(tempdata)
-		"""print("INPUT [", end="")
-		for index, value in enumerate(tempdata):
-			print("[{},{}]".format(index, value), end=", ")
-
-		print("")
-		"""
+		self._old_state, self._state = self._state, self._old_state
+		state = decode_bt_input(self._report, self._state)
+		state.q1, state.q2, state.q3, state.q4 = self._fusion.get_quaternion()
 
-		#log.debug(self._hidrawdev._device)
-		#self.flush()
-		#self.close()
 		if self.mapper:
-			self.mapper.input(self, old_state, state_data)
-
-		self._old_state = state_data
+			self.mapper.input(self, self._old_state, state)
 		# Check for pending output data
 		self.flush()
 
-		self._previous_time = current_time
-
-	def _convert_input_data(self, data):
-		state = DualSenseBTControllerInput()
-		state.stick_x = self._stick_axis_scale(data[2], False)
-		state.stick_y = self._stick_axis_scale(data[3], True)
-		state.rpad_x = self._stick_axis_scale(data[4], False)
-		state.rpad_y = self._stick_axis_scale(data[5], True)
-		state.ltrig = data[6]
-		state.rtrig = data[7]
-		tempbyte = data[9]
-		if (tempbyte & (1 << 7)) != 0:
-			state.buttons |= SCButtons.Y
-		if (tempbyte & (1 << 6)) != 0:
-			state.buttons |= SCButtons.B
-		if (tempbyte & (1 << 5)) != 0:
-			state.buttons |= SCButtons.A
-		if (tempbyte & (1 << 4)) != 0:
-			state.buttons |= SCButtons.X
-		dpad_state = data[9] & 0x0F
-		if (dpad_state != 8):
-			state.buttons |= SCButtons.LPAD | SCButtons.LPADTOUCH
-			tempDPad = DS5HidRawController.DPAD_STATE_TYPES.get(dpad_state,
-				DS5HidRawController.DPAD_CENTERED_STATE)
-			state.lpad_x = tempDPad.x
-			state.lpad_y = tempDPad.y
-
-		tempbyte = data[10]
-		if (tempbyte & (1 << 7)) != 0:
-			state.buttons |= SCButtons.RPAD
-		if (tempbyte & (1 << 6)) != 0:
-			state.buttons |= SCButtons.STICKPRESS
-		if (tempbyte & (1 << 5)) != 0:
-			state.buttons |= SCButtons.START
-		if (tempbyte & (1 << 4)) != 0:
-			state.buttons |= SCButtons.BACK
-		if (tempbyte & (1 << 3)) != 0:
-			state.buttons |= SCButtons.RT
-		if (tempbyte & (1 << 2)) != 0:
-			state.buttons |= SCButtons.LT
-		if (tempbyte & (1 << 1)) != 0:
-			state.buttons |= SCButtons.RB
-		if (tempbyte & (1 << 0)) != 0:
-			state.buttons |= SCButtons.LB
-
-		tempbyte = data[11]
-		if (tempbyte & (1 << 0)) != 0:
-			state.buttons |= SCButtons.C
-		if (tempbyte & (1 << 1)) != 0:
-			state.buttons |= SCButtons.CPADPRESS
-
-		# Change gyro dir values to match Steam Controller
-		state.gpitch = ctypes.c_int16((data[18] << 8) | data[17]).value
-		state.gyaw = ctypes.c_int16((data[20] << 8) | data[19]).value * -1
-		state.groll = ctypes.c_int16((data[22] << 8) | data[21]).value * -1
-
-		# Change accel axes to match Steam Controller (flip pitch and roll)
-		# Scale values for 2G instead of 1G
-		state.accel_x = ctypes.c_int16((data[24] << 8) | data[23]).value * 2
-		# Invert pitch
-		state.accel_y = ctypes.c_int16((data[28] << 8) | data[27]).value * -2
-		state.accel_z = ctypes.c_int16((data[26] << 8) | data[25]).value * 2
-		#print("GYRO: {} {} {}".format(state.gyaw, state.gpitch, state.groll))
-		#print("ACCEL: {} | {} | {}".format(state.accel_x, state.accel_y, state.accel_z))
-		# Calculate quaternion for gyro data. Needed for tilt controls output.
-		# TODO: Try to add sensor fusion and complementary filter later
-		self._calculate_quaternion(state)
-
-		# Check for CPAD touch
-		if (data[34] & 0x80) == 0:
-			state.buttons |= SCButtons.CPADTOUCH
-
-		state.cpad_x = ((data[36] & 0x0F) << 8) | data[35]
-		state.cpad_y = ((data[37] & 0x0F) << 4) | ((data[36] & 0xF0) >> 4)
-
-		return state
-
-	def _stick_axis_scale(self, value, invert=False, test=False):
-		result = value - 128
-		tempRatio = (result / 127.0) if (value >= 128) else (result / (128.0))
-		if invert:
-			tempRatio = -tempRatio
-
-		tempRatio = (tempRatio + 1.0) * 0.5
-
-		"""if test:
-			print(tempRatio)
-			print("RES {}".format(STICK_PAD_RES))
-			print(tempRatio * STICK_PAD_RES + STICK_PAD_MIN)
-		"""
-		result = int(tempRatio * STICK_PAD_RES + STICK_PAD_MIN)
-		return result
-
-	def _calculate_quaternion(self, state):
-		# Convert raw gyro values to degrees per second
-		GYRO_RES_IN_DEG_SEC = 16
-		(yaw, pitch, roll) = ((state.gyaw / GYRO_RES_IN_DEG_SEC),
-			(state.gpitch / GYRO_RES_IN_DEG_SEC),
-			(state.groll / GYRO_RES_IN_DEG_SEC))
-
-		# Remove time delta element to get gyro angles and convert to radians
-		old_yaw = yaw
-		yaw = yaw * self._delta_time
-		yaw_rad = yaw * math.pi / 180.0
-		pitch = pitch * self._delta_time
-		pitch_rad = pitch *  math.pi / 180.0
-		roll = roll * self._delta_time
-		roll_rad = roll * math.pi / 180.0
-		#print("GYRO: {} {} {}".format(yaw, pitch, roll))
-		#print("GYRO: {} | {} | {} | {} | {}".format(state.gyaw, old_yaw, yaw, yaw_rad, self._delta_time))
-
-		# Obtain current quaternion
-		# qx (Roll), qy (Pitch), qz (Yaw), qw (Theta)
-		qx = math.sin(roll_rad/2) * math.cos(pitch_rad/2) * math.cos(yaw_rad/2) - math.cos(roll_rad/2) * math.sin(pitch_rad/2) * math.sin(yaw_rad/2)
-		qy = math.cos(roll_rad/2) * math.sin(pitch_rad/2) * math.cos(yaw_rad/2) + math.sin(roll_rad/2) * math.cos(pitch_rad/2) * math.sin(yaw_rad/2)
-		qz = math.cos(roll_rad/2) * math.cos(pitch_rad/2) * math.sin(yaw_rad/2) - math.sin(roll_rad/2) * math.sin(pitch_rad/2) * math.cos(yaw_rad/2)
-		qw = math.cos(roll_rad/2) * math.cos(pitch_rad/2) * math.cos(yaw_rad/2) + math.sin(roll_rad/2) * math.sin(pitch_rad/2) * math.sin(yaw_rad/2)
-
-		# Multiply previous calculated quaternion by new quaternion
-		(old_qw, old_qx, old_qy, old_qz) = self._previous_quat
-		Q0Q1_w = old_qw * qw - old_qx * qx - old_qy * qy - old_qz * qz
-		Q0Q1_x = old_qw * qx + old_qx * qw + old_qy * qz - old_qz * qy
-		Q0Q1_y = old_qw * qy - old_qx * qz + old_qy * qw + old_qz * qx
-		Q0Q1_z = old_qw * qz + old_qx * qy - old_qy * qx + old_qz * qw
-
-		# Convert normalized values to mapper expected range and store
-		# in state object
-		# q1 (Theta), q2 (Pitch), q3 (Roll), q4 (Yaw)
-		state.q1 = int(Q0Q1_w * 32767.0)
-		state.q2 = int(Q0Q1_y * 32767.0)
-		state.q3 = int(Q0Q1_x * 32767.0)
-		# Invert Yaw to match Steam Controller
-		state.q4 = int(Q0Q1_z * -32767.0)
-		# Store calculated quaternion for next poll
-		self._previous_quat = [Q0Q1_w, Q0Q1_x, Q0Q1_y, Q0Q1_z]
-		#print("TEST QUAT: {}".format(self._previous_quat))
-		#print("TEST QUAT Z: {}".format(self._previous_quat[3] * -1))
-
 	def close(self):
 		if self._poller:
 			self._poller.unregister(self._fileno)
@@ -894,7 +830,9 @@ class DS5HidRawController(Controller):
 		while self._outputs:
 			output_id, output = self._outputs.popitem()
 			#print("PAYLOAD {} {}".format(output_id, output))
-			self._hidrawdev.write(output)
+			# Written directly to descriptor, as reports are read from it
+			# without file object, which would otherwise keep it buffered
+			os.write(self._fileno, output)
 			#time.sleep(0.1)
 			#print("")
 
@@ -1080,6 +1018,7 @@ class DS5EvdevController(EvdevController):
 		# 	config['buttons'] = DS4EvdevController.BUTTON_MAP_OLD
 		self._gyro = gyro
 		self._touchpad = touchpad
+		self._gyro_dropped = self._touchpad_dropped = False
 		for device in (self._gyro, self._touchpad):
 			if device:
 				device.grab()
@@ -1089,65 +1028,56 @@ class DS5EvdevController(EvdevController):
 			self.poller.register(gyro.fd, self.poller.POLLIN, self._gyro_input)
 
 	def _gyro_input(self, *a):
-		new_state = self._state
+		new_state = self._pending
 		try:
 			for event in self._gyro.read():
-				if event.type == self.ECODES.EV_ABS:
+				if event.type == self.ECODES.EV_SYN:
+					self._gyro_dropped = self.syn(event.code, self._gyro_dropped)
+				elif self._gyro_dropped:
+					continue
+				elif event.type == self.ECODES.EV_ABS:
 					axis, factor = DS5EvdevController.GYRO_MAP[event.code]
 					if axis:
-						new_state = new_state._replace(
-							**{axis: int(event.value * factor)}
-						)
+						setattr(new_state, axis, int(event.value * factor))
+						self._dirty = True
 		except OSError:
 			# Errors here are not even reported, evdev class handles important ones
 			return
 
-		if new_state is not self._state:
-			old_state, self._state = self._state, new_state
-			if self.mapper:
-				self.mapper.input(self, old_state, new_state)
-
 	def _touchpad_input(self, *a):
-		new_state = self._state
+		new_state = self._pending
 		try:
 			for event in self._touchpad.read():
-				if event.type == self.ECODES.EV_ABS:
+				if event.type == self.ECODES.EV_SYN:
+					self._touchpad_dropped = self.syn(event.code, self._touchpad_dropped)
+				elif self._touchpad_dropped:
+					continue
+				elif event.type == self.ECODES.EV_ABS:
 					if event.code == self.ECODES.ABS_MT_POSITION_X:
 						value = event.value * DS5EvdevController.TOUCH_FACTOR_X
-						value = STICK_PAD_MIN + int(value)
-						new_state = new_state._replace(cpad_x=value)
+						new_state.cpad_x = STICK_PAD_MIN + int(value)
+						self._dirty = True
 					elif event.code == self.ECODES.ABS_MT_POSITION_Y:
 						value = event.value * DS5EvdevController.TOUCH_FACTOR_Y
-						value = STICK_PAD_MAX - int(value)
-						new_state = new_state._replace(cpad_y=value)
-				elif event.type == 0:
-					pass
+						new_state.cpad_y = STICK_PAD_MAX - int(value)
+						self._dirty = True
 				elif event.code == self.ECODES.BTN_LEFT:
 					if event.value == 1:
-						b = new_state.buttons | SCButtons.CPADPRESS
-						new_state = new_state._replace(buttons=b)
+						new_state.buttons |= SCButtons.CPADPRESS
 					else:
-						b = new_state.buttons & ~SCButtons.CPADPRESS
-						new_state = new_state._replace(buttons=b)
+						new_state.buttons &= ~SCButtons.CPADPRESS
+					self._dirty = True
 				elif event.code == self.ECODES.BTN_TOUCH:
 					if event.value == 1:
-						b = new_state.buttons | SCButtons.CPADTOUCH
-						new_state = new_state._replace(buttons=b)
+						new_state.buttons |= SCButtons.CPADTOUCH
 					else:
-						b = new_state.buttons & ~SCButtons.CPADTOUCH
-						new_state = new_state._replace(
-							buttons=b,
-							cpad_x=0, cpad_y=0
-							)
+						new_state.buttons &= ~SCButtons.CPADTOUCH
+						new_state.cpad_x, new_state.cpad_y = 0, 0
+					self._dirty = True
 		except OSError:
 			# Errors here are not even reported, evdev class handles important ones
 			return
 
-		if new_state is not self._state:
-			old_state, self._state = self._state, new_state
-			if self.mapper:
-				self.mapper.input(self, old_state, new_state)
-
 	def close(self):
 		EvdevController.close(self)
 		for device in (self._gyro, self._touchpad):
@@ -1,13 +1,15 @@
 """Universal driver for gamepads managed by evdev
 
-Handles no devices by default. Instead of trying to guess which evdev device
-is a gamepad and which user actually wants to be handled by SCC, list of enabled
-devices is read from config file.
+Handles devices that have configuration file, created when device is
+registered in GUI. If 'evdev_automap' option is enabled, gamepads without one
+are configured using mapping from gamecontrollerdb, if they are listed there.
 """
 
 from evdev import InputDevice
+from scc import replay
 from scc.constants import STICK_PAD_MAX, STICK_PAD_MIN, TRIGGER_MAX, TRIGGER_MIN, ControllerFlags, SCButtons
 from scc.controller import Controller
+from scc.lib.gamecontrollerdb import SDL_TO_SCC_NAMES, get_database, get_guid, get_sdl_axes, get_sdl_buttons
 from scc.paths import get_config_path
 from scc.sccdaemon import SCCDaemon
 from scc.tools import clamp
@@ -30,18 +32,55 @@ import logging
 import os
 import sys
 from collections import namedtuple
+from operator import attrgetter
 
 log = logging.getLogger("evdev")
 
 TRIGGERS = "ltrig", "rtrig"
 FIRST_BUTTON = 288
+# SDL axes and dpad buttons and axes they are mapped to when
+# configuration is generated from gamecontrollerdb
+SDL_AXES = {
+	"leftx": "stick_x", "lefty": "stick_y",
+	"rightx": "rpad_x", "righty": "rpad_y",
+	"lefttrigger": "ltrig", "righttrigger": "rtrig",
+}
+SDL_DPAD = {
+	# Booleans are True for movement towards positive value
+	"dpup": ("lpad_y", True), "dpdown": ("lpad_y", False),
+	"dpleft": ("lpad_x", False), "dpright": ("lpad_x", True),
+}
+
+class EvdevControllerInput:
+	"""
+	Mutable controller state. Events are applied to single instance as they
+	are read and the result is copied into state passed to mapper once
+	per EV_SYN, so nothing has to be allocated for every event.
+	"""
+	__slots__ = _fields = (
+		'buttons', 'ltrig', 'rtrig', 'stick_x', 'stick_y',
+		'lpad_x', 'lpad_y', 'rpad_x', 'rpad_y',
+		'accel_x', 'accel_y', 'accel_z',
+		'gpitch', 'groll', 'gyaw', 'q1', 'q2', 'q3', 'q4',
+		'cpad_x', 'cpad_y',
+	)
+	_get_all = attrgetter(*_fields)
+
+	def __init__(self):
+		for name in self._fields:
+			setattr(self, name, 0)
+
+
+	def copy_from(self, other):
+		""" Sets all fields to values from 'other' """
+		for name, value in zip(self._fields, EvdevControllerInput._get_all(other)):
+			setattr(self, name, value)
+
+
+	def __repr__(self):
+		return "<EvdevControllerInput %s>" % (" ".join(
+			"%s=%s" % (name, getattr(self, name)) for name in self._fields),)
 
-EvdevControllerInput = namedtuple('EvdevControllerInput',
-	'buttons ltrig rtrig stick_x stick_y lpad_x lpad_y rpad_x rpad_y '
-	'accel_x accel_y accel_z '
-	'gpitch groll gyaw q1 q2 q3 q4 '
-	'cpad_x cpad_y'
-)
 
 AxisCalibrationData = namedtuple('AxisCalibrationData',
 	'scale offset center clamp_min clamp_max deadzone'
@@ -78,7 +117,15 @@ class EvdevController(Controller):
 			self.poller.register(self.device.fd, self.poller.POLLIN, self.input)
 			self.device.grab()
 			self._id = self._generate_id()
-		self._state = EvdevControllerInput( *[0] * len(EvdevControllerInput._fields) )
+		# '_state' and '_old_state' are passed to mapper and not touched
+		# until next SYN_REPORT. Events are applied to '_pending' in meanwhile.
+		self._state = EvdevControllerInput()
+		self._old_state = EvdevControllerInput()
+		self._pending = EvdevControllerInput()
+		self._dirty = False
+		# Set after SYN_DROPPED, until next SYN_REPORT
+		self._dropped = False
+		self._need_cancel_padpressemu = False
 		self._padpressemu_task = None
 
 
@@ -160,12 +207,18 @@ class EvdevController(Controller):
 
 
 	def input(self, *a):
-		new_state = self._state
-		need_cancel_padpressemu = False
+		new_state = self._pending
+		recorder = replay.recorder
 		try:
 			for event in self.device.read():
-				if event.type == ecodes.EV_KEY and event.code in self._dpad_map:
-					cal = self._calibrations[event.code]
+				if recorder is not None:
+					recorder.packet(self, "evdev", replay.EVDEV_EVENT.pack(
+						event.type, event.code, event.value), self.config)
+				if event.type == ecodes.EV_SYN:
+					self._dropped = self.syn(event.code, self._dropped)
+				elif self._dropped:
+					continue
+				elif event.type == ecodes.EV_KEY and event.code in self._dpad_map:
 					if event.value:
 						if self._dpad_map[event.code]:
 							# Positive
@@ -176,30 +229,20 @@ class EvdevController(Controller):
 						value = int(value * cal.scale * STICK_PAD_MAX)
 					else:
 						value = 0
-					axis = self._axis_map[event.code]
-					if not new_state.buttons & SCButtons.LPADTOUCH and axis in ("lpad_x", "lpad_y"):
-						b = new_state.buttons | SCButtons.LPAD | SCButtons.LPADTOUCH
-						need_cancel_padpressemu = True
-						new_state = new_state._replace(buttons=b, **{ axis : value })
-					elif not new_state.buttons & SCButtons.RPADTOUCH and axis in ("rpad_x", "rpad_y"):
-						b = new_state.buttons | SCButtons.RPADTOUCH
-						need_cancel_padpressemu = True
-						new_state = new_state._replace(buttons=b, **{ axis : value })
-					else:
-						new_state = new_state._replace(**{ axis : value })
+					self._set_axis(new_state, self._axis_map[event.code], value)
 				elif event.type == ecodes.EV_KEY and event.code in self._button_map:
 					if event.value:
-						b = new_state.buttons | self._button_map[event.code]
-						new_state = new_state._replace(buttons=b)
+						new_state.buttons |= self._button_map[event.code]
 					else:
-						b = new_state.buttons & ~self._button_map[event.code]
-						new_state = new_state._replace(buttons=b)
+						new_state.buttons &= ~self._button_map[event.code]
+					self._dirty = True
 				elif event.type == ecodes.EV_KEY and event.code in self._axis_map:
 					axis = self._axis_map[event.code]
 					if event.value:
-						new_state = new_state._replace(**{ axis : TRIGGER_MAX })
+						setattr(new_state, axis, TRIGGER_MAX)
 					else:
-						new_state = new_state._replace(**{ axis : TRIGGER_MIN })
+						setattr(new_state, axis, TRIGGER_MIN)
+					self._dirty = True
 				elif event.type == ecodes.EV_ABS and event.code in self._axis_map:
 					cal = self._calibrations[event.code]
 					value = (float(event.value) * cal.scale) + cal.offset
@@ -208,35 +251,66 @@ class EvdevController(Controller):
 					else:
 						value = clamp(cal.clamp_min,
 								int(value * cal.clamp_max), cal.clamp_max)
-					axis = self._axis_map[event.code]
-					if not new_state.buttons & SCButtons.LPADTOUCH and axis in ("lpad_x", "lpad_y"):
-						b = new_state.buttons | SCButtons.LPAD | SCButtons.LPADTOUCH
-						need_cancel_padpressemu = True
-						new_state = new_state._replace(buttons=b, **{ axis : value })
-					elif not new_state.buttons & SCButtons.RPADTOUCH and axis in ("rpad_x", "rpad_y"):
-						b = new_state.buttons | SCButtons.RPADTOUCH
-						need_cancel_padpressemu = True
-						new_state = new_state._replace(buttons=b, **{ axis : value })
-					else:
-						new_state = new_state._replace(**{ axis : value })
+					self._set_axis(new_state, self._axis_map[event.code], value)
 		except OSError as e:
 			# TODO: Maybe check e.errno to determine exact error
 			# all of them are fatal for now
 			log.error(e)
 			_evdevdrv.device_removed(self.device.path)
 
-		if new_state is not self._state:
-			# Something got changed
-			old_state, self._state = self._state, new_state
-			if self.mapper:
-				if need_cancel_padpressemu:
-					if self._padpressemu_task:
-						self.mapper.cancel_task(self._padpressemu_task)
-					self._padpressemu_task = self.mapper.schedule(
-						self.PADPRESS_EMULATION_TIMEOUT,
-						self.cancel_padpress_emulation
-					)
-				self.mapper.input(self, old_state, new_state)
+
+	def _set_axis(self, new_state, axis, value):
+		""" Sets stick or pad axis, emulating pad touch if needed """
+		if not new_state.buttons & SCButtons.LPADTOUCH and axis in ("lpad_x", "lpad_y"):
+			new_state.buttons |= SCButtons.LPAD | SCButtons.LPADTOUCH
+			self._need_cancel_padpressemu = True
+		elif not new_state.buttons & SCButtons.RPADTOUCH and axis in ("rpad_x", "rpad_y"):
+			new_state.buttons |= SCButtons.RPADTOUCH
+			self._need_cancel_padpressemu = True
+		setattr(new_state, axis, value)
+		self._dirty = True
+
+
+	def syn(self, code: int, dropped: bool) -> bool:
+		"""
+		Handles EV_SYN event read from one of controller devices. State is
+		committed only on SYN_REPORT. SYN_DROPPED discards everything not yet
+		committed and events from that device should be then ignored until
+		next SYN_REPORT.
+
+		'dropped' is True if device is already dropping events.
+		Returns new value of that flag.
+		"""
+		if code == ecodes.SYN_REPORT:
+			if not dropped and self._dirty:
+				self.commit_state()
+			return False
+		elif code == ecodes.SYN_DROPPED:
+			self._pending.copy_from(self._state)
+			self._dirty = False
+			return True
+		return dropped
+
+
+	def commit_state(self):
+		"""
+		Copies state modified by events read since last commit into state
+		that is then passed to mapper. Called once per SYN_REPORT.
+		"""
+		self._dirty = False
+		old_state, new_state = self._state, self._old_state
+		new_state.copy_from(self._pending)
+		self._old_state, self._state = old_state, new_state
+		if self.mapper:
+			if self._need_cancel_padpressemu:
+				if self._padpressemu_task:
+					self.mapper.cancel_task(self._padpressemu_task)
+				self._padpressemu_task = self.mapper.schedule(
+					self.PADPRESS_EMULATION_TIMEOUT,
+					self.cancel_padpress_emulation
+				)
+			self.mapper.input(self, old_state, new_state)
+		self._need_cancel_padpressemu = False
 
 
 	def test_input(self, event):
@@ -264,26 +338,24 @@ class EvdevController(Controller):
 		"""
 
 		need_reschedule = False
-		new_state = self._state
+		new_state = self._pending
 		if new_state.buttons & SCButtons.LPADTOUCH:
-			if self._state.lpad_x == 0 and self._state.lpad_y == 0:
-				b = new_state.buttons & ~(SCButtons.LPAD | SCButtons.LPADTOUCH)
-				new_state = new_state._replace(buttons=b)
+			if new_state.lpad_x == 0 and new_state.lpad_y == 0:
+				new_state.buttons &= ~(SCButtons.LPAD | SCButtons.LPADTOUCH)
+				self._dirty = True
 			else:
 				need_reschedule = True
 
 		if new_state.buttons & SCButtons.RPADTOUCH:
-			if self._state.rpad_x == 0 and self._state.rpad_y == 0:
-				b = new_state.buttons & ~SCButtons.RPADTOUCH
-				new_state = new_state._replace(buttons=b)
+			if new_state.rpad_x == 0 and new_state.rpad_y == 0:
+				new_state.buttons &= ~SCButtons.RPADTOUCH
+				self._dirty = True
 			else:
 				need_reschedule = True
 
-		if new_state is not self._state:
+		if self._dirty:
 			# Something got changed
-			old_state, self._state = self._state, new_state
-			if self.mapper:
-				self.mapper.input(self, old_state, new_state)
+			self.commit_state()
 
 		if need_reschedule:
 			self._padpressemu_task = mapper.schedule(
@@ -333,6 +405,50 @@ class EvdevController(Controller):
 		pass
 
 
+def config_from_sdl_mapping(fields: dict, caps: dict) -> dict:
+	"""
+	Converts gamecontrollerdb mapping to same configuration as GUI generates
+	when device is registered. 'caps' are capabilities of evdev device,
+	with absinfo.
+	"""
+	config = { "buttons": {}, "axes": {}, "dpads": {} }
+	absinfo = dict(caps.get(ecodes.EV_ABS, []))
+	buttons = get_sdl_buttons(caps.get(ecodes.EV_KEY, []))
+	axes = get_sdl_axes(absinfo)
+	for k, v in fields.items():
+		k = SDL_TO_SCC_NAMES.get(k, k)
+		invert = v.endswith("~")
+		v = v.strip("~")
+		try:
+			if v.startswith("b") and hasattr(SCButtons, k.upper()):
+				config["buttons"][buttons[int(v[1:])]] = k.upper()
+			elif v.startswith("b") and SDL_AXES.get(k) in TRIGGERS:
+				config["buttons"][buttons[int(v[1:])]] = SDL_AXES[k]
+			elif v.startswith("b") and k in SDL_DPAD:
+				axis, positive = SDL_DPAD[k]
+				config["dpads"][buttons[int(v[1:])]] = {
+					"axis": axis, "positive": positive, "min": STICK_PAD_MIN, "max": STICK_PAD_MAX }
+			elif v.startswith("a") and k in SDL_AXES:
+				code = axes[int(v[1:])]
+				info = absinfo[code]
+				min, max = info.min, info.max
+				# Evdev Y axes grow downwards, SCC ones upwards
+				if invert != k.endswith("y"):
+					min, max = max, min
+				config["axes"][code] = { "axis": SDL_AXES[k], "min": min, "max": max }
+				if SDL_AXES[k] not in TRIGGERS:
+					config["axes"][code]["deadzone"] = info.flat
+			elif v in ("h0.1", "h0.4") and ecodes.ABS_HAT0Y in absinfo:
+				config["axes"][ecodes.ABS_HAT0Y] = { "axis": "lpad_y", "min": 1, "max": -1, "deadzone": 0 }
+			elif v in ("h0.2", "h0.8") and ecodes.ABS_HAT0X in absinfo:
+				config["axes"][ecodes.ABS_HAT0X] = { "axis": "lpad_x", "min": -1, "max": 1, "deadzone": 0 }
+			else:
+				log.debug("Skipping unsupported gamecontrollerdb mapping %s:%s", k, v)
+		except (IndexError, ValueError):
+			log.debug("Skipping unknown gamecontrollerdb mapping %s:%s", k, v)
+	return config
+
+
 def parse_axis(axis):
 	min       = axis.get("min", -127)
 	max       = axis.get("max",  128)
@@ -364,6 +480,7 @@ class EvdevDriver:
 
 	def __init__(self):
 		self.daemon = None
+		self.automap_enabled = False
 		self._devices = {}
 		self._scan_thread = None
 		self._next_scan = None
@@ -416,17 +533,47 @@ class EvdevDriver:
 			except Exception as e:
 				log.exception(e)
 				return False
-			try:
-				controller = EvdevController(self.daemon, dev, config_file, config)
-			except Exception as e:
-				log.debug("Failed to add evdev device: %s", e)
-				log.exception(e)
+		else:
+			config_file = None
+			config = self.automap(syspath, dev)
+			if config is None:
 				return False
-			self._devices[eventnode] = controller
-			self.daemon.add_controller(controller)
-			log.debug("Evdev device added: %s", dev.name)
-			return True
-		return False
+		try:
+			controller = EvdevController(self.daemon, dev, config_file, config)
+		except Exception as e:
+			log.debug("Failed to add evdev device: %s", e)
+			log.exception(e)
+			return False
+		self._devices[eventnode] = controller
+		self.daemon.add_controller(controller)
+		log.debug("Evdev device added: %s", dev.name)
+		return True
+
+
+	def automap(self, syspath: str, dev: InputDevice) -> dict | None:
+		"""
+		Generates configuration for gamepad that has no configuration file,
+		but is known to gamecontrollerdb. Returns None for anything else.
+		"""
+		if not self.automap_enabled:
+			return None
+		caps = dev.capabilities(verbose=False, absinfo=True)
+		if ecodes.EV_ABS not in caps or not any(
+				ecodes.BTN_JOYSTICK <= x <= ecodes.BTN_THUMBR for x in caps.get(ecodes.EV_KEY, [])):
+			return None
+		if "/virtual/" in os.path.realpath(syspath):
+			# Created by uinput, possibly by SCC itself
+			return None
+		ids = (dev.info.vendor, dev.info.product)
+		if any(key[1:] == ids for key in self.daemon.get_device_monitor().dev_added_cbs):
+			# Handled by another driver
+			return None
+		mapping = get_database().get_mapping(get_guid(
+			dev.info.bustype, dev.info.vendor, dev.info.product, dev.info.version))
+		if mapping is None:
+			return None
+		log.info("Using gamecontrollerdb mapping for '%s' (%s)", dev.name, mapping.name)
+		return config_from_sdl_mapping(mapping.fields, caps)
 
 
 	def handle_removed_device(self, syspath, *bunchofnones):
@@ -487,6 +634,7 @@ def init(daemon, config):
 		return False
 
 	_evdevdrv.set_daemon(daemon)
+	_evdevdrv.automap_enabled = config.get("evdev_automap", False)
 	return True
 
 
@@ -5,6 +5,7 @@ Borrows bit of code and configuration from evdevdrv.
 from __future__ import annotations
 
 import ctypes
+import hashlib
 import json
 import logging
 import os
@@ -37,7 +38,8 @@ from scc.lib.hidparse import (
 	parse_report_descriptor,
 )
 from scc.paths import get_config_path
-from scc.tools import find_library
+from scc.sensor_fusion import SensorFusion
+from scc.tools import find_library, load_cache, store_cache
 
 log = logging.getLogger("HID")
 
@@ -48,6 +50,7 @@ AXIS_COUNT = 20   # Must match number of axis fields in HIDControllerInput and v
 BUTTON_COUNT = 32 # Must match (or be less than) number of bits in HIDControllerInput.buttons
 ALLOWED_SIZES = [1, 2, 4, 8, 16, 32]
 SYS_DEVICES = "/sys/devices"
+SYS_HID_DEVICES = "/sys/bus/hid/devices"
 
 
 BLACKLIST = [
@@ -205,11 +208,84 @@ _lib.decode.restype = bool
 _lib.decode.argtypes = [ HIDDecoderPtr, ctypes.c_char_p ]
 
 
+class DecoderCache:
+	"""
+	Decoders built from HID descriptors, stored as cache files in
+	~/.config/scc/cache/hid, so reconnected device doesn't need its
+	descriptor parsed again. Key is hash of descriptor, configuration and
+	maximum packet size. Cache is never trusted across different daemon
+	versions.
+	"""
+	# Increase when format of cache files or parsing of descriptors changes
+	VERSION = 1
+
+	def __init__(self, path=None):
+		self.path = path or os.path.join(get_config_path(), "cache", "hid")
+		self._entries = {}		# key -> stored layout
+
+
+	@staticmethod
+	def get_key(descriptor, config: dict | None, max_size: int) -> str:
+		h = hashlib.sha1(bytes(list(descriptor)))
+		h.update(json.dumps([ config, max_size ], sort_keys=True).encode("utf-8"))
+		return h.hexdigest()
+
+
+	def load(self, key: str) -> HIDDecoder | None:
+		""" Returns new HIDDecoder built from cached layout, or None """
+		layout = self._entries.get(key)
+		if layout is None:
+			layout = load_cache(os.path.join(self.path, key + ".pickle"), DecoderCache.VERSION)
+			if layout is None:
+				return None
+			self._entries[key] = layout
+
+		decoder = HIDDecoder()
+		try:
+			for index, mode, byte_offset, bit_offset, size, data in layout["axes"]:
+				if len(data) != ctypes.sizeof(AxisDataUnion):
+					return None
+				decoder.axes[index] = AxisData(mode=mode, byte_offset=byte_offset,
+					bit_offset=bit_offset, size=size,
+					data=AxisDataUnion.from_buffer_copy(data))
+			enabled, byte_offset, bit_offset, size, button_count, button_map = layout["buttons"]
+			decoder.buttons = ButtonData(enabled=enabled, byte_offset=byte_offset,
+				bit_offset=bit_offset, size=size, button_count=button_count,
+				button_map=(ctypes.c_uint8 * BUTTON_COUNT)(*button_map))
+			decoder.packet_size = layout["packet_size"]
+		except (ValueError, TypeError, IndexError, KeyError) as e:
+			log.debug("Failed to use cached decoder: %s", e)
+			return None
+		return decoder
+
+
+	def store(self, key: str, decoder: HIDDecoder) -> None:
+		""" Stores layout of decoder. Failure is only logged """
+		b = decoder.buttons
+		layout = {
+			"axes": [
+				[ index, a.mode, a.byte_offset, a.bit_offset, a.size, bytes(a.data) ]
+				for index, a in enumerate(decoder.axes)
+				if a.mode != AxisMode.DISABLED
+			],
+			"buttons": [ b.enabled, b.byte_offset, b.bit_offset, b.size,
+				b.button_count, list(b.button_map) ],
+			"packet_size": decoder.packet_size,
+		}
+		self._entries[key] = layout
+		store_cache(os.path.join(self.path, key + ".pickle"), DecoderCache.VERSION, layout)
+
+
+decoder_cache = DecoderCache()
+
+
 class HIDController(USBDevice, Controller):
 	flags = ( ControllerFlags.HAS_RSTICK
 			| ControllerFlags.SEPARATE_STICK
 			| ControllerFlags.HAS_DPAD
 			| ControllerFlags.NO_GRIPS )
+	# SensorFusion used by _fuse_ds4_gyro, created when needed
+	_fusion = None
 
 	def __init__(self, device: USBDevice, daemon: SCCDaemon, handle: USBDeviceHandle, config_file: str, config: dict, test_mode: bool = False):
 		USBDevice.__init__(self, device, handle)
@@ -264,8 +340,13 @@ class HIDController(USBDevice, Controller):
 		if hid_descriptor is None:
 			hid_descriptor = self.handle.getRawDescriptor(
 					LIBUSB_DT_REPORT, 0, 512)
-		open("report", "wb").write(bytes(list(hid_descriptor)))
-		self._build_hid_decoder(hid_descriptor, config, max_size)
+		key = DecoderCache.get_key(hid_descriptor, config, max_size)
+		self._decoder = decoder_cache.load(key)
+		if self._decoder is None:
+			self._build_hid_decoder(hid_descriptor, config, max_size)
+			decoder_cache.store(key, self._decoder)
+		else:
+			log.debug("Using cached decoder for %.4x:%.4x", vid, pid)
 		self._packet_size = self._decoder.packet_size
 
 
@@ -466,7 +547,18 @@ class HIDController(USBDevice, Controller):
 			return None
 
 		pattern = ":%.4x:%.4x" % (vid, pid)
-		full_path = recursive_search(pattern, SYS_DEVICES)
+		full_path = None
+		# Every HID device is linked from /sys/bus/hid/devices, so walking
+		# whole /sys/devices is needed only if it's not found there
+		try:
+			for name in sorted(os.listdir(SYS_HID_DEVICES)):
+				if pattern in name.lower():
+					full_path = os.path.join(SYS_HID_DEVICES, name, "report_descriptor")
+					break
+		except OSError:
+			pass
+		if full_path is None or not os.path.exists(full_path):
+			full_path = recursive_search(pattern, SYS_DEVICES)
 		try:
 			if full_path:
 				log.debug("Loading descriptor from '%s'", full_path)
@@ -553,6 +645,22 @@ class HIDController(USBDevice, Controller):
 						self._decoder.old_state, self._decoder.state)
 
 
+	def _fuse_ds4_gyro(self, delta_time: float) -> None:
+		"""
+		Replaces accelerometer values, which DS4GYRO axis mode stores in
+		q1-q3, with orientation computed from gyro and accelerometer.
+		Accelerometer values are moved to accel_x-z.
+		Used by DS4 and DS5 drivers, which know where sensor timestamp is.
+		"""
+		if self._fusion is None:
+			self._fusion = SensorFusion()
+		state = self._decoder.state
+		state.accel_x, state.accel_y, state.accel_z = -state.q2 * 2, state.q1 * 2, -state.q3 * 2
+		self._fusion.update(state.gpitch, -state.gyaw, -state.groll,
+			state.accel_x, state.accel_y, state.accel_z, delta_time)
+		state.q1, state.q2, state.q3, state.q4 = self._fusion.get_quaternion()
+
+
 	def apply_config(self, config):
 		# TODO: This?
 		pass
@@ -640,6 +748,7 @@ def hiddrv_test(cls, args) -> int:
 	from scc.device_monitor import create_device_monitor
 	from scc.drivers.usb import _usb
 	from scc.poller import Poller
+	from scc.scheduler import Scheduler
 	from scc.scripts import InvalidArguments
 
 	try:
@@ -654,6 +763,7 @@ def hiddrv_test(cls, args) -> int:
 
 		def __init__(self) -> None:
 			self.poller = Poller()
+			self.scheduler = Scheduler(wakeup=self.poller.wakeup)
 			self.dev_monitor = create_device_monitor(self)
 			self.exitcode = -1
 
@@ -670,6 +780,9 @@ def hiddrv_test(cls, args) -> int:
 		def get_poller(self) -> Poller:
 			return self.poller
 
+		def get_scheduler(self) -> Scheduler:
+			return self.scheduler
+
 	fake_daemon = FakeDaemon()
 
 	def cb(device: USBDevice, handle: USBDeviceHandle):
@@ -695,7 +808,8 @@ def hiddrv_test(cls, args) -> int:
 		print("Ready")
 	sys.stdout.flush()
 	while fake_daemon.exitcode < 0:
-		fake_daemon.poller.poll()
+		fake_daemon.poller.poll(fake_daemon.scheduler.get_timeout(), fake_daemon.scheduler.update_time)
+		fake_daemon.scheduler.run()
 		_usb.mainloop()
 
 	return fake_daemon.exitcode
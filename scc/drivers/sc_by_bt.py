@@ -254,7 +254,7 @@ class SCByBt(SCController):
 			self._hidrawdev.sendFeatureReport(msg, 3)
 
 
-	def input(self, idata):
+	def input(self):
 		raise RuntimeError("This shouldn't be called, ever")
 
 	def turnoff(self):
@@ -6,13 +6,12 @@ Shares a lot of classes with sc_dongle.py
 """
 
 import logging
-import struct
 
 from usb1 import USBError
 
 from scc.drivers.usb import USBDevice, register_hotplug_device
 
-from .sc_dongle import TUP_FORMAT, ControllerInput, SCController, SCStatus
+from .sc_dongle import STATUS_OFFSET, SCController, SCStatus
 
 VENDOR_ID = 0x28de
 PRODUCT_ID = 0x1102
@@ -39,8 +38,10 @@ class SCByCable(USBDevice, SCController):
 		USBDevice.__init__(self, device, handle)
 		SCController.__init__(self, self, CONTROLIDX, ENDPOINT)
 		self._ready = False
-		self._last_tup = None
-		daemon.add_mainloop(self._timer)
+		self._has_input = False
+		self._idle = False
+		self._timer_task = None
+		daemon.add_mainloop(self._mainloop)
 
 		self.claim_by(klass=3, subclass=0, protocol=0)
 		self.read_serial()
@@ -66,37 +67,59 @@ class SCByCable(USBDevice, SCController):
 
 
 	def _wait_input(self, endpoint, data):
-		tup = ControllerInput._make(struct.unpack(TUP_FORMAT, data))
 		if not self._ready:
 			self.daemon.add_controller(self)
 			self.configure()
 			self._ready = True
-		if tup.status == SCStatus.INPUT:
-			self._last_tup = tup
+			self._timer_task = self.daemon.get_scheduler().schedule(TIMER_INTERVAL, self._timer)
+		if data[STATUS_OFFSET] == SCStatus.INPUT:
+			# If more packets arrive before _mainloop, only last one is used
+			self.read_input(data)
+			self._has_input = True
+
+
+	def _mainloop(self):
+		""" Passes input received since last mainloop iteration to mapper """
+		if self._has_input and self.get_mapper():
+			self._has_input = False
+			self._idle = False
+			self.input()
+			self._flush()
 
 
 	def _timer(self):
+		"""
+		Called every TIMER_INTERVAL. If there was no input since last call,
+		lets mapper generate events anyway, so actions that keep moving
+		without input (as rolling ball) don't stop.
+		"""
+		self._timer_task = self.daemon.get_scheduler().schedule(TIMER_INTERVAL, self._timer)
 		m = self.get_mapper()
 		if m:
-			if self._last_tup:
-				self.input(self._last_tup)
-				self._last_tup = None
-			else:
+			if self._idle:
 				m.generate_events()
 				m.generate_feedback()
-			try:
-				self.flush()
-			except USBError as e:
-				log.exception(e)
-				log.error("Error while communicating with device, baling out...")
-				self.force_restart()
+				self._flush()
+			self._idle = True
+
+
+	def _flush(self):
+		try:
+			self.flush()
+		except USBError as e:
+			log.exception(e)
+			log.error("Error while communicating with device, baling out...")
+			self.force_restart()
 
 
 	def close(self):
 		if self._ready:
 			self.daemon.remove_controller(self)
 			self._ready = False
-		self.daemon.remove_mainloop(self._timer)
+		if self._timer_task is not None:
+			self._timer_task.cancel()
+			self._timer_task = None
+		self.daemon.remove_mainloop(self._mainloop)
 		USBDevice.close(self)
 
 
@@ -5,13 +5,14 @@ Handles one or multiple controllers connected to dongle.
 """
 from __future__ import annotations
 
+import ctypes
 import logging
 import struct
-from collections import namedtuple
 from enum import IntEnum
 from math import cos, sin
 from math import pi as PI
 
+from scc import replay
 from scc.config import Config
 from scc.constants import STICK_PAD_MAX, STICK_PAD_MIN, STICKTILT, SCButtons
 from scc.controller import Controller
@@ -21,42 +22,49 @@ VENDOR_ID  = 0x28de
 PRODUCT_ID = 0x1142
 FIRST_ENDPOINT = 2
 FIRST_CONTROLIDX = 1
-INPUT_FORMAT = [
-	('b',   'type'),
-	('x',   'ukn_01'),
-	('B',   'status'),
-	('x',   'ukn_02'),
-	('H',   'seq'),
-	('x',   'ukn_03'),
-	('I',   'buttons'),
-	('B',   'ltrig'),
-	('B',   'rtrig'),
-	('x',   'ukn_04'),
-	('x',   'ukn_05'),
-	('x',   'ukn_06'),
-	('h',   'lpad_x'),
-	('h',   'lpad_y'),
-	('h',   'rpad_x'),
-	('h',   'rpad_y'),
-	('4x',  'ukn_06'),
-	('h',   'accel_x'),
-	('h',   'accel_y'),
-	('h',   'accel_z'),
-	('h',   'gpitch'),
-	('h',   'groll'),
-	('h',   'gyaw'),
-	('h',   'q1'),
-	('h',   'q2'),
-	('h',   'q3'),
-	('h',   'q4'),
-	('16x', 'ukn_07')]
-FORMATS, NAMES = zip(*INPUT_FORMAT)
-TUP_FORMAT = '<' + ''.join(FORMATS)
-ControllerInput = namedtuple('ControllerInput', ' '.join([ x for x in NAMES if not x.startswith('ukn_') ]))
-SCI_NULL = ControllerInput._make(struct.unpack('<' + ''.join(FORMATS), b'\x00' * 64))
 STICKPRESS = 0b1000000000000000000000000000000
 
 
+class SCInput(ctypes.Structure):
+	"""
+	Input packet as received from controller. Packet is copied directly
+	into preallocated instance, so nothing has to be parsed or allocated
+	for every received packet.
+	"""
+	_pack_ = 1
+	_fields_ = [
+		('type', ctypes.c_int8),
+		('_a1', ctypes.c_uint8),
+		('status', ctypes.c_uint8),
+		('_a2', ctypes.c_uint8),
+		('seq', ctypes.c_uint16),
+		('_a3', ctypes.c_uint8),
+		('buttons', ctypes.c_uint32),
+		('ltrig', ctypes.c_uint8),
+		('rtrig', ctypes.c_uint8),
+		('_a4', ctypes.c_uint8 * 3),
+		('lpad_x', ctypes.c_int16),
+		('lpad_y', ctypes.c_int16),
+		('rpad_x', ctypes.c_int16),
+		('rpad_y', ctypes.c_int16),
+		('_a5', ctypes.c_uint8 * 4),
+		('accel_x', ctypes.c_int16),
+		('accel_y', ctypes.c_int16),
+		('accel_z', ctypes.c_int16),
+		('gpitch', ctypes.c_int16),
+		('groll', ctypes.c_int16),
+		('gyaw', ctypes.c_int16),
+		('q1', ctypes.c_int16),
+		('q2', ctypes.c_int16),
+		('q3', ctypes.c_int16),
+		('q4', ctypes.c_int16),
+		('_a6', ctypes.c_uint8 * 16),
+	]
+
+# Offset of 'status' field, checked before packet is copied anywhere
+STATUS_OFFSET = SCInput.status.offset
+
+
 log = logging.getLogger("SCDongle")
 class Dongle(USBDevice):
 	MAX_ENDPOINTS = 4
@@ -95,9 +103,9 @@ class Dongle(USBDevice):
 
 
 	def _on_input(self, endpoint, data):
-		tup = ControllerInput._make(struct.unpack(TUP_FORMAT, data))
-		if tup.status == SCStatus.HOTPLUG:
-			# Most of INPUT_FORMAT doesn't apply here
+		status = data[STATUS_OFFSET]
+		if status == SCStatus.HOTPLUG:
+			# Most of SCInput fields don't apply here
 			if ord(str(data[4])) == 2:
 				# Controller connected
 				if endpoint not in self._controllers:
@@ -108,7 +116,7 @@ class Dongle(USBDevice):
 					self.daemon.remove_controller(self._controllers[endpoint])
 					self._controllers[endpoint].disconnected()
 					del self._controllers[endpoint]
-		elif tup.status == SCStatus.INPUT:
+		elif status == SCStatus.INPUT:
 			if endpoint not in self._controllers:
 				self._add_controller(endpoint)
 			elif len(self._no_serial):
@@ -116,7 +124,9 @@ class Dongle(USBDevice):
 					x.read_serial()
 				self._no_serial = []
 			else:
-				self._controllers[endpoint].input(tup)
+				c = self._controllers[endpoint]
+				c.read_input(data)
+				c.input()
 
 class SCStatus(IntEnum):
 	IDLE    = 0x04
@@ -166,7 +176,11 @@ class SCController(Controller):
 		# TODO: Is serial really used anywhere?
 		self._serial = "0000000000"
 		self._id = self._generate_id() if driver else "-"
-		self._old_state = SCI_NULL
+		# State passed to mapper as 'old_state' and state that next packet
+		# is copied into. Swapped after every input() call.
+		self._old_state, self._state = SCInput(), SCInput()
+		self._old_buffer = memoryview(self._old_state).cast("B")
+		self._buffer = memoryview(self._state).cast("B")
 		self._ccidx = ccidx
 
 
@@ -178,50 +192,44 @@ class SCController(Controller):
 		return "<SCWireless %s>" % (self.get_id(),)
 
 
-	def input(self, idata: ControllerInput) -> None:
-		old_state, self._old_state = self._old_state, idata
+	def read_input(self, data) -> None:
+		"""
+		Copies received packet into preallocated state. It's passed to mapper
+		by next input() call; until then, previous state stays untouched.
+		"""
+		if replay.recorder is not None:
+			replay.recorder.packet(self, "sc", data)
+		self._buffer[:] = data
+
+
+	def input(self) -> None:
+		""" Passes state loaded by read_input to mapper """
+		idata = self._state
 		if self.mapper:
 			#if idata.buttons & SCButtons.LPAD:
 			#	# STICKPRESS button may signalize pressing stick instead
 			#	if (idata.buttons & STICKPRESS) and not (idata.buttons & STICKTILT):
-			#		idata = ControllerInput.replace(buttons=idata.buttons & ~SCButtons.LPAD)
-
-			if self._input_rotation_l or self._input_rotation_r:
-				lx, ly = idata.lpad_x, idata.lpad_y
-				rx, ry = idata.rpad_x, idata.rpad_y
-
-				if self._input_rotation_l and idata.buttons & SCButtons.LPADTOUCH:
-					s, c = sin(self._input_rotation_l), cos(self._input_rotation_l)
-					# Adjust LX for rotation and clamp
-					value = int(idata.lpad_x * c - idata.lpad_y * s)
-					lx = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
-
-					# Adjust LY for rotation and clamp
-					value = int(idata.lpad_x * s + idata.lpad_y * c)
-					ly = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
-
-				if self._input_rotation_r and idata.buttons & SCButtons.RPADTOUCH:
-					s, c = sin(self._input_rotation_r), cos(self._input_rotation_r)
-
-					# Adjust RX for rotation and clamp
-					value = int(idata.rpad_x * c - idata.rpad_y * s)
-					rx = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
-
-					# Adjust RY for rotation and clamp
-					value = int(idata.rpad_x * s + idata.rpad_y * c)
-					ry = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
-
-				# TODO: This is awfull :(
-				idata = ControllerInput(
-						idata.type, idata.status, idata.seq, idata.buttons,
-						idata.ltrig, idata.rtrig,
-						lx, ly, rx, ry,
-						idata.accel_x, idata.accel_y, idata.accel_z,
-						idata.gpitch, idata.groll, idata.gyaw,
-						idata.q1, idata.q2, idata.q3, idata.q4
-				)
-
-			self.mapper.input(self, old_state, idata)
+			#		idata.buttons &= ~SCButtons.LPAD
+
+			# Rotation is applied in place, state is not used for anything else
+			if self._input_rotation_l and idata.buttons & SCButtons.LPADTOUCH:
+				s, c = sin(self._input_rotation_l), cos(self._input_rotation_l)
+				x, y = idata.lpad_x, idata.lpad_y
+				# Adjust LX & LY for rotation and clamp
+				idata.lpad_x = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * c - y * s)))
+				idata.lpad_y = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * s + y * c)))
+
+			if self._input_rotation_r and idata.buttons & SCButtons.RPADTOUCH:
+				s, c = sin(self._input_rotation_r), cos(self._input_rotation_r)
+				x, y = idata.rpad_x, idata.rpad_y
+				# Adjust RX & RY for rotation and clamp
+				idata.rpad_x = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * c - y * s)))
+				idata.rpad_y = max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * s + y * c)))
+
+			self.mapper.input(self, self._old_state, idata)
+
+		self._old_state, self._state = self._state, self._old_state
+		self._old_buffer, self._buffer = self._buffer, self._old_buffer
 
 
 	def _generate_id(self):
@@ -13,6 +13,7 @@ import logging
 import struct
 from enum import IntEnum
 
+from scc import replay
 from scc.constants import STICK_PAD_MAX, STICK_PAD_MIN, ControllerFlags, SCButtons
 from scc.drivers.sc_dongle import SCController, SCPacketType
 from scc.drivers.usb import USBDevice, register_hotplug_device
@@ -190,6 +191,8 @@ class Deck(USBDevice, SCController):
 			self.daemon.add_controller(self)
 			self.configure()
 			self._ready = True
+		if replay.recorder is not None:
+			replay.recorder.packet(self, "deck", data)
 
 		self._old_state, self._input = self._input, self._old_state
 		ctypes.memmove(ctypes.addressof(self._input), bytes(data), len(data))
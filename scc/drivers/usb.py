@@ -17,6 +17,8 @@ from typing import TYPE_CHECKING
 
 import usb1
 
+from scc import latency
+
 if TYPE_CHECKING:
 	from usb1 import USBDeviceHandle, USBTransfer
 
@@ -46,6 +48,8 @@ class USBDevice:
 				transfer.getActualLength() != size):
 				return
 
+			if latency.enabled:
+				latency.mark_received()
 			data = transfer.getBuffer()
 			try:
 				callback(endpoint, data)
@@ -81,6 +85,7 @@ class USBDevice:
 			data + zeros,
 			0       # Timeout
 		))
+		self.request_flush()
 
 
 	def overwrite_control(self, index, data):
@@ -107,6 +112,12 @@ class USBDevice:
 				index, data,
 			), index, size, callback,
 		))
+		self.request_flush()
+
+
+	def request_flush(self):
+		"""Wake up mainloop so messages queued from another thread are flushed."""
+		_usb.request_flush()
 
 
 	def flush(self):
@@ -199,6 +210,7 @@ class USBDriver:
 		self._started = False
 		self._retry_devices = []
 		self._retry_devices_timer = 0
+		self._retry_task = None
 		self._ctx = None # Set by start method
 		self._changed = 0
 
@@ -234,6 +246,24 @@ class USBDriver:
 		self._started = True
 
 
+	def request_flush(self) -> None:
+		"""Make sure that mainloop runs soon, so queued control messages are sent.
+
+		Needed only when message is queued from thread other than main,
+		e.g. when 'Led:' or 'Feedback:' request is handled by socket server.
+		"""
+		if self.daemon:
+			self.daemon.get_poller().wakeup()
+
+
+	def _retry(self, *a) -> None:
+		self._retry_task = None
+		self._retry_devices_timer = time.time() + 5.0
+		lst, self._retry_devices = self._retry_devices, []
+		for syspath, (vendor, product) in lst:
+			self.handle_new_device(syspath, vendor, product)
+
+
 	def handle_new_device(self, syspath: str, vendor: int, product: int) -> bool | None:
 		tp = vendor, product
 		handle = None
@@ -332,12 +362,10 @@ class USBDriver:
 				log.error("USB device %s disconnected durring flush", d)
 				d.close()
 				break
-		if len(self._retry_devices):
-			if time.time() > self._retry_devices_timer:
-				self._retry_devices_timer = time.time() + 5.0
-				lst, self._retry_devices = self._retry_devices, []
-				for syspath, (vendor, product) in lst:
-					self.handle_new_device(syspath, vendor, product)
+		if len(self._retry_devices) and self._retry_task is None:
+			# Mainloop doesn't spin, so retrying is left on scheduler
+			delay = max(0.0, self._retry_devices_timer - time.time())
+			self._retry_task = self.daemon.get_scheduler().schedule(delay, self._retry)
 
 
 # USBDriver should be process-wide singleton
@@ -17,7 +17,7 @@ from scc.menu_data import MenuData, MenuItem
 from scc.profile import Profile
 from scc.lib.vdf import parse_vdf, ensure_list
 
-import logging
+import logging, os
 log = logging.getLogger("import.vdf")
 
 class VDFProfile(Profile):
@@ -568,6 +568,14 @@ class VDFProfile(Profile):
 		return name
 
 
+	@staticmethod
+	def gen_aset_name(base_name, set_name):
+		"""Generate name for profile converted from action set."""
+		if set_name == "default":
+			return base_name
+		return "." + base_name + ":" + set_name.lower()
+
+
 	def action_set_by_id(self, id):
 		"""Return name of action set with specified id."""
 		for s in self.action_sets:
@@ -615,6 +623,57 @@ class VDFProfile(Profile):
 		return self
 
 
+	def save_action_sets(self, path, name):
+		"""Save every action set but default one into 'path' directory.
+
+		Actions switching between action sets are updated to use names of
+		saved profiles, so profile itself should be saved as 'name' after this.
+		Returns list of saved files.
+		"""
+		rv = []
+		if len(self.action_sets) > 1:
+			# Update ChangeProfileActions with correct profile names
+			for x in self.action_set_switches:
+				id = int(x._profile.split(":")[-1])
+				target_set = self.action_set_by_id(id)
+				x._profile = VDFProfile.gen_aset_name(name, target_set)
+
+			# Save action set profiles
+			for k in self.action_sets:
+				if k != 'default':
+					filename = VDFProfile.gen_aset_name(name, k) + ".sccprofile"
+					rv.append(os.path.join(path, filename))
+					self.action_sets[k].save(rv[-1])
+		return rv
+
+
+	def save_all(self, path, name):
+		"""Save profile as 'name' into 'path' directory.
+
+		Every action set is saved as separate profile, see save_action_sets.
+		Returns list of saved files.
+		"""
+		rv = [ os.path.join(path, name + ".sccprofile") ]
+		rv += self.save_action_sets(path, name)
+		self.save(rv[0])
+		return rv
+
+
+def convert_file(filename, path, name):
+	"""Load VDF or VDFFZ profile from file and save it using VDFProfile.save_all.
+
+	Used by 'scc convert-vdf', in worker processes.
+	Returns list of saved files.
+	"""
+	if filename.endswith(".vdffz"):
+		from scc.foreign.vdffz import VDFFZProfile
+		profile = VDFFZProfile()
+	else:
+		profile = VDFProfile()
+	profile.load(filename)
+	return profile.save_all(path, name)
+
+
 if __name__ == "__main__":
 	import sys
 
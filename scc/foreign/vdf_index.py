@@ -0,0 +1,132 @@
+"""SC Controller - Steam profile index
+
+Remembers what VDF profile importer reads from Steam files: list of games
+with selected profiles from localconfig.vdf, names of games from app
+manifests and titles and locations of workshop profiles. Stored in
+~/.config/scc/cache/vdf-index.pickle.
+
+Every value is remembered along with mtime and size of file it was read
+from and read again only when file changes.
+"""
+import logging
+import os
+import threading
+
+from scc.lib.vdf import get_vdf_value, parse_vdf_block
+from scc.paths import get_config_path
+from scc.tools import load_cache, store_cache
+
+log = logging.getLogger("VdfIndex")
+
+
+class VdfIndex:
+	# Increase when format of index changes
+	VERSION = 1
+	# Sections of index, each maps filename (or profile id) to stored value.
+	# Lists of games are stored per filename and user id
+	SECTIONS = ("games", "names", "titles", "profiles")
+
+	def __init__(self, filename=None):
+		self.filename = filename or os.path.join(get_config_path(), "cache", "vdf-index.pickle")
+		self._lock = threading.Lock()
+		self._dirty = False
+		self._data = { x : {} for x in VdfIndex.SECTIONS }
+		data = load_cache(self.filename, VdfIndex.VERSION)
+		try:
+			if data is not None:
+				for x in VdfIndex.SECTIONS:
+					self._data[x] = dict(data[x])
+		except (KeyError, TypeError, ValueError):
+			# Broken index is simply created again
+			self._data = { x : {} for x in VdfIndex.SECTIONS }
+
+
+	def _get(self, section, filename, read, key=None):
+		"""
+		Returns value stored for filename (or key, if set) in section, or,
+		if file was changed since, calls read(filename), stores and returns
+		its result.
+		"""
+		key = key or filename
+		st = os.stat(filename)
+		stamp = [ st.st_mtime_ns, st.st_size ]
+		with self._lock:
+			entry = self._data[section].get(key)
+		if entry is not None and entry[0:2] == stamp:
+			return entry[2]
+		value = read(filename)
+		with self._lock:
+			self._data[section][key] = stamp + [ value ]
+			self._dirty = True
+		return value
+
+
+	def get_games(self, filename, userid):
+		"""
+		Returns list of (game id, profile id) pairs for games with profile
+		selected in localconfig.vdf.
+		"""
+		def read(filename):
+			# VDF file is a ISO-8859-1 encoded file. Not UTF-8
+			with open(filename, "r", encoding="ISO-8859-1") as f:
+				try:
+					# Currently only grabs SC configs!
+					cc = parse_vdf_block(f, "UserLocalConfigStore", "controller_config",
+						userid, "controller_steamcontroller_gordon", "DEFAULT_FOR_TYPE")
+				except KeyError:
+					return []
+			return [
+				( gameid, cc[gameid]["selected"] )
+				for gameid in cc
+				# skip templates
+				if 'selected' in cc[gameid]
+			]
+
+		key = "%s\n%s" % (filename, userid)
+		return [ tuple(x) for x in self._get("games", filename, read, key) ]
+
+
+	def get_game_name(self, filename):
+		""" Returns name of game from app manifest """
+		def read(filename):
+			with open(filename, "r") as f:
+				return get_vdf_value(f, "AppState", "name")
+
+		return self._get("names", filename, read)
+
+
+	def get_profile_title(self, filename):
+		""" Returns title of workshop profile """
+		def read(filename):
+			with open(filename, "r") as f:
+				return get_vdf_value(f, "controller_mappings", "title")
+
+		return self._get("titles", filename, read)
+
+
+	def find_profile(self, profile_id, find):
+		"""
+		Returns filename of workshop profile with given id. Remembered
+		filename is used while it exists, otherwise find(profile_id) is
+		called to search for it. Returns None if profile cannot be found.
+		"""
+		with self._lock:
+			filename = self._data["profiles"].get(profile_id)
+		if filename is not None and os.path.exists(filename):
+			return filename
+		filename = find(profile_id)
+		if filename is not None:
+			with self._lock:
+				self._data["profiles"][profile_id] = filename
+				self._dirty = True
+		return filename
+
+
+	def save(self):
+		""" Stores index if anything was changed. Failure is only logged """
+		with self._lock:
+			if not self._dirty:
+				return
+			self._dirty = False
+			if not store_cache(self.filename, VdfIndex.VERSION, self._data):
+				log.warning("Failed to store VDF index '%s'", self.filename)
@@ -19,7 +19,7 @@ from scc.tools import check_access, find_gksudo, profile_is_override, nameof
 from scc.tools import get_profile_name, profile_is_default, find_profile
 from scc.constants import SCButtons, STICK, STICK_PAD_MAX
 from scc.constants import DAEMON_VERSION, LEFT, RIGHT
-from scc.paths import get_config_path, get_profiles_path
+from scc.paths import DirectoryIndex, get_config_path, get_profiles_path
 from scc.custom import load_custom_module
 from scc.modifiers import NameModifier
 from scc.actions import NoAction
@@ -1361,6 +1361,7 @@ class App(Gtk.Application, UserDataManager, BindingEditor):
 
 	def do_startup(self, *a) -> None:
 		Gtk.Application.do_startup(self, *a)
+		DirectoryIndex.attach_glib()
 		self.load_profile_list()
 		self.setup_widgets()
 		if self.app.config['gui']['enable_status_icon']:
@@ -6,6 +6,7 @@ Just huge chunk of constants put aside to make impotant code more readable
 """
 from scc.constants import SCButtons, STICK, LEFT, RIGHT
 from scc.gui import BUTTON_ORDER
+from scc.lib.gamecontrollerdb import SDL_TO_SCC_NAMES
 
 X = 0
 Y = 1
@@ -41,14 +42,6 @@ AXIS_TO_BUTTON = {
 	"lpad_y":	SCButtons.LPAD,
 }
 
-SDL_TO_SCC_NAMES = {
-	'guide':			'C',
-	'leftstick':		'STICKPRESS',
-	'rightstick':		'RPAD',
-	'leftshoulder':		'LB',
-	'rightshoulder':	'RB',
-}
-
 SDL_AXES = (
 	# This tuple has to use same order as AXIS_ORDER
 	'leftx', 'lefty',
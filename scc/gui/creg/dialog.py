@@ -17,7 +17,8 @@ from scc.gui.controller_image import ControllerImage
 from scc.gui.editor import Editor
 from scc.gui.app import App
 from scc.constants import SCButtons, STICK_PAD_MAX, STICK_PAD_MIN
-from scc.paths import get_config_path, get_share_path
+from scc.paths import get_config_path
+from scc.lib.gamecontrollerdb import get_database, get_guid, get_sdl_axes, get_sdl_buttons
 from scc.tools import nameof, clamp
 from scc.config import Config
 
@@ -110,87 +111,75 @@ class ControllerRegistration(Editor):
 
 		Return True on success.
 		"""
-		# Build list of button and axes
-		buttons = self._tester.buttons
-		axes = self._tester.axes
-
-		# Generate database ID
-		wordswap = lambda i: ((i & 0xFF) << 8) | ((i & 0xFF00) >> 8)
-		# TODO: version?
-		weird_id = "%.4x%.8x%.8x%.8x0000" % (
-				wordswap(self._evdevice.info.bustype),
-				wordswap(self._evdevice.info.vendor),
-				wordswap(self._evdevice.info.product),
-				wordswap(self._evdevice.info.version)
-		)
+		# Build list of button and axes, ordered as SDL numbers them
+		buttons = get_sdl_buttons(self._tester.buttons)
+		axes = get_sdl_axes(self._tester.axes)
 
 		# Search in database
+		guid = get_guid(
+				self._evdevice.info.bustype,
+				self._evdevice.info.vendor,
+				self._evdevice.info.product,
+				self._evdevice.info.version
+		)
 		try:
-			db = open(os.path.join(get_share_path(), "gamecontrollerdb.txt"), "r")
+			mapping = get_database().get_mapping(guid)
 		except Exception as e:
 			log.error('Failed to load gamecontrollerdb')
 			log.exception(e)
 			return False
 
-		with db:
-			for line in db.readlines():
-				if line.startswith(weird_id):
-					log.info("Loading mappings for '%s' from gamecontrollerdb", weird_id)
-					log.debug("Buttons: %s", buttons)
-					log.debug("Axes: %s", axes)
-					for token in line.strip().split(","):
-						if ":" in token:
-							k, v = token.split(":", 1)
-							k = SDL_TO_SCC_NAMES.get(k, k)
-							if v.startswith("b") and hasattr(SCButtons, k.upper()):
-								try:
-									keycode = buttons[int(v.strip("b"))]
-								except IndexError:
-									log.warning("Skipping unknown gamecontrollerdb button->button mapping: '%s'", v)
-									continue
-								button  = getattr(SCButtons, k.upper())
-								self._mappings[keycode] = button
-							elif v.startswith("b") and k in SDL_AXES:
-								try:
-									keycode = buttons[int(v.strip("b"))]
-								except IndexError:
-									log.warning("Skipping unknown gamecontrollerdb button->axis mapping: '%s'", v)
-									continue
-								log.info("Adding button -> axis mapping for %s", k)
-								self._mappings[keycode] = self._axis_data[SDL_AXES.index(k)]
-								self._mappings[keycode].min = STICK_PAD_MIN
-								self._mappings[keycode].max = STICK_PAD_MAX
-							elif v.startswith("h") and 16 in axes and 17 in axes:
-								# Special case for evdev hatswitch
-								if v == "h0.1" and k == "dpup":
-									self._mappings[16] = self._axis_data[SDL_AXES.index("dpadx")]
-									self._mappings[17] = self._axis_data[SDL_AXES.index("dpady")]
-							elif k in SDL_AXES:
-								try:
-									code = axes[int(v.strip("a"))]
-								except IndexError:
-									log.warning("Skipping unknown gamecontrollerdb axis: '%s'", v)
-									continue
-								self._mappings[code] = self._axis_data[SDL_AXES.index(k)]
-							elif k in SDL_DPAD and v.startswith("b"):
-								try:
-									keycode = buttons[int(v.strip("b"))]
-								except IndexError:
-									log.warning("Skipping unknown gamecontrollerdb button->dpad mapping: %s", v)
-									continue
-								index, positive = SDL_DPAD[k]
-								data = DPadEmuData(self._axis_data[index], positive)
-								self._mappings[keycode] = data
-							elif k == "platform":
-								# Not interesting
-								pass
-							else:
-								log.warning("Skipping unknown gamecontrollerdb mapping %s:%s", k, v)
-					return True
-			else:
-				log.debug("Mappings for '%s' not found in gamecontrollerdb", weird_id)
+		if mapping is None:
+			log.debug("Mappings for '%s' not found in gamecontrollerdb", guid)
+			return False
 
-		return False
+		log.info("Loading mappings for '%s' from gamecontrollerdb", guid)
+		log.debug("Buttons: %s", buttons)
+		log.debug("Axes: %s", axes)
+		for k, v in mapping.fields.items():
+			k = SDL_TO_SCC_NAMES.get(k, k)
+			if v.startswith("b") and hasattr(SCButtons, k.upper()):
+				try:
+					keycode = buttons[int(v.strip("b"))]
+				except IndexError:
+					log.warning("Skipping unknown gamecontrollerdb button->button mapping: '%s'", v)
+					continue
+				button  = getattr(SCButtons, k.upper())
+				self._mappings[keycode] = button
+			elif v.startswith("b") and k in SDL_AXES:
+				try:
+					keycode = buttons[int(v.strip("b"))]
+				except IndexError:
+					log.warning("Skipping unknown gamecontrollerdb button->axis mapping: '%s'", v)
+					continue
+				log.info("Adding button -> axis mapping for %s", k)
+				self._mappings[keycode] = self._axis_data[SDL_AXES.index(k)]
+				self._mappings[keycode].min = STICK_PAD_MIN
+				self._mappings[keycode].max = STICK_PAD_MAX
+			elif v.startswith("h") and 16 in self._tester.axes and 17 in self._tester.axes:
+				# Special case for evdev hatswitch
+				if v == "h0.1" and k == "dpup":
+					self._mappings[16] = self._axis_data[SDL_AXES.index("dpadx")]
+					self._mappings[17] = self._axis_data[SDL_AXES.index("dpady")]
+			elif k in SDL_AXES:
+				try:
+					code = axes[int(v.strip("a"))]
+				except IndexError:
+					log.warning("Skipping unknown gamecontrollerdb axis: '%s'", v)
+					continue
+				self._mappings[code] = self._axis_data[SDL_AXES.index(k)]
+			elif k in SDL_DPAD and v.startswith("b"):
+				try:
+					keycode = buttons[int(v.strip("b"))]
+				except IndexError:
+					log.warning("Skipping unknown gamecontrollerdb button->dpad mapping: %s", v)
+					continue
+				index, positive = SDL_DPAD[k]
+				data = DPadEmuData(self._axis_data[index], positive)
+				self._mappings[keycode] = data
+			else:
+				log.warning("Skipping unknown gamecontrollerdb mapping %s:%s", k, v)
+		return True
 
 
 	def generate_mappings(self):
@@ -12,8 +12,8 @@ from io import StringIO
 from gi.repository import Gdk, GObject, GLib
 
 from scc.foreign.vdf import VDFProfile
+from scc.foreign.vdf_index import VdfIndex
 from scc.foreign.vdffz import VDFFZProfile
-from scc.lib.vdf import parse_vdf
 from scc.tools import _, get_profiles_path
 from scc.i18n import _
 
@@ -31,6 +31,7 @@ class ImportVdf:
 		self._s_games    = threading.Semaphore(0)
 		self._s_profiles = threading.Semaphore(0)
 		self._lock = threading.Lock()
+		self._index = VdfIndex()
 		self.__profile_load_started = False
 		self._on_preload_finished = None
 
@@ -60,6 +61,7 @@ class ImportVdf:
 					except Exception as e:
 						log.exception(e)
 					self._lock.release()
+		self._index.save()
 		GLib.idle_add(self._load_finished)
 
 	def _parse_profile_list(self, filename: str, userid: str) -> None | int:
@@ -68,28 +70,13 @@ class ImportVdf:
 		Called from _load_profiles, in thread. Exceptions are catched and logged from there.
 		Calls GLib.idle_add to send loaded data into UI.
 		"""
-		# VDF file is a ISO-8859-1 encoded file. Not UTF-8
-		data = parse_vdf(open(filename, "r", encoding = "ISO-8859-1"))
-		# Sanity check
-		if "UserLocalConfigStore" not in data:
-			return
-		if "controller_config" not in data["UserLocalConfigStore"]:
-			return
-
-		# Grab config - currently only grabs SC configs!
-		cc = data["UserLocalConfigStore"]["controller_config"][userid]["controller_steamcontroller_gordon"]["DEFAULT_FOR_TYPE"]
 		# Go through all games
 		listitems = []
 		i = 0
-		for gameid in cc:
-			# skip templates
-			if 'selected' not in cc[gameid]:
-				continue
-
+		for gameid, profile_id in self._index.get_games(filename, userid):
 			if not self._check_for_app_manifest(gameid):
 				continue
 
-			profile_id = cc[gameid]["selected"]
 			listitems.append(( i, gameid, profile_id, None ))
 			i += 1
 			if len(listitems) > 10:
@@ -115,8 +102,8 @@ class ImportVdf:
 		"""Load names for game ids in q_games.
 
 		This is done in thread (not in same thread as _load_profiles),
-		because it involves searching for apropriate file and parsing it
-		entirely.
+		because it involves searching for apropriate file and reading it,
+		unless name is already in index.
 
 		Calls GLib.idle_add to send loaded data into UI.
 		"""
@@ -128,6 +115,7 @@ class ImportVdf:
 			try:
 				index, gameid = self._q_games.popleft()
 			except IndexError:
+				self._index.save()
 				break
 			if gameid.isdigit():
 				name = _("Unknown App ID %s") % (gameid)
@@ -135,8 +123,7 @@ class ImportVdf:
 				self._lock.acquire()
 				if os.path.exists(filename):
 					try:
-						data = parse_vdf(open(filename, "r"))
-						name = data['AppState']['name']
+						name = self._index.get_game_name(filename)
 					except Exception as e:
 						log.error("Failed to load app manifest for '%s'", gameid)
 						log.exception(e)
@@ -163,6 +150,22 @@ class ImportVdf:
 		return None
 
 
+	def _find_profile(self, content_path: str, profile_id: str) -> str | None:
+		"""Search workshop content of every user for profile with given ID.
+
+		Returns filename of profile or None if it cannot be found.
+		"""
+		for user in os.listdir(content_path):
+			filename = os.path.join(content_path, user, profile_id, "controller_configuration.vdf")
+			if not os.path.exists(filename):
+				# If there is no 'controller_configuration.vdf', try finding *_legacy.bin
+				filename = self._find_legacy_bin(os.path.join(content_path, user, profile_id))
+			if filename and os.path.exists(filename):
+				return filename
+			# If not even *_legacy.bin is found, skip to next user
+		return None
+
+
 	def _load_profile_names(self) -> None:
 		"""Load names for profiles ids in q_profiles.
 
@@ -180,25 +183,21 @@ class ImportVdf:
 			try:
 				index, gameid, profile_id = self._q_profiles.popleft()
 			except IndexError:
+				self._index.save()
 				break
 			self._lock.acquire()
-			for user in os.listdir(content_path):
-				filename = os.path.join(content_path, user, profile_id, "controller_configuration.vdf")
-				if not os.path.exists(filename):
-					# If there is no 'controller_configuration.vdf', try finding *_legacy.bin
-					filename = self._find_legacy_bin(os.path.join(content_path, user, profile_id))
-				if not filename or not os.path.exists(filename):
-					# If not even *_legacy.bin is found, skip to next user
-					continue
+			filename = self._index.find_profile(profile_id,
+				lambda profile_id: self._find_profile(content_path, profile_id))
+			name = None
+			if filename:
 				log.info("Reading '%s'", filename)
 				try:
-					data = parse_vdf(open(filename, "r"))
-					name = data['controller_mappings']['title']
-					GLib.idle_add(self._set_profile_name, index, name, filename)
-					break
+					name = self._index.get_profile_title(filename)
 				except Exception as e:
 					log.error("Failed to read profile name from '%s'", filename)
 					log.exception(e)
+			if name is not None:
+				GLib.idle_add(self._set_profile_name, index, name, filename)
 			else:
 				log.warning("Profile %s for game %s not found.", profile_id, gameid)
 				name = _("(not found)")
@@ -266,9 +265,7 @@ class ImportVdf:
 	@staticmethod
 	def gen_aset_name(base_name: str, set_name: str) -> str:
 		"""Generate name for profile converted from action set."""
-		if set_name == "default":
-			return base_name
-		return "." + base_name + ":" + set_name.lower()
+		return VDFProfile.gen_aset_name(base_name, set_name)
 
 
 	def on_txName_changed(self, *a) -> None:
@@ -412,19 +409,6 @@ class ImportVdf:
 	def vdf_import_confirmed(self, *a) -> None:
 		name = self.builder.get_object("txName").get_text().strip()
 
-		if len(self._profile.action_sets) > 1:
-			# Update ChangeProfileActions with correct profile names
-			for x in self._profile.action_set_switches:
-				id = int(x._profile.split(":")[-1])
-				target_set = self._profile.action_set_by_id(id)
-				x._profile = self.gen_aset_name(name, target_set)
-
-			# Save action set profiles
-			for k in self._profile.action_sets:
-				if k != 'default':
-					filename = self.gen_aset_name(name, k) + ".sccprofile"
-					path = os.path.join(get_profiles_path(), filename)
-					self._profile.action_sets[k].save(path)
-
+		self._profile.save_action_sets(get_profiles_path(), name)
 		self.app.new_profile(self._profile, name)
 		GLib.idle_add(self.window.destroy)
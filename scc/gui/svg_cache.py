@@ -0,0 +1,234 @@
+"""SC Controller - SVG render cache
+
+Parts of SVGWidget that are cached between and across processes:
+ - SVGTemplate - document parsed once, with index of elements by ID. Document
+   with recolored elements is assembled from pre-serialized chunks, without
+   parsing and serializing whole tree again.
+ - RenderCache - PNG images rendered from SVG documents, stored on disk in
+   ~/.config/scc/cache/svg and keyed by document hash, highlighted elements
+   and size, so GUI, OSD and every new process can reuse them.
+
+Nothing here depends on Gtk; rendering itself is done by SVGWidget.
+"""
+import hashlib
+import logging
+import os
+import queue
+import re
+import threading
+from xml.etree import ElementTree as ET
+
+from scc.paths import get_config_path
+from scc.tools import write_atomic
+
+log = logging.getLogger("SVGCache")
+
+# Elements which fill SVGEditor.recolor changes
+SHAPES = ("path", "rect", "circle", "ellipse", "text")
+SLOT_MARK = "scc-slot:%s:"
+RE_SLOT = re.compile(r"scc-slot:(\d+):")
+
+
+def recolor_style(style, color):
+	"""
+	Returns value of 'style' attribute with fill changed to 'color', which is
+	RRGGBB or AARRGGBB string. Returns None if style has no fill to change.
+	"""
+	style = { y[0] : y[1] for y in [ x.split(":", 1) for x in style.split(";") ] }
+	if 'fill' not in style:
+		return None
+	if len(color.strip("#")) == 8:
+		style['fill'] = "#%s" % (color[-6:],)
+		alpha = float(int(color.strip("#")[0:2], 16)) / 255.0
+		style['fill-opacity'] = style['opacity'] = str(alpha)
+	else:
+		style['fill'] = color
+		style['fill-opacity'] = style['opacity'] = "1"
+	return ";".join([ "%s:%s" % (x, style[x]) for x in style ])
+
+
+def get_digest(svg):
+	""" Returns hash of SVG document, usable as part of RenderCache key """
+	if type(svg) == str:
+		svg = svg.encode("utf-8")
+	return hashlib.sha1(svg).hexdigest()
+
+
+def _escape_attrib(text):
+	""" Escapes attribute value as ElementTree does """
+	if "&" in text: text = text.replace("&", "&amp;")
+	if "<" in text: text = text.replace("<", "&lt;")
+	if ">" in text: text = text.replace(">", "&gt;")
+	if "\"" in text: text = text.replace("\"", "&quot;")
+	if "\r" in text: text = text.replace("\r", "&#13;")
+	if "\n" in text: text = text.replace("\n", "&#10;")
+	if "\t" in text: text = text.replace("\t", "&#09;")
+	return text
+
+
+class SVGTemplate:
+	"""
+	SVG document serialized with 'style' of every element that can be
+	recolored replaced by placeholder. render() then only replaces styles of
+	recolored elements and joins chunks back together.
+	"""
+
+	def __init__(self, svg):
+		tree = ET.fromstring(svg)
+		if RE_SLOT.search(svg if type(svg) == str else svg.decode("utf-8")):
+			raise ValueError("Document contains placeholder text")
+		self._ids = {}			# id -> element
+		self._id_slots = {}		# id -> list of slots, filled when needed
+		self._slots = {}		# element -> slot
+		self._styles = []		# original style of every slot
+		for element in tree.iter():
+			if element is not tree:
+				# Same element as SVGEditor.find_by_id would find
+				id = element.attrib.get('id')
+				if id is not None and id not in self._ids:
+					self._ids[id] = element
+			if element.tag.endswith(SHAPES) and 'style' in element.attrib:
+				self._slots[element] = len(self._styles)
+				self._styles.append(element.attrib['style'])
+				element.attrib['style'] = SLOT_MARK % (self._slots[element],)
+		# Every odd part is number of slot; it's replaced by escaped style
+		self._parts = RE_SLOT.split(ET.tostring(tree, encoding="unicode"))
+		for i in range(1, len(self._parts), 2):
+			self._parts[i] = _escape_attrib(self._styles[int(self._parts[i])])
+
+
+	def _get_slots(self, element):
+		""" Returns slots of elements that SVGEditor.recolor would change """
+		if element.tag.endswith(SHAPES):
+			slot = self._slots.get(element)
+			return [] if slot is None else [ slot ]
+		elif element.tag.endswith("g"):
+			rv = []
+			for child in element:
+				rv += self._get_slots(child)
+			return rv
+		return []
+
+
+	def render(self, buttons):
+		"""
+		Returns SVG document as bytes, with elements recolored in same way
+		as by calling SVGEditor.recolor(element, color) for every ID and
+		color in 'buttons' dict.
+		"""
+		styles = {}
+		for id in buttons:
+			if id not in self._id_slots:
+				element = self._ids.get(id)
+				self._id_slots[id] = [] if element is None else self._get_slots(element)
+			for slot in self._id_slots[id]:
+				style = recolor_style(styles.get(slot, self._styles[slot]), buttons[id])
+				if style is not None:
+					styles[slot] = style
+		parts = self._parts
+		if styles:
+			parts = list(parts)
+			for slot, style in styles.items():
+				parts[slot * 2 + 1] = _escape_attrib(style)
+		return "".join(parts).encode("us-ascii", "xmlcharrefreplace")
+
+
+class RenderCache:
+	"""
+	Rendered images stored on disk as PNG files. Every process writes
+	complete file under temporary name and renames it, so others never
+	read partially written image.
+
+	Images passed to store_later are encoded and stored by single background
+	thread, so rendering thread doesn't wait for PNG encoding, disk or
+	pruning.
+	"""
+	# Oldest images are removed when there is more of them
+	MAX_FILES = 500
+	# How often is number of images checked
+	PRUNE_INTERVAL = 50
+
+	def __init__(self, path=None):
+		self.path = path or os.path.join(get_config_path(), "cache", "svg")
+		self._stored = 0
+		self._queue = queue.Queue()
+		self._thread = None
+		self._lock = threading.Lock()
+
+
+	def get_filename(self, digest, cache_id, size):
+		"""
+		Returns name of file for image rendered from document with given
+		digest (see get_digest), with highlights described by 'cache_id'
+		and scaled to size, which is (width, height) tuple or None.
+		"""
+		key = "%s\n%s\n%s" % (digest, cache_id, size)
+		return os.path.join(self.path, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".png")
+
+
+	def load(self, digest, cache_id, size):
+		""" Returns PNG data stored in cache or None """
+		try:
+			with open(self.get_filename(digest, cache_id, size), "rb") as f:
+				return f.read()
+		except OSError:
+			return None
+
+
+	def store(self, digest, cache_id, size, data):
+		""" Stores PNG data. Failure is only logged """
+		filename = self.get_filename(digest, cache_id, size)
+		try:
+			if self._stored % RenderCache.PRUNE_INTERVAL == 0:
+				self.prune()
+			self._stored += 1
+			write_atomic(filename, data)
+		except OSError as e:
+			log.debug("Failed to store rendered image: %s", e)
+
+
+	def store_later(self, digest, cache_id, size, encode):
+		"""
+		Calls encode() on background thread and stores PNG data it returns,
+		unless it returns None. Failure is only logged.
+		"""
+		with self._lock:
+			if self._thread is None:
+				self._thread = threading.Thread(target=self._worker, daemon=True,
+					name="RenderCache")
+				self._thread.start()
+		self._queue.put((digest, cache_id, size, encode))
+
+
+	def join(self):
+		""" Waits until everything passed to store_later is stored """
+		self._queue.join()
+
+
+	def _worker(self):
+		while True:
+			digest, cache_id, size, encode = self._queue.get()
+			try:
+				data = encode()
+				if data is not None:
+					self.store(digest, cache_id, size, data)
+			except Exception as e:
+				log.debug("Failed to encode rendered image: %s", e)
+			finally:
+				self._queue.task_done()
+
+
+	def prune(self):
+		""" Removes oldest images if there is more than MAX_FILES of them """
+		try:
+			entries = [ e for e in os.scandir(self.path) if e.name.endswith(".png") ]
+		except OSError:
+			return
+		if len(entries) <= RenderCache.MAX_FILES:
+			return
+		entries.sort(key=lambda e: e.stat().st_mtime)
+		for e in entries[0:len(entries) - RenderCache.MAX_FILES // 2]:
+			try:
+				os.unlink(e.path)
+			except OSError:
+				pass
@@ -4,6 +4,7 @@ Changes SVG on the fly and uptates that magnificent image on background with it.
 Also supports clicking on areas defined in SVG image.
 """
 from scc.tools import _
+from scc.gui.svg_cache import SHAPES, RenderCache, SVGTemplate, get_digest, recolor_style
 
 from gi.repository import Gtk, Gdk, GObject, GdkPixbuf, Rsvg
 from xml.etree import ElementTree as ET
@@ -23,6 +24,8 @@ ET.register_namespace("", "http://www.w3.org/2000/svg")
 class SVGWidget(Gtk.EventBox):
 	FILENAME = "background.svg"
 	CACHE_SIZE = 50
+	# Shared by all widgets. Images stored there are shared by all processes
+	DISK_CACHE = RenderCache()
 
 	__gsignals__ = {
 			# Raised when mouse is over defined area
@@ -38,6 +41,9 @@ class SVGWidget(Gtk.EventBox):
 		Gtk.EventBox.__init__(self)
 		self.cache = OrderedDict()
 		self.areas = []
+		self._template_source = None
+		self._template = None
+		self._digest = None
 
 		self.connect("motion-notify-event", self.on_mouse_moved)
 		self.connect("button-press-event", self.on_mouse_click)
@@ -78,11 +84,9 @@ class SVGWidget(Gtk.EventBox):
 	def resize(self, width, height):
 		"""
 		Overrides image size.
-		Doesn't keep aspect ratio and causes cache to be flushed,
-		so this may be slow and nasty.
+		Doesn't keep aspect ratio. Images in other sizes stay cached.
 		"""
 		self.size_override = width, height
-		self.cache = OrderedDict()
 
 
 	def on_mouse_click(self, trash, event):
@@ -192,40 +196,75 @@ class SVGWidget(Gtk.EventBox):
 		return 1, 0, 1, 1	# uggly purple
 
 
-	def hilight(self, buttons):
-		""" Hilights specified button, if same ID is found in svg """
-		cache_id = "|".join([ "%s:%s" % (x, buttons[x]) for x in buttons ])
-		if not cache_id in self.cache:
-			# Ok, this is close to madness, but probably better than drawing
-			# 200 images by hand;
-			if len(buttons) == 0:
-				# Quick way out - changes are not needed
-				tmp = self.current_svg.encode('utf-8') if type(self.current_svg) == str else self.current_svg
-				svg = Rsvg.Handle.new_from_data(tmp)
-			else:
-				# 1st, parse source as XML
+	def _check_image(self):
+		"""
+		Computes digest of current image if image was changed since last
+		call. Nothing rendered from previous image is kept.
+		"""
+		if self._template_source is not self.current_svg:
+			self._template_source = self.current_svg
+			self._template = None
+			self._digest = get_digest(self.current_svg)
+			self.cache = OrderedDict()
+
+
+	def _render(self, buttons, cache_id):
+		""" Returns pixbuf with current image, recolored and scaled """
+		data = SVGWidget.DISK_CACHE.load(self._digest, cache_id, self.size_override)
+		if data is not None:
+			try:
+				loader = GdkPixbuf.PixbufLoader.new_with_type("png")
+				loader.write(data)
+				loader.close()
+				return loader.get_pixbuf()
+			except Exception as e:
+				log.debug("Failed to load cached image: %s", e)
+
+		if len(buttons) == 0:
+			# Quick way out - changes are not needed
+			tmp = self.current_svg.encode('utf-8') if type(self.current_svg) == str else self.current_svg
+			svg = Rsvg.Handle.new_from_data(tmp)
+		else:
+			try:
+				if self._template is None:
+					self._template = SVGTemplate(self.current_svg)
+				xml = self._template.render(buttons)
+			except ValueError:
+				# Image cannot be used as template, so it has to be recolored
+				# by parsing, changing and serializing it every time
 				tree = ET.fromstring(self.current_svg)
-				# 2nd, change colors of some elements
 				for button in buttons:
 					el = SVGEditor.find_by_id(tree, button)
 					if el is not None:
 						SVGEditor.recolor(el, buttons[button])
-
-				# 3rd, turn it back into XML string......
 				xml = ET.tostring(tree)
+			svg = Rsvg.Handle.new_from_data(xml)
+		pixbuf = svg.get_pixbuf()
+		if self.size_override:
+			w, h = self.size_override
+			pixbuf = pixbuf.scale_simple(w, h, GdkPixbuf.InterpType.BILINEAR)
+		def encode():
+			success, data = pixbuf.save_to_bufferv("png", [], [])
+			return data if success else None
+		SVGWidget.DISK_CACHE.store_later(self._digest, cache_id, self.size_override, encode)
+		return pixbuf
+
 
-				# ... and now, parse that as XML again......
-				svg = Rsvg.Handle.new_from_data(xml)
+	def hilight(self, buttons):
+		""" Hilights specified button, if same ID is found in svg """
+		self._check_image()
+		cache_id = "|".join([ "%s:%s" % (x, buttons[x]) for x in buttons ])
+		key = cache_id, self.size_override
+		pixbuf = self.cache.get(key)
+		if pixbuf is None:
+			pixbuf = self._render(buttons, cache_id)
 			while len(self.cache) >= self.CACHE_SIZE:
 				self.cache.popitem(False)
-			if self.size_override:
-				w, h = self.size_override
-				self.cache[cache_id] = svg.get_pixbuf().scale_simple(
-						w, h, GdkPixbuf.InterpType.BILINEAR)
-			else:
-				self.cache[cache_id] = svg.get_pixbuf()
+			self.cache[key] = pixbuf
+		else:
+			self.cache.move_to_end(key)
 
-		self.image.set_from_pixbuf(self.cache[cache_id])
+		self.image.set_from_pixbuf(pixbuf)
 
 
 	def get_pixbuf(self):
@@ -445,18 +484,11 @@ class SVGEditor:
 
 		Returns True on success, False if element cannot be recolored.
 		"""
-		if element.tag.endswith("path") or element.tag.endswith("rect") or element.tag.endswith("circle") or element.tag.endswith("ellipse") or element.tag.endswith("text"):
+		if element.tag.endswith(SHAPES):
 			if 'style' in element.attrib:
-				style = { y[0] : y[1] for y in [ x.split(":", 1) for x in element.attrib['style'].split(";") ] }
-				if 'fill' in style:
-					if len(color.strip("#")) == 8:
-						style['fill'] = "#%s" % (color[-6:],)
-						alpha = float(int(color.strip("#")[0:2], 16)) / 255.0
-						style['fill-opacity'] = style['opacity'] = str(alpha)
-					else:
-						style['fill'] = color
-						style['fill-opacity'] = style['opacity'] = "1"
-					element.attrib['style'] = ";".join([ "%s:%s" % (x, style[x]) for x in style ])
+				style = recolor_style(element.attrib['style'], color)
+				if style is not None:
+					element.attrib['style'] = style
 					return True
 		elif element.tag.endswith("g"):
 			# Group, needs to find RECT, CIRCLE or PATH, whatever comes first
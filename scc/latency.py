@@ -0,0 +1,106 @@
+"""SC Controller - Latency statistics
+
+Optional instrumentation measuring how long it takes for input received from
+controller to be turned into emulated events. Disabled by default; when
+disabled, cost is single check of 'enabled' per input.
+
+Every processed input is split into stages, measured between following
+timestamps:
+ - received   - poller woke up with data or USB transfer was completed
+ - entered    - Mapper.input was called
+ - dispatched - all actions were executed
+ - generating - scheduled tasks were executed and generate_events started
+ - flushed    - events were written to uinput devices
+
+Durations are stored in preallocated ring buffers, one set per Mapper (and
+so per controller). Percentiles are computed only when asked for.
+"""
+from array import array
+from time import perf_counter
+
+STAGES = ("receive", "dispatch", "scheduled", "generate", "total")
+RING_SIZE = 4096
+PERCENTILES = (50, 90, 99)
+
+# Set by SCCDaemon, checked by Mapper on every input
+enabled = False
+# Time when last input was received, see mark_received. None if there was
+# no input received since it was last taken by take_received
+received = None
+
+
+def mark_received():
+	"""
+	Stores time when data was received from device.
+	Called by poller and drivers only if 'enabled' is set.
+	"""
+	global received
+	received = perf_counter()
+
+
+def take_received():
+	"""
+	Returns time stored by mark_received and forgets it, so input processed
+	later without new data being received (by scheduled task, for example)
+	is not measured from same time again. Returns None if nothing was
+	received since last call.
+	"""
+	global received
+	rv, received = received, None
+	return rv
+
+
+def set_enabled(value):
+	global enabled
+	enabled = bool(value)
+
+
+class LatencyStats:
+	""" Ring buffers with durations of every stage, in seconds """
+
+	def __init__(self, size=RING_SIZE):
+		self._size = size
+		self._rings = [ array("d", bytes(8 * size)) for x in STAGES ]
+		self._index = 0
+		self._count = 0
+
+
+	def add(self, received, entered, dispatched, generating, flushed):
+		i = self._index
+		receive, dispatch, scheduled, generate, total = self._rings
+		if received is None:
+			# Input wasn't caused by received data; Scheduled task, for example
+			received = entered
+		receive[i] = entered - received
+		dispatch[i] = dispatched - entered
+		scheduled[i] = generating - dispatched
+		generate[i] = flushed - generating
+		total[i] = flushed - received
+		self._index = (i + 1) % self._size
+		if self._count < self._size:
+			self._count += 1
+
+
+	def get_count(self):
+		""" Returns number of stored samples """
+		return self._count
+
+
+	def summary(self):
+		"""
+		Returns list of (stage, count, p50, p90, p99, max) tuples computed
+		from stored samples. Durations are in microseconds.
+		"""
+		rv = []
+		count = self._count
+		for stage, ring in zip(STAGES, self._rings):
+			if count == 0:
+				rv.append((stage, 0) + (0.0,) * (len(PERCENTILES) + 1))
+				continue
+			values = sorted(ring[0:count])
+			row = [ stage, count ]
+			for p in PERCENTILES:
+				row.append(values[min(count - 1, count * p // 100)] * 1e6)
+			row.append(values[-1] * 1e6)
+			rv.append(tuple(row))
+		return rv
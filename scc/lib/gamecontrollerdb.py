@@ -0,0 +1,195 @@
+"""SC Controller - SDL game controller database
+
+Reads mappings from gamecontrollerdb.txt files, in format used by SDL
+(https://github.com/gabomdq/SDL_GameControllerDB), into dict indexed by GUID.
+
+Parsed database is cached in ~/.config/scc/cache/gamecontrollerdb.pickle and
+files are parsed again only when mtime or size of any of them changes.
+Database shipped with SC Controller is merged with user-supplied one from
+~/.config/scc/gamecontrollerdb.txt and with mappings from
+SDL_GAMECONTROLLERCONFIG environment variable, later mappings replacing
+earlier ones with same GUID.
+"""
+import logging
+import os
+import threading
+from collections import namedtuple
+
+from scc.paths import get_config_path, get_share_path
+from scc.tools import load_cache, store_cache
+
+log = logging.getLogger("GameControllerDB")
+
+# 'fields' is dict of SDL names ("a", "leftx", "dpup", ...) and bindings
+# ("b0", "a1", "h0.1", ...), without 'platform'
+Mapping = namedtuple('Mapping', 'guid name fields')
+
+# SDL names of buttons that are named differently in SCButtons
+SDL_TO_SCC_NAMES = {
+	'guide':			'C',
+	'leftstick':		'STICKPRESS',
+	'rightstick':		'RPAD',
+	'leftshoulder':		'LB',
+	'rightshoulder':	'RB',
+}
+
+# Evdev codes used to number buttons and axes in same way as SDL does
+BTN_MISC = 0x100
+BTN_JOYSTICK = 0x120
+ABS_HAT0X = 0x10
+ABS_HAT3Y = 0x17
+
+PLATFORM = "Linux"
+ENV_VARIABLE = "SDL_GAMECONTROLLERCONFIG"
+
+
+def get_guid(bustype: int, vendor: int, product: int, version: int) -> str:
+	""" Returns GUID that SDL uses on Linux for device with given ids """
+	wordswap = lambda i: ((i & 0xFF) << 8) | ((i & 0xFF00) >> 8)
+	return "%.4x0000%.4x0000%.4x0000%.4x0000" % (
+		wordswap(bustype), wordswap(vendor),
+		wordswap(product), wordswap(version))
+
+
+def get_sdl_buttons(codes) -> list:
+	"""
+	Returns evdev button codes ordered so 'bN' in mapping refers to N-th
+	item of returned list. SDL numbers joystick and gamepad buttons first
+	and 'misc' buttons after them.
+	"""
+	codes = sorted(codes)
+	return ([ x for x in codes if x >= BTN_JOYSTICK ]
+		+ [ x for x in codes if BTN_MISC <= x < BTN_JOYSTICK ])
+
+
+def get_sdl_axes(codes) -> list:
+	"""
+	Returns evdev axis codes ordered so 'aN' in mapping refers to N-th item
+	of returned list. Hat switches are not numbered as axes.
+	"""
+	return [ x for x in sorted(codes) if not ABS_HAT0X <= x <= ABS_HAT3Y ]
+
+
+def parse_mappings(lines) -> dict:
+	"""
+	Parses lines in gamecontrollerdb.txt format.
+	Returns dict of GUID -> Mapping. Mappings for other platforms are skipped.
+	"""
+	mappings = {}
+	for line in lines:
+		line = line.strip()
+		if not line or line.startswith("#"):
+			continue
+		tokens = line.split(",")
+		if len(tokens) < 3:
+			continue
+		guid, name = tokens[0].lower(), tokens[1]
+		fields = {}
+		for token in tokens[2:]:
+			if ":" in token:
+				k, v = token.split(":", 1)
+				fields[k.strip()] = v.strip()
+		if fields.pop("platform", PLATFORM) != PLATFORM:
+			continue
+		mappings[guid] = Mapping(guid, name, fields)
+	return mappings
+
+
+class GameControllerDB:
+	# Increase when format of cache file changes
+	VERSION = 1
+
+	def __init__(self, filenames=None, cache_file=None):
+		self.filenames = filenames if filenames is not None else [
+			os.path.join(get_share_path(), "gamecontrollerdb.txt"),
+			os.path.join(get_config_path(), "gamecontrollerdb.txt"),
+		]
+		self.cache_file = cache_file or os.path.join(get_config_path(),
+			"cache", "gamecontrollerdb.pickle")
+		self._sources = None
+		self._mappings = {}
+		self._lock = threading.Lock()
+
+
+	def get_mapping(self, guid: str) -> Mapping | None:
+		"""
+		Returns Mapping for given GUID or None if there is none. Mapping with
+		zeroed version is used if there is none for exact version.
+		"""
+		guid = guid.lower()
+		with self._lock:
+			self._refresh()
+			mapping = self._mappings.get(guid)
+			if mapping is None and len(guid) == 32:
+				mapping = self._mappings.get(guid[0:24] + "0000" + guid[28:])
+		return mapping
+
+
+	def __len__(self):
+		with self._lock:
+			self._refresh()
+			return len(self._mappings)
+
+
+	def _get_sources(self) -> list:
+		""" Returns [ filename, mtime, size ] for every existing database file """
+		sources = []
+		for filename in self.filenames:
+			try:
+				st = os.stat(filename)
+			except OSError:
+				continue
+			sources.append([ filename, st.st_mtime_ns, st.st_size ])
+		return sources
+
+
+	def _refresh(self):
+		""" Loads mappings, if not loaded yet or if any file has changed """
+		sources = self._get_sources()
+		if sources == self._sources:
+			return
+		self._sources = sources
+		self._mappings = self._read_cache(sources)
+		if self._mappings is None:
+			self._mappings = {}
+			for filename, mtime, size in sources:
+				try:
+					with open(filename, "r", encoding="utf-8", errors="replace") as f:
+						self._mappings.update(parse_mappings(f))
+				except OSError as e:
+					log.error("Failed to load '%s': %s", filename, e)
+			self._write_cache(sources)
+			log.debug("Loaded %s mappings from %s", len(self._mappings),
+				", ".join([ filename for filename, mtime, size in sources ]))
+		if os.environ.get(ENV_VARIABLE):
+			self._mappings.update(parse_mappings(os.environ[ENV_VARIABLE].split("\n")))
+
+
+	def _read_cache(self, sources) -> dict | None:
+		""" Returns cached mappings or None if cache is missing or outdated """
+		data = load_cache(self.cache_file, GameControllerDB.VERSION)
+		try:
+			if data is None or data["sources"] != sources:
+				return None
+			return { guid: Mapping(guid, name, fields)
+				for guid, (name, fields) in data["mappings"].items() }
+		except (KeyError, TypeError, ValueError) as e:
+			log.debug("Failed to use cached gamecontrollerdb: %s", e)
+			return None
+
+
+	def _write_cache(self, sources):
+		store_cache(self.cache_file, GameControllerDB.VERSION, {
+			"sources": sources,
+			"mappings": { guid: [ m.name, m.fields ] for guid, m in self._mappings.items() }
+		})
+
+
+_database = None
+
+def get_database() -> GameControllerDB:
+	""" Returns database shared by everything in process """
+	global _database
+	if _database is None:
+		_database = GameControllerDB()
+	return _database
@@ -12,6 +12,7 @@ import ctypes
 import fcntl
 import struct
 from enum import IntEnum
+from operator import itemgetter
 
 import ioctl_opt
 
@@ -336,7 +337,7 @@ class Parser:
 		self.code = code
 		self.value = 0
 		self.offset = offset
-		self.byte_offset = offset / 8
+		self.byte_offset = offset // 8
 		self.bit_offset = offset % 8
 		self.count = count
 		self.len = count * size
@@ -355,11 +356,17 @@ class Parser:
 			self.byte_len = 1
 			self.fmt = "<B"
 		self.additional_bits = offset % 8
+		self.mask = (1 << self.len) - 1
 
 
 	def decode(self, data):
-		self.value, = struct.unpack(self.fmt, data[self.byte_offset: self.byte_offset + self.byte_len])
-		self.value >>= self.additional_bits
+		if self.additional_bits == 0 and self.len == self.byte_len * 8:
+			self.value, = struct.unpack_from(self.fmt, data, self.byte_offset)
+		else:
+			# Value is not aligned to whole bytes and may span one more byte
+			end = (self.offset + self.len + 7) // 8
+			self.value = (int.from_bytes(data[self.byte_offset:end], "little")
+				>> self.additional_bits) & self.mask
 
 HIDPARSE_TYPE_AXIS = 1
 HIDPARSE_TYPE_BUTTONS = 2
@@ -405,6 +412,65 @@ def make_parsers(data):
 					parsers.append(HIDButtonParser(buttons_id, offset, count, size))
 					buttons_id += count
 			offset += size * count
-	size = offset / 8
+	size = offset // 8
 	if offset % 8 > 0: size += 1
 	return size, parsers
+
+
+class CompiledParsers:
+	"""
+	Decodes all fields described by list of parsers at once.
+
+	Fields aligned to whole bytes and 8, 16, 32 or 64 bits long are read by
+	single struct.Struct; remaining fields are shifted and masked out of
+	report converted to one integer. Decoded values are stored in
+	preallocated 'values' list, in same order as parsers were given.
+
+	Nothing in SC Controller itself uses this; HID driver decodes reports
+	in libhiddrv and uses parsers only to build its configuration. It's
+	meant for tools reading reports from hidraw in Python.
+	"""
+	FORMATS = { 8: "B", 16: "H", 32: "I", 64: "Q" }
+
+	def __init__(self, parsers):
+		self.parsers = list(parsers)
+		self.values = [ 0 ] * len(self.parsers)
+		aligned, bits = [], []
+		fmt, position = "<", 0
+		for index, p in sorted(enumerate(self.parsers), key=lambda x: x[1].offset):
+			if p.offset % 8 == 0 and p.len in CompiledParsers.FORMATS and p.byte_offset >= position:
+				if p.byte_offset > position:
+					fmt += "%sx" % (p.byte_offset - position, )
+				fmt += CompiledParsers.FORMATS[p.len]
+				position = p.byte_offset + p.len // 8
+				aligned.append(index)
+			else:
+				bits.append(index)
+		self._struct = struct.Struct(fmt) if aligned else None
+		self._bits = tuple((self.parsers[i].offset, self.parsers[i].mask) for i in bits)
+		self._bits_size = max([ (self.parsers[i].offset + self.parsers[i].len + 7) // 8 for i in bits ] or [ 0 ])
+		# Values are read ordered as 'aligned + bits' and reordered to
+		# order of parsers by single itemgetter call
+		order = aligned + bits
+		if order == list(range(len(order))):
+			self._reorder = None
+		elif len(order) > 1:
+			self._reorder = itemgetter(*[ order.index(i) for i in range(len(order)) ])
+		else:
+			self._reorder = None
+		self.size = max(position, self._bits_size)
+
+
+	def decode(self, data):
+		"""
+		Decodes report from bytes, bytearray or memoryview.
+		Returns 'values' list, which is overwritten by every call.
+		"""
+		values = self._struct.unpack_from(data) if self._struct else ()
+		if self._bits:
+			report = int.from_bytes(data[0:self._bits_size], "little")
+			values += tuple([ (report >> offset) & mask for offset, mask in self._bits ])
+		if self._reorder:
+			values = self._reorder(values)
+		self.values[:] = values
+		return self.values
@@ -0,0 +1,84 @@
+"""
+Minimal inotify binding using ctypes.
+
+Only what is needed to watch directories for created, removed and renamed
+files is implemented. Descriptor is non-blocking, so read() can be called
+any time and returns empty list when nothing has changed.
+"""
+import ctypes
+import os
+import struct
+
+IN_MOVED_FROM	= 0x00000040
+IN_MOVED_TO		= 0x00000080
+IN_CREATE		= 0x00000100
+IN_DELETE		= 0x00000200
+IN_DELETE_SELF	= 0x00000400
+IN_MOVE_SELF	= 0x00000800
+IN_Q_OVERFLOW	= 0x00004000
+IN_IGNORED		= 0x00008000
+IN_ONLYDIR		= 0x01000000
+IN_ISDIR		= 0x40000000
+
+IN_CLOEXEC		= os.O_CLOEXEC
+IN_NONBLOCK		= os.O_NONBLOCK
+
+# struct inotify_event, without name that follows it
+_EVENT = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+
+class Inotify:
+
+	def __init__(self):
+		self._libc = ctypes.CDLL(None, use_errno=True)
+		self._libc.inotify_add_watch.argtypes = [ ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32 ]
+		self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+		if self._fd < 0:
+			e = ctypes.get_errno()
+			raise OSError(e, os.strerror(e))
+
+
+	def fileno(self):
+		return self._fd
+
+
+	def add_watch(self, path, mask):
+		"""
+		Starts watching 'path' and returns watch descriptor.
+		Returns same descriptor when called again for same path.
+		Throws OSError if path cannot be watched.
+		"""
+		wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+		if wd < 0:
+			e = ctypes.get_errno()
+			raise OSError(e, os.strerror(e), path)
+		return wd
+
+
+	def rm_watch(self, wd):
+		""" Stops watching. Errors, such as already removed watch, are ignored """
+		self._libc.inotify_rm_watch(self._fd, wd)
+
+
+	def read(self):
+		""" Returns list of (wd, mask, cookie, name) tuples for all pending events """
+		rv = []
+		while True:
+			try:
+				data = os.read(self._fd, _READ_SIZE)
+			except BlockingIOError:
+				return rv
+			offset = 0
+			while offset + _EVENT.size <= len(data):
+				wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+				offset += _EVENT.size
+				name = data[offset:offset + length].rstrip(b"\0")
+				offset += length
+				rv.append((wd, mask, cookie, os.fsdecode(name)))
+
+
+	def close(self):
+		if self._fd >= 0:
+			os.close(self._fd)
+			self._fd = -1
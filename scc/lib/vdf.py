@@ -15,13 +15,170 @@ You should have received a copy of the GNU General Public License along
 with this program; if not, write to the Free Software Foundation, Inc.,
 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 """
+import re
+
 import vdf
 
+# Events yielded by iter_vdf
+BLOCK_START = "start"
+BLOCK_END = "end"
+KEY_VALUE = "value"
+
+# Same expression as used by vdf.parse
+RE_KEYVALUE = re.compile(r'^("(?P<qkey>(?:\\.|[^\\"])*)"|(?P<key>#?[a-z0-9\-\_\\\?$%<>]+))'
+						r'([ \t]*('
+						r'"(?P<qval>(?:\\.|[^\\"])*)(?P<vq_end>")?'
+						r'|(?P<val>(?:(?<!/)/(?!/)|[a-z0-9\-\_\\\?\*\.$<> ])+)'
+						r'|(?P<sblock>{[ \t]*)(?P<eblock>})?'
+						r'))?',
+						flags=re.I)
+
 
 def parse_vdf(file):
 	return vdf.parse(file, mapper=vdf.VDFDict, merge_duplicate_keys=False)
 
 
+def iter_vdf(file):
+	"""
+	Reads VDF document line by line and yields (event, key, value) tuples
+	as it goes, so caller can stop reading as soon as it has what it needs.
+	Events are:
+	 - (BLOCK_START, key, None) when block is opened
+	 - (BLOCK_END, None, None) when block is closed
+	 - (KEY_VALUE, key, value) for every key with value
+
+	Accepts same documents as parse_vdf and throws SyntaxError on same errors.
+	"""
+	name = getattr(file, 'name', '<%s>' % file.__class__.__name__)
+	depth = 0
+	expect_bracket = False
+	lineno, line = 0, ""
+
+	for lineno, line in enumerate(file, 1):
+		if lineno == 1:
+			line = vdf.strip_bom(line)
+		line = line.lstrip()
+
+		# Skip empty and comment lines
+		if line == "" or line[0] == '/':
+			continue
+
+		# One level deeper
+		if line[0] == "{":
+			expect_bracket = False
+			continue
+
+		if expect_bracket:
+			raise SyntaxError("vdf.parse: expected openning bracket",
+				(name, lineno, 1, line))
+
+		# One level back
+		if line[0] == "}":
+			if depth > 0:
+				depth -= 1
+				yield BLOCK_END, None, None
+				continue
+			raise SyntaxError("vdf.parse: one too many closing parenthasis",
+				(name, lineno, 0, line))
+
+		while True:
+			match = RE_KEYVALUE.match(line)
+			if not match:
+				try:
+					line += next(file)
+					continue
+				except StopIteration:
+					raise SyntaxError("vdf.parse: unexpected EOF (open key quote?)",
+						(name, lineno, 0, line))
+
+			key = match.group('key') if match.group('qkey') is None else match.group('qkey')
+			key = vdf._unescape(key)
+			val = match.group('qval')
+			if val is None:
+				val = match.group('val')
+				if val is not None:
+					val = val.rstrip()
+					if val == "":
+						val = None
+
+			if val is None:
+				# Key followed by block
+				yield BLOCK_START, key, None
+				if match.group('eblock') is None:
+					depth += 1
+					if match.group('sblock') is None:
+						expect_bracket = True
+				else:
+					yield BLOCK_END, None, None
+			else:
+				if match.group('vq_end') is None and match.group('qval') is not None:
+					# Value continues on next line
+					try:
+						line += next(file)
+						continue
+					except StopIteration:
+						raise SyntaxError("vdf.parse: unexpected EOF (open quote for value?)",
+							(name, lineno, 0, line))
+				yield KEY_VALUE, key, vdf._unescape(val)
+			break
+
+	if depth != 0:
+		raise SyntaxError("vdf.parse: unclosed parenthasis or quotes (EOF)",
+			(name, lineno, 0, line))
+
+
+def get_vdf_value(file, *path):
+	"""
+	Returns value of key on given path, for example
+	get_vdf_value(file, "AppState", "name"), reading file only until
+	that key is found. Throws KeyError if there is no such key.
+	"""
+	path, stack = list(path), []
+	for event, key, value in iter_vdf(file):
+		if event == KEY_VALUE:
+			if key == path[-1] and len(stack) == len(path) - 1 and stack == path[:-1]:
+				return value
+		elif event == BLOCK_START:
+			stack.append(key)
+		else:
+			stack.pop()
+	raise KeyError("/".join(path))
+
+
+def parse_vdf_block(file, *path):
+	"""
+	Returns block on given path parsed in same way as by parse_vdf,
+	reading file only until end of that block. Everything before it is
+	skipped without being stored. Throws KeyError if there is no such block.
+	"""
+	path, stack = list(path), []
+	events = iter_vdf(file)
+	for event, key, value in events:
+		if event == BLOCK_START:
+			if key == path[-1] and len(stack) == len(path) - 1 and stack == path[:-1]:
+				break
+			stack.append(key)
+		elif event == BLOCK_END:
+			stack.pop()
+	else:
+		raise KeyError("/".join(path))
+
+	stack = [ vdf.VDFDict() ]
+	for event, key, value in events:
+		if event == KEY_VALUE:
+			stack[-1][key] = value
+		elif event == BLOCK_START:
+			block = vdf.VDFDict()
+			stack[-1][key] = block
+			stack.append(block)
+		else:
+			block = stack.pop()
+			if not stack:
+				return block
+	# Not reached, iter_vdf throws SyntaxError on unclosed block
+	raise KeyError("/".join(path))
+
+
 def ensure_list(value):
 	"""If value is list, returns same value.
 
@@ -18,8 +18,10 @@ with this program; if not, write to the Free Software Foundation, Inc.,
 
 from ctypes import (
 	CDLL,
+	CFUNCTYPE,
 	POINTER,
 	Structure,
+	Union,
 	byref,
 	c_bool,
 	c_char_p,
@@ -120,6 +122,27 @@ class XWindowAttributes(Structure):
 		('screen', c_void_p)
 	]
 
+class XPropertyEvent(Structure):
+	_fields_ = [
+		('type', c_int),
+		('serial', c_ulong),
+		('send_event', c_int),
+		('display', c_void_p),
+		('window', XID),
+		('atom', Atom),
+		('time', c_ulong),
+		('state', c_int),
+	]
+
+class XEvent(Union):
+	_fields_ = [
+		('type', c_int),
+		('xproperty', XPropertyEvent),
+		('pad', c_long * 24),
+	]
+
+ErrorHandler = CFUNCTYPE(c_int, c_void_p, c_void_p)
+
 
 # Consants
 SHAPE_BOUNDING	= 0
@@ -133,6 +156,10 @@ SUCCESS			= 0
 
 ISVIEWABLE		= 2
 
+NOEVENTMASK			= 0
+PROPERTYCHANGEMASK	= 1 << 22
+PROPERTYNOTIFY		= 28
+
 
 # Functions
 open_display = libX11.XOpenDisplay
@@ -261,6 +288,29 @@ set_background = libX11.XSetBackground
 set_background.__doc__ = "Sets background color for drawing on graphics context"
 set_background.argtypes = set_foreground.argtypes
 
+select_input = libX11.XSelectInput
+select_input.__doc__ = "Sets which events from window should be reported"
+select_input.argtypes = [ c_void_p, XID, c_long ]
+
+connection_number = libX11.XConnectionNumber
+connection_number.__doc__ = "Returns file descriptor of connection to XServer"
+connection_number.argtypes = [ c_void_p ]
+connection_number.restype = c_int
+
+pending = libX11.XPending
+pending.__doc__ = "Flushes output buffer and returns number of events that can be read without blocking"
+pending.argtypes = [ c_void_p ]
+pending.restype = c_int
+
+next_event = libX11.XNextEvent
+next_event.__doc__ = "Reads next event, blocks if there is none"
+next_event.argtypes = [ c_void_p, POINTER(XEvent) ]
+
+set_error_handler = libX11.XSetErrorHandler
+set_error_handler.__doc__ = "Sets function called when XServer reports error"
+set_error_handler.argtypes = [ ErrorHandler ]
+set_error_handler.restype = c_void_p
+
 shape_combine_mask = libXext.XShapeCombineMask
 shape_combine_mask.__doc__ = "Sets 1-bit transparency mask for window"
 shape_combine_mask.argtypes = [ c_void_p, XID, c_int, c_int, c_int, Pixmap, c_int ]
@@ -278,6 +328,20 @@ def get_xkb_state(dpy):
 	return rec
 
 
+@ErrorHandler
+def _ignore_error(dpy, error):
+	return 0
+
+
+def ignore_errors():
+	"""
+	Replaces default error handler, which terminates entire process, with
+	one that ignores all errors. Usefull when dealing with windows of other
+	applications, which can be destroyed at any moment.
+	"""
+	set_error_handler(_ignore_error)
+
+
 def get_window_size(dpy, window):
 	attrs = XWindowAttributes()
 	get_window_attributes(dpy, window, byref(attrs))
@@ -3,6 +3,7 @@ import os
 import time
 import traceback
 
+from scc import latency
 from scc.actions import ButtonAction, GyroAbsAction
 from scc.aliases import ALL_AXES, ALL_BUTTONS
 from scc.config import Config
@@ -35,15 +36,18 @@ class Mapper:
 
 	def __init__(self, profile, scheduler, keyboard=b"SCController Keyboard",
 				mouse=b"SCController Mouse",
-				gamepad=True, poller=None):
+				gamepad=True, poller=None, clock=None):
 		"""If any of keyboard, mouse or gamepad is set to None, that device will not be emulated.
 
 		Emulated gamepad will have rumble enabled only if poller is set to instance and configuration allows it.
+		'clock' is function returning current time in seconds, used to compute time between inputs.
+		Defaults to time.time.
 		"""
 		self.profile = profile
 		self.controller = None
 		self.xdisplay = None
 		self.scheduler = scheduler
+		self.clock = clock or time.time
 
 		# Create virtual devices
 		log.debug("Creating virtual devices")
@@ -68,6 +72,10 @@ class Mapper:
 		self.buttons, self.old_buttons = 0, 0
 		self.lpad_touched = False
 		self.state, self.old_state = None, None
+		# Checks done by input(), see _compile_plan
+		self._plan, self._plan_profile, self._plan_flags = (), None, 0
+		# LatencyStats, created when latency statistics are enabled
+		self.latency = None
 		self.force_event = set()
 		self.time_elapsed = 0.0
 
@@ -205,7 +213,7 @@ class Mapper:
 		Delay is float number in seconds.
 		Callback is called with mapper as only argument.
 		"""
-		return self.scheduler.schedule(delay, cb, self)
+		return self.scheduler.schedule(delay, cb, self, owner=self)
 
 
 	def cancel_task(self, task):
@@ -213,6 +221,14 @@ class Mapper:
 		return self.scheduler.cancel_task(task)
 
 
+	def cancel_scheduled(self):
+		"""
+		Removes all tasks scheduled using this mapper.
+		Returns number of removed tasks.
+		"""
+		return self.scheduler.cancel_owned(self)
+
+
 	def mouse_move(self, dx, dy):
 		"""
 		Schedules mouse movement to be done at end of processing callback.
@@ -393,8 +409,68 @@ class Mapper:
 				a.reset()
 
 
+	def invalidate_plan(self):
+		"""
+		Forces input plan to be rebuilt before next input is processed.
+		Has to be called after actions in profile are replaced in place;
+		assigning new profile or controller is detected automatically.
+		"""
+		self._plan_profile = None
+
+
+	def _compile_plan(self):
+		"""
+		Builds list of checks done by input() on every frame.
+
+		Which checks are needed depends only on flags of current controller
+		and on which actions are set in profile, so it is decided once here
+		instead of being tested on every input. Checks for sources that have
+		no action assigned are left out completely.
+		"""
+		p, flags = self.profile, self.controller_flags()
+		pads, triggers = p.pads, p.triggers
+		plan = []
+		# Sticks
+		if p.stick:
+			if flags & ControllerFlags.SEPARATE_STICK:
+				plan.append(self._check_separate_stick)
+			else:
+				plan.append(self._check_shared_stick)
+		if flags & ControllerFlags.IS_DECK and p.rstick:
+			plan.append(self._check_rstick)
+		# Gyro
+		if p.gyro:
+			plan.append(self._check_gyro)
+		# Triggers
+		if triggers.get(LEFT):
+			plan.append(self._check_ltrig)
+		if triggers.get(RIGHT):
+			plan.append(self._check_rtrig)
+		# Pads
+		if pads.get(RIGHT):
+			if flags & (ControllerFlags.IS_DECK | ControllerFlags.HAS_RSTICK):
+				plan.append(self._check_rpad)
+			else:
+				plan.append(self._check_rpad_touch)
+		if flags & ControllerFlags.IS_DECK and pads.get(DPAD):
+			plan.append(self._check_dpad)
+		if flags & ControllerFlags.SEPARATE_STICK:
+			if pads.get(LEFT):
+				plan.append(self._check_lpad)
+		elif pads.get(LEFT) or p.stick:
+			plan.append(self._check_shared_lpad)
+		if flags & ControllerFlags.HAS_CPAD and pads.get(CPAD):
+			plan.append(self._check_cpad)
+
+		self._plan = tuple(plan)
+		self._plan_profile, self._plan_flags = p, flags
+
+
 	def input(self, controller, old_state, state):
 #		print(type(controller), type(old_state), type(state))
+		measure = latency.enabled
+		if measure:
+			entered = time.perf_counter()
 		# Store states
 		self.old_state = old_state
 		self.old_buttons = self.buttons
@@ -402,7 +478,7 @@ class Mapper:
 		self.state = state
 		self.buttons = state.buttons
 
-		t = time.time()
+		t = self.clock()
 		controller.time_elapsed = self.time_elapsed = t - controller.lastTime
 		controller.lastTime = t
 
@@ -412,90 +488,31 @@ class Mapper:
 		fe = self.force_event
 		self.force_event = set()
 
+		if self._plan_profile is not self.profile or self._plan_flags != self.controller_flags():
+			self._compile_plan()
+
 		# Check buttons
 		xor = self.old_buttons ^ self.buttons
 		btn_rem = xor & self.old_buttons
 		btn_add = xor & self.buttons
 
 		try:
-			if btn_add or btn_rem:
-				# At least one button was pressed
-				for x in self.profile.buttons:
-					if x & btn_add:
-						self.profile.buttons[x].button_press(self)
-					elif x & btn_rem:
-						self.profile.buttons[x].button_release(self)
-
-
-			# Check sticks
-			if self.controller.flags & ControllerFlags.SEPARATE_STICK:
-				if FE_STICK in fe or self.old_state.stick_x != state.stick_x or self.old_state.stick_y != state.stick_y:
-					self.profile.stick.whole(self, state.stick_x, state.stick_y, STICK)
-			elif not self.buttons & SCButtons.LPADTOUCH:
-				if FE_STICK in fe or self.old_state.lpad_x != state.lpad_x or self.old_state.lpad_y != state.lpad_y:
-					self.profile.stick.whole(self, state.lpad_x, state.lpad_y, STICK)
-			if self.controller.flags & ControllerFlags.IS_DECK:
-				if FE_STICK in fe or self.old_state.rstick_x != state.rstick_x or self.old_state.rstick_y != state.rstick_y:
-					self.profile.rstick.whole(self, state.rstick_x, state.rstick_y, RSTICK)
-
-			# Check gyro
-			if controller.get_gyro_enabled():
-				self.profile.gyro.gyro(self, state.gpitch, state.gyaw, state.groll, state.q1, state.q2, state.q3, state.q4)
-
-			# Check triggers
-			if FE_TRIGGER in fe or state.ltrig != self.old_state.ltrig:
-				if LEFT in self.profile.triggers:
-					self.profile.triggers[LEFT].trigger(self, state.ltrig, self.old_state.ltrig)
-			if FE_TRIGGER in fe or state.rtrig != self.old_state.rtrig:
-				if RIGHT in self.profile.triggers:
-					self.profile.triggers[RIGHT].trigger(self, state.rtrig, self.old_state.rtrig)
-
-			# Check pads
-			# RPAD
-			if controller.flags & ControllerFlags.IS_DECK:
-				if FE_PAD in fe or self.old_state.rpad_x != state.rpad_x or self.old_state.rpad_y != state.rpad_y:
-					self.profile.pads[RIGHT].whole(self, state.rpad_x, state.rpad_y, RIGHT)
-			elif controller.flags & ControllerFlags.HAS_RSTICK:
-				if FE_PAD in fe or self.old_state.rpad_x != state.rpad_x or self.old_state.rpad_y != state.rpad_y:
-					self.profile.pads[RIGHT].whole(self, state.rpad_x, state.rpad_y, RIGHT)
-			elif FE_PAD in fe or self.buttons & SCButtons.RPADTOUCH or SCButtons.RPADTOUCH & btn_rem:
-				self.profile.pads[RIGHT].whole(self, state.rpad_x, state.rpad_y, RIGHT)
-			# DPAD
-			if controller.flags & ControllerFlags.IS_DECK:
-				if FE_PAD in fe or self.old_state.dpad_x != state.dpad_x or self.old_state.dpad_y != state.dpad_y:
-					self.profile.pads[DPAD].whole(self, state.dpad_x, state.dpad_y, DPAD)
-
-			# LPAD
-			if self.controller.flags & ControllerFlags.SEPARATE_STICK:
-				if FE_PAD in fe or self.old_state.lpad_x != state.lpad_x or self.old_state.lpad_y != state.lpad_y:
-					self.profile.pads[LEFT].whole(self, state.lpad_x, state.lpad_y, LEFT)
-			else:
-				if self.buttons & SCButtons.LPADTOUCH:
-					# Pad is being touched now
-					if not self.lpad_touched:
-						self.lpad_touched = True
-					self.profile.pads[LEFT].whole(self, state.lpad_x, state.lpad_y, LEFT)
-					if self.old_state.buttons & STICKTILT and not self.buttons & STICKTILT:
-						# LPAD and stick share axes and so when they are used simultaneously (by someone with 3 hands or so :)
-						# this is how mapper can tell that stick was recentered
-						self.profile.stick.whole(self, 0, 0, STICK)
-				elif not self.buttons & STICKTILT:
-					# Pad is not being touched
-					if self.lpad_touched:
-						self.lpad_touched = False
-						self.profile.pads[LEFT].whole(self, 0, 0, LEFT)
-
-			# CPAD (touchpad on DS4 controller)
-			if controller.flags & ControllerFlags.HAS_CPAD:
-				if ((FE_PAD in fe)
-						or (self.old_state.cpad_x != state.cpad_x)
-						or (self.old_state.cpad_y != state.cpad_y)
-						or ((self.old_buttons & SCButtons.CPADTOUCH) and not (self.buttons & SCButtons.CPADTOUCH))
-					):
-					if self.buttons & SCButtons.CPADTOUCH:
-						self.profile.pads[CPAD].whole(self, state.cpad_x, state.cpad_y, CPAD)
-					elif self.old_buttons & SCButtons.CPADTOUCH:
-						self.profile.pads[CPAD].whole(self, 0, 0, CPAD)
+			if xor:
+				# At least one button was pressed or released.
+				# Changed bits are visited from lowest one.
+				buttons = self.profile.buttons
+				while xor:
+					bit = xor & -xor
+					xor ^= bit
+					action = buttons.get(bit)
+					if action:
+						if bit & btn_add:
+							action.button_press(self)
+						else:
+							action.button_release(self)
+
+			for check in self._plan:
+				check(state, old_state, fe, btn_rem)
 		except Exception:
 			# Log error but don't crash here, it breaks too many things at once
 			if hasattr(self, "_testing"):
@@ -503,12 +520,100 @@ class Mapper:
 			log.error("Error while processing controller event")
 			log.error(traceback.format_exc())
 
+		if measure:
+			dispatched = time.perf_counter()
 		# TODO: Is it important to run scheduled stuff before generate_events?
 		self.scheduler.run()
+		if measure:
+			generating = time.perf_counter()
 		self.generate_events()
+		if measure:
+			if self.latency is None:
+				self.latency = latency.LatencyStats()
+			self.latency.add(latency.take_received(), entered, dispatched, generating, time.perf_counter())
 		self.generate_feedback()
 
 
+	def _check_separate_stick(self, state, old_state, fe, btn_rem):
+		if FE_STICK in fe or old_state.stick_x != state.stick_x or old_state.stick_y != state.stick_y:
+			self.profile.stick.whole(self, state.stick_x, state.stick_y, STICK)
+
+
+	def _check_shared_stick(self, state, old_state, fe, btn_rem):
+		if not self.buttons & SCButtons.LPADTOUCH:
+			if FE_STICK in fe or old_state.lpad_x != state.lpad_x or old_state.lpad_y != state.lpad_y:
+				self.profile.stick.whole(self, state.lpad_x, state.lpad_y, STICK)
+
+
+	def _check_rstick(self, state, old_state, fe, btn_rem):
+		if FE_STICK in fe or old_state.rstick_x != state.rstick_x or old_state.rstick_y != state.rstick_y:
+			self.profile.rstick.whole(self, state.rstick_x, state.rstick_y, RSTICK)
+
+
+	def _check_gyro(self, state, old_state, fe, btn_rem):
+		if self.controller.get_gyro_enabled():
+			self.profile.gyro.gyro(self, state.gpitch, state.gyaw, state.groll, state.q1, state.q2, state.q3, state.q4)
+
+
+	def _check_ltrig(self, state, old_state, fe, btn_rem):
+		if FE_TRIGGER in fe or state.ltrig != old_state.ltrig:
+			self.profile.triggers[LEFT].trigger(self, state.ltrig, old_state.ltrig)
+
+
+	def _check_rtrig(self, state, old_state, fe, btn_rem):
+		if FE_TRIGGER in fe or state.rtrig != old_state.rtrig:
+			self.profile.triggers[RIGHT].trigger(self, state.rtrig, old_state.rtrig)
+
+
+	def _check_rpad(self, state, old_state, fe, btn_rem):
+		if FE_PAD in fe or old_state.rpad_x != state.rpad_x or old_state.rpad_y != state.rpad_y:
+			self.profile.pads[RIGHT].whole(self, state.rpad_x, state.rpad_y, RIGHT)
+
+
+	def _check_rpad_touch(self, state, old_state, fe, btn_rem):
+		if FE_PAD in fe or self.buttons & SCButtons.RPADTOUCH or SCButtons.RPADTOUCH & btn_rem:
+			self.profile.pads[RIGHT].whole(self, state.rpad_x, state.rpad_y, RIGHT)
+
+
+	def _check_dpad(self, state, old_state, fe, btn_rem):
+		if FE_PAD in fe or old_state.dpad_x != state.dpad_x or old_state.dpad_y != state.dpad_y:
+			self.profile.pads[DPAD].whole(self, state.dpad_x, state.dpad_y, DPAD)
+
+
+	def _check_lpad(self, state, old_state, fe, btn_rem):
+		if FE_PAD in fe or old_state.lpad_x != state.lpad_x or old_state.lpad_y != state.lpad_y:
+			self.profile.pads[LEFT].whole(self, state.lpad_x, state.lpad_y, LEFT)
+
+
+	def _check_shared_lpad(self, state, old_state, fe, btn_rem):
+		if self.buttons & SCButtons.LPADTOUCH:
+			# Pad is being touched now
+			if not self.lpad_touched:
+				self.lpad_touched = True
+			self.profile.pads[LEFT].whole(self, state.lpad_x, state.lpad_y, LEFT)
+			if old_state.buttons & STICKTILT and not self.buttons & STICKTILT:
+				# LPAD and stick share axes and so when they are used simultaneously (by someone with 3 hands or so :)
+				# this is how mapper can tell that stick was recentered
+				self.profile.stick.whole(self, 0, 0, STICK)
+		elif not self.buttons & STICKTILT:
+			# Pad is not being touched
+			if self.lpad_touched:
+				self.lpad_touched = False
+				self.profile.pads[LEFT].whole(self, 0, 0, LEFT)
+
+
+	def _check_cpad(self, state, old_state, fe, btn_rem):
+		if ((FE_PAD in fe)
+				or (old_state.cpad_x != state.cpad_x)
+				or (old_state.cpad_y != state.cpad_y)
+				or ((self.old_buttons & SCButtons.CPADTOUCH) and not (self.buttons & SCButtons.CPADTOUCH))
+			):
+			if self.buttons & SCButtons.CPADTOUCH:
+				self.profile.pads[CPAD].whole(self, state.cpad_x, state.cpad_y, CPAD)
+			elif self.old_buttons & SCButtons.CPADTOUCH:
+				self.profile.pads[CPAD].whole(self, 0, 0, CPAD)
+
+
 	def generate_events(self):
 		# Generate events - keys
 		if len(self.keypress_list):
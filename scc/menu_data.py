@@ -2,6 +2,7 @@
 
 Container for list of menu items + required parsers
 """
+import copy
 import json
 import os
 
@@ -13,6 +14,7 @@ class MenuData:
 	""" Contains list of menu items. Indexable """
 	def __init__(self, *items):
 		self.__items = list(items)
+		self.__by_id = None
 
 
 	def generate(self, menuhandler):
@@ -65,10 +67,23 @@ class MenuData:
 		Returns item with specified ID.
 		Throws KeyError if there is no such item.
 		"""
-		for a in self:
-			if a.id == id:
-				return a
-		raise KeyError("No such item")
+		if self.__by_id is None:
+			# Built on first use; items are not added after menu is loaded
+			self.__by_id = {}
+			for a in reversed(self.__items):
+				self.__by_id[a.id] = a
+		try:
+			return self.__by_id[id]
+		except KeyError:
+			raise KeyError("No such item")
+
+
+	def copy(self):
+		"""
+		Returns new MenuData with copies of all items, so UI code can
+		set 'widget' and 'callback' of items without affecting this menu.
+		"""
+		return MenuData(*[ copy.copy(i) for i in self.__items ])
 
 
 	def index(self, a):
@@ -167,7 +182,8 @@ class MenuData:
 		Loads menu from file.
 		Actions are parsed only if action_parser is set to ActionParser instance.
 		"""
-		return MenuData.from_fileobj(open(filename, "r"), action_parser)
+		with open(filename, "r") as fileobj:
+			return MenuData.from_fileobj(fileobj, action_parser)
 
 
 	@staticmethod
@@ -180,7 +196,8 @@ class MenuData:
 		Throws ValueError if specified file cannot be parsed or
 		specified menu cannot be found.
 		"""
-		data = json.loads(open(filename, "r").read())
+		with open(filename, "r") as fileobj:
+			data = json.loads(fileobj.read())
 		if "menus" not in data:
 			raise ValueError("Menu not found")
 		if menuname not in data["menus"]:
@@ -189,6 +206,73 @@ class MenuData:
 		return MenuData.from_json_data(data["menus"][menuname], action_parser)
 
 
+class MenuCache:
+	"""
+	Keeps menus loaded from menu and profile files, so file doesn't have to
+	be read and parsed every time menu is displayed or its item is selected.
+	Menu is loaded again when mtime or size of its file changes.
+
+	Actions are parsed only if action_parser is set to ActionParser instance.
+	"""
+
+	def __init__(self, action_parser=None):
+		self.action_parser = action_parser
+		self._menus = {}		# (filename, menuname) -> ((mtime, size), MenuData)
+		self._profiles = {}		# filename -> ((mtime, size), menus stored in profile)
+
+
+	def load(self, filename, menuname=None):
+		"""
+		Returns MenuData loaded from menu file or, if menuname is set, menu
+		stored in profile file. Every call returns new copy that can be
+		modified freely.
+
+		Throws OSError if file cannot be read and ValueError if it cannot
+		be parsed or specified menu cannot be found.
+		"""
+		return self._get(filename, menuname).copy()
+
+
+	def get_item(self, filename, id, menuname=None):
+		"""
+		Returns item with specified ID from menu file or from menu stored in
+		profile file. Returned item is shared and should not be modified.
+
+		Throws KeyError if there is no such item, OSError and ValueError
+		as load() does.
+		"""
+		return self._get(filename, menuname).get_by_id(id)
+
+
+	def _get(self, filename, menuname):
+		path = os.path.abspath(filename)
+		st = os.stat(path)
+		stamp = st.st_mtime_ns, st.st_size
+		entry = self._menus.get((path, menuname))
+		if entry is not None and entry[0] == stamp:
+			return entry[1]
+		if menuname is None:
+			menu = MenuData.from_file(path, self.action_parser)
+		else:
+			# All menus stored in profile are kept, so profile
+			# file is read only once for all of them
+			profile = self._profiles.get(path)
+			if profile is None or profile[0] != stamp:
+				with open(path, "r") as fileobj:
+					data = json.loads(fileobj.read())
+				profile = self._profiles[path] = stamp, data.get("menus") or {}
+			if menuname not in profile[1]:
+				raise ValueError("Menu not found")
+			menu = MenuData.from_json_data(profile[1][menuname], self.action_parser)
+		self._menus[path, menuname] = stamp, menu
+		return menu
+
+
+	def clear(self):
+		self._menus = {}
+		self._profiles = {}
+
+
 class MenuItem:
 	""" Really just dummy container """
 	def __init__(self, id, label, action=None, callback=None, icon=None):
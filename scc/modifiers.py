@@ -464,7 +464,7 @@ class BallModifier(Modifier, WholeHapticAction):
 
 	def _roll(self, mapper):
 		# Compute time step
-		t = time.time()
+		t = mapper.clock()
 		dt, self._lastTime = t - self._lastTime, t
 
 		# Free movement update velocity and compute movement
@@ -550,7 +550,7 @@ class BallModifier(Modifier, WholeHapticAction):
 			return self.action.change(mapper, dx, dy, what)
 		if mapper.is_touched(what):
 			if mapper.was_touched(what):
-				t = time.time()
+				t = mapper.clock()
 				dt = t - self._lastTime
 				if dt < 0.0075: return
 				self._lastTime = t
@@ -572,7 +572,7 @@ class BallModifier(Modifier, WholeHapticAction):
 				mapper.mouse.clearRemainders()
 
 			if self._old_pos and mapper.was_touched(what):
-				t = time.time()
+				t = mapper.clock()
 				dt = t - self._lastTime
 				if dt < 0.0075: return
 				self._lastTime = t
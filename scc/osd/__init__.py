@@ -46,7 +46,10 @@ class OSDWindow(Gtk.Window):
 
 	def __init__(self, wmclass, layer = None) -> None:
 		Gtk.Window.__init__(self)
-		OSDWindow._apply_css(Config())
+		if OSDWindow.css_provider is None:
+			# scc-osd-daemon applies css on its own and re-applies it
+			# only when colors are changed
+			OSDWindow._apply_css(Config())
 
 		self.argparser = argparse.ArgumentParser(description=__doc__,
 			formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -8,7 +8,8 @@ import os
 import sys
 from xml.etree import ElementTree as ET
 
-from gi.repository import Gdk, GdkPixbuf, GdkX11, GLib, GObject, Gtk, cairo
+import cairo
+from gi.repository import Gdk, GdkPixbuf, GdkX11, GLib, GObject, Gtk
 
 import scc.osd.osk_actions
 from scc.actions import Action
@@ -55,6 +56,11 @@ SPECIAL_KEYS = {
 
 
 class KeyboardImage(Gtk.DrawingArea):
+	"""
+	Keyboard with nothing highlighted is drawn only once into cached surface,
+	which is then just copied to screen. Only highlighted and pressed keys are
+	drawn over it and only areas of keys that changed are redrawn.
+	"""
 	LINE_WIDTH = 2
 
 	__gsignals__ = {}
@@ -78,8 +84,12 @@ class KeyboardImage(Gtk.DrawingArea):
 		self.tree = ET.fromstring(self.overlay.current_svg.encode("utf-8"))
 		SVGWidget.find_areas(self.tree, None, areas, get_colors=True)
 
-		self._hilight = ()
-		self._pressed = ()
+		self._hilight = set()
+		self._pressed = set()
+		self._static = None			# Cached surface, see _render_static
+		self._static_size = None
+		self._label_positions = {}
+		self._font_height = 0
 		self._button_images = {}
 		self._help_areas = [ self.get_limit("HELP_LEFT"), self.get_limit("HELP_RIGHT") ]
 		self._help_lines = ( [], [] )
@@ -105,14 +115,25 @@ class KeyboardImage(Gtk.DrawingArea):
 
 
 	def hilight(self, hilight, pressed):
+		changed = (self._hilight ^ hilight) | (self._pressed ^ pressed)
 		self._hilight = hilight
 		self._pressed = pressed
+		for button in changed:
+			self.queue_draw_area(*self.get_button_area(button))
+
+
+	def invalidate(self):
+		"""
+		Drops cached image of keyboard. Has to be called when colors are
+		changed, labels and help are updated automatically.
+		"""
+		self._static = None
 		self.queue_draw()
 
 
 	def set_help(self, left, right):
 		self._help_lines = ( left, right )
-		self.queue_draw()
+		self.invalidate()
 
 
 	def set_labels(self, labels):
@@ -123,7 +144,16 @@ class KeyboardImage(Gtk.DrawingArea):
 			elif label:
 				#b.label = label.encode("utf-8")
 				b.label = label
-		self.queue_draw()
+		self.invalidate()
+
+
+	def get_button_area(self, button):
+		""" Returns (x, y, width, height) of area covered by button, including border """
+		x, y, w, h = button
+		return (
+			int(x) - self.LINE_WIDTH, int(y) - self.LINE_WIDTH,
+			int(w) + 2 + 2 * self.LINE_WIDTH, int(h) + 2 + 2 * self.LINE_WIDTH
+		)
 
 
 	def get_limit(self, id):
@@ -184,49 +214,63 @@ class KeyboardImage(Gtk.DrawingArea):
 		return i
 
 
-	def on_draw(self, self2, ctx):
+	def _draw_button(self, ctx, button, color):
+		x, y, w, h = button
+		# filled rectangle
+		ctx.set_source_rgba(*color)
+		ctx.move_to(x, y)
+		ctx.line_to(x + w, y)
+		ctx.line_to(x + w, y + h)
+		ctx.line_to(x, y + h)
+		ctx.line_to(x, y)
+		ctx.fill()
+
+		# border
+		ctx.set_source_rgba(*self.color_button1_border)
+		ctx.move_to(x, y)
+		ctx.line_to(x + w, y)
+		ctx.line_to(x + w, y + h)
+		ctx.line_to(x, y + h)
+		ctx.line_to(x, y)
+		ctx.stroke()
+
+		# label
+		if button.label:
+			if button not in self._label_positions:
+				extents = ctx.text_extents(button.label)
+				x_bearing, y_bearing, width, trash, x_advance, y_advance = extents
+				self._label_positions[button] = (
+					x + w * 0.5 - width * 0.5 - x_bearing,
+					y + h * 0.5 + self._font_height * 0.3
+				)
+			ctx.set_source_rgba(*self.color_text)
+			ctx.move_to(*self._label_positions[button])
+			ctx.show_text(button.label)
+			ctx.stroke()
+
+
+	def _render_static(self, width, height):
+		"""
+		Draws keys with nothing highlighted, overlay and help into new
+		surface and returns it.
+		"""
+		surface = self.get_window().create_similar_surface(
+			cairo.CONTENT_COLOR_ALPHA, width, height)
+		ctx = cairo.Context(surface)
 		ctx.select_font_face(self.font_face, 0, 0)
 
 		ctx.set_line_width(self.LINE_WIDTH)
 		ctx.set_font_size(48)
 		ascent, descent, height, max_x_advance, max_y_advance = ctx.font_extents()
+		self._font_height = height
+		self._label_positions = {}
 
 		# Buttons
 		for button in self.buttons:
-			if button in self._pressed:
-				ctx.set_source_rgba(*self.color_pressed)
-			elif button in self._hilight:
-				ctx.set_source_rgba(*self.color_hilight)
-			elif button.dark:
-				ctx.set_source_rgba(*self.color_button2)
+			if button.dark:
+				self._draw_button(ctx, button, self.color_button2)
 			else:
-				ctx.set_source_rgba(*self.color_button1)
-			# filled rectangle
-			x, y, w, h = button
-			ctx.move_to(x, y)
-			ctx.line_to(x + w, y)
-			ctx.line_to(x + w, y + h)
-			ctx.line_to(x, y + h)
-			ctx.line_to(x, y)
-			ctx.fill()
-
-			# border
-			ctx.set_source_rgba(*self.color_button1_border)
-			ctx.move_to(x, y)
-			ctx.line_to(x + w, y)
-			ctx.line_to(x + w, y + h)
-			ctx.line_to(x, y + h)
-			ctx.line_to(x, y)
-			ctx.stroke()
-
-			# label
-			if button.label:
-				ctx.set_source_rgba(*self.color_text)
-				extents = ctx.text_extents(button.label)
-				x_bearing, y_bearing, width, trash, x_advance, y_advance = extents
-				ctx.move_to(x + w * 0.5 - width * 0.5 - x_bearing, y + h * 0.5 + height * 0.3)
-				ctx.show_text(button.label)
-				ctx.stroke()
+				self._draw_button(ctx, button, self.color_button1)
 
 		# Overlay
 		Gdk.cairo_set_source_pixbuf(ctx, self.overlay.get_pixbuf(), 0, 0)
@@ -271,6 +315,49 @@ class KeyboardImage(Gtk.DrawingArea):
 				ctx.show_text(line)
 				ctx.stroke()
 
+		surface.flush()
+		return surface
+
+
+	def on_draw(self, self2, ctx):
+		allocation = self.get_allocation()
+		size = allocation.width, allocation.height
+		if self._static is None or self._static_size != size:
+			self._static = self._render_static(*size)
+			self._static_size = size
+
+		# Gtk clips ctx to invalidated area, so only that part is copied
+		ctx.set_source_surface(self._static, 0, 0)
+		ctx.paint()
+
+		if not self._hilight and not self._pressed:
+			return
+		cx1, cy1, cx2, cy2 = ctx.clip_extents()
+		ctx.select_font_face(self.font_face, 0, 0)
+		ctx.set_line_width(self.LINE_WIDTH)
+		ctx.set_font_size(48)
+		drawn = []
+		for button in self.buttons:
+			if button in self._pressed:
+				color = self.color_pressed
+			elif button in self._hilight:
+				color = self.color_hilight
+			else:
+				continue
+			x, y, w, h = area = self.get_button_area(button)
+			if x > cx2 or y > cy2 or x + w < cx1 or y + h < cy1:
+				continue
+			self._draw_button(ctx, button, color)
+			drawn.append(area)
+
+		# Overlay over redrawn keys
+		if drawn:
+			for area in drawn:
+				ctx.rectangle(*area)
+			ctx.clip()
+			Gdk.cairo_set_source_pixbuf(ctx, self.overlay.get_pixbuf(), 0, 0)
+			ctx.paint()
+
 
 	def on_size_allocate(self, *a):
 		pass
@@ -381,6 +468,7 @@ class Keyboard(OSDWindow, TimerManager):
 		self.background.color_hilight = _get("hilight")
 		self.background.color_pressed = _get("pressed")
 		self.background.color_text = _get("text")
+		self.background.invalidate()
 
 
 	def use_daemon(self, d):
@@ -393,6 +481,9 @@ class Keyboard(OSDWindow, TimerManager):
 
 
 	def on_keymap_state_changed(self, x11keymap):
+		if self.background is None:
+			# Not displayed yet
+			return
 		if not self.timer_active('labels'):
 			self.timer('labels', 0.1, self.update_labels)
 
@@ -640,10 +731,15 @@ class Keyboard(OSDWindow, TimerManager):
 			self.get_allocation().height - cursor.get_allocation().height
 			)
 
+		target = (int(x - cursor.get_allocation().width * 0.5),
+			int(y - cursor.get_allocation().height * 0.5))
+		if getattr(cursor, "target", None) == target:
+			# Moving cursor widget causes relayout and redraw of its area
+			# even if it doesn't actually move
+			return
+		cursor.target = target
 		cursor.position = int(x), int(y)
-		self.f.move(cursor,
-			x - cursor.get_allocation().width * 0.5,
-			y - cursor.get_allocation().height * 0.5)
+		self.f.move(cursor, *target)
 		for button in self.background.buttons:
 			if button.contains(x, y):
 				if button != self._hovers[cursor]:
@@ -9,7 +9,7 @@ from scc.tools import point_in_gtkrect, find_menu, find_icon
 from scc.tools import circle_to_square, clamp
 from scc.constants import LEFT, RIGHT, SAME, STICK, ControllerFlags
 from scc.constants import DEFAULT, STICK_PAD_MAX, SCButtons
-from scc.menu_data import MenuData, Separator, Submenu
+from scc.menu_data import MenuCache, MenuData, Separator, Submenu
 from scc.gui.daemon_manager import DaemonManager
 from scc.osd import OSDWindow, StickController
 from scc.paths import get_share_path
@@ -36,6 +36,8 @@ class Menu(OSDWindow):
 	"""
 	SUBMENU_OFFSET = 50
 	PREFER_BW_ICONS = True
+	# Shared by all menus displayed by scc-osd-daemon
+	MENU_CACHE = MenuCache()
 
 
 	def __init__(self, cls="osd-menu", layer = None):
@@ -173,7 +175,7 @@ class Menu(OSDWindow):
 		if self.args.from_profile:
 			try:
 				self._menuid = self.args.items[0]
-				self.items = MenuData.from_profile(self.args.from_profile, self._menuid)
+				self.items = Menu.MENU_CACHE.load(self.args.from_profile, self._menuid)
 			except OSError:
 				print('%s: error: profile file not found' % (sys.argv[0]), file=sys.stderr)
 				return False
@@ -183,7 +185,7 @@ class Menu(OSDWindow):
 		elif self.args.from_file:
 			try:
 				self._menuid = self.args.from_file
-				self.items = MenuData.from_file(self.args.from_file)
+				self.items = Menu.MENU_CACHE.load(self.args.from_file)
 			except:
 				print('%s: error: failed to load menu file' % (sys.argv[0]), file=sys.stderr)
 				return False
@@ -8,8 +8,7 @@ from scc.tools import _, set_logging_level
 
 from gi.repository import Gdk, Gio, GdkX11
 from scc.menu_data import MenuGenerator, MenuItem, MENU_GENERATORS
-from scc.paths import get_profiles_path, get_default_profiles_path
-from scc.tools import find_profile
+from scc.tools import find_profile, get_directory_index
 from scc.lib import xwrappers as X
 
 from ctypes import POINTER, cast
@@ -36,14 +35,10 @@ class ProfileListMenuGenerator(MenuGenerator):
 
 
 	def generate(self, menuhandler):
-		# TODO: Cannot load directory content asynchronously here and I'm
-		# TODO: not happy about it
-		rv, all_profiles = [], {}
-		for d in (get_default_profiles_path(), get_profiles_path()):
-			for x in os.listdir(d):
-				if x.endswith(".sccprofile") and not x.startswith("."):
-					all_profiles[x] = os.path.join(d, x)
+		rv, all_profiles = [], get_directory_index("profiles").list(".sccprofile")
 		for p in sorted(all_profiles, key=lambda s: s.lower()):
+			if p.startswith("."):
+				continue
 			menuitem = MenuItem("generated", p[0:-11])	# strips ".sccprofile"
 			menuitem.filename = all_profiles[p]
 			menuitem.callback = self.callback
@@ -5,6 +5,7 @@ one or more Action instances.
 """
 from __future__ import annotations
 
+import re
 import sys
 import token as TokenType
 from tokenize import TokenError, generate_tokens
@@ -21,6 +22,117 @@ class ParseError(Exception):
 	pass
 
 
+class Token(NamedTuple):
+	type: int
+	value: str
+
+
+# Action strings used to be split by tokenize module and parser relies on
+# getting same tokens, so expressions used here match what it accepts.
+_DEC = r'[0-9](?:_?[0-9])*'
+_EXPONENT = r'[eE][-+]?' + _DEC
+_FLOAT = r'(?:%s\.(?:%s)?|\.%s)(?:%s)?|%s%s' % (_DEC, _DEC, _DEC, _EXPONENT, _DEC, _EXPONENT)
+_INT = r'0[xX](?:_?[0-9a-fA-F])+|0[bB](?:_?[01])+|0[oO](?:_?[0-7])+|0(?:_?0)*|[1-9](?:_?[0-9])*'
+_NUMBER_RE = re.compile(r'(?:%s)[jJ]|(?:%s)[jJ]|%s|%s' % (_DEC, _FLOAT, _FLOAT, _INT))
+_NAME_RE = re.compile(r'\w+')
+_SPECIAL_RE = re.compile(r'\.\.\.|->|:=|(?:\*\*|//|>>|<<)=?|[-+*/%&|^=<>!@]=|[-+*/%&|^~<>()\[\]{},:;.@=]')
+_STRING_RE = {
+	"'": re.compile(r"'[^\n'\\]*(?:\\.[^\n'\\]*)*'"),
+	'"': re.compile(r'"[^\n"\\]*(?:\\.[^\n"\\]*)*"'),
+}
+_DIGITS = frozenset("0123456789")
+_DEPTH = { "(": 1, "[": 1, "{": 1, ")": -1, "]": -1, "}": -1 }
+# There is only few different operators, so their tokens are shared
+_OP_TOKENS: dict = {}
+# Skips Token.__new__, which takes twice as long
+_new = tuple.__new__
+# Tokenize reports line breaks as NEWLINE or NL tokens with value that
+# differs between Python versions. Parser treats all of them same way, so
+# every line break, and end of string, is reported as this token.
+_NEWLINE = Token(TokenType.NEWLINE, "\n")
+
+
+def _lex(s: str) -> list | None:
+	"""Split action string into list of Tokens, in the same way tokenize does.
+
+	Handles only what action strings are made of. Returns None if string
+	contains anything else (comment, indentation, unterminated or prefixed
+	string, unbalanced parenthesis...), in which case _tokenize has to be used.
+	"""
+	if not s:
+		return []
+	if s[0] in " \t\f\r\n#":
+		# Indented or blank first line
+		return None
+	tokens = []
+	append = tokens.append
+	op_tokens = _OP_TOKENS
+	depth = 0
+	pos, end = 0, len(s)
+	while pos < end:
+		c = s[pos]
+		if c in " \t\f":
+			pos += 1
+		elif c in _DIGITS or (c == "." and s[pos + 1:pos + 2] in _DIGITS):
+			m = _NUMBER_RE.match(s, pos)
+			pos = m.end()
+			append(_new(Token, (TokenType.NUMBER, m.group())))
+		elif c == "\n" or (c == "\r" and s[pos + 1:pos + 2] == "\n"):
+			pos += 1 if c == "\n" else 2
+			append(_NEWLINE)
+		elif c in _STRING_RE:
+			if s.startswith(c * 3, pos):
+				return None
+			m = _STRING_RE[c].match(s, pos)
+			if m is None:
+				return None
+			pos = m.end()
+			append(_new(Token, (TokenType.STRING, m.group())))
+		else:
+			m = _NAME_RE.match(s, pos)
+			if m is not None:
+				pos = m.end()
+				if s[pos:pos + 1] in _STRING_RE:
+					# String prefix, such as r"..."
+					return None
+				append(_new(Token, (TokenType.NAME, m.group())))
+				continue
+			m = _SPECIAL_RE.match(s, pos)
+			if m is None:
+				return None
+			value = m.group()
+			pos = m.end()
+			t = op_tokens.get(value)
+			if t is None:
+				t = op_tokens[value] = Token(TokenType.OP, value)
+			if value in _DEPTH:
+				depth += _DEPTH[value]
+				if depth < 0:
+					return None
+			append(t)
+	if depth:
+		return None
+	if s[-1] not in "\r\n":
+		append(_NEWLINE)
+	return tokens
+
+
+def _tokenize(s: str) -> list | None:
+	"""Split action string into list of Tokens using tokenize module.
+
+	Returns None if tokenize fails.
+	"""
+	try:
+		return [
+			_NEWLINE if token_type in (TokenType.NEWLINE, TokenType.NL) else Token(token_type, string)
+			for token_type, string, *_
+			in generate_tokens( iter([s]).__next__ )
+			if token_type != TokenType.ENDMARKER
+		]
+	except TokenError:
+		return None
+
+
 def build_action_constants() -> dict:
 	"""Generate dicts for ActionParser.CONSTS."""
 	rv = {
@@ -54,10 +166,7 @@ class ActionParser:
 			# do something with error
 	"""
 
-	class Token(NamedTuple):
-		type: int
-		value: str
-
+	Token = Token
 	CONSTS = build_action_constants()
 
 
@@ -97,15 +206,10 @@ class ActionParser:
 		if type(s) is bytes:
 			s = s.decode("utf-8")
 
-		try:
-			self.tokens = [
-				ActionParser.Token(token_type, string)
-				for token_type, string, *_
-				in generate_tokens( iter([s]).__next__ )
-				if token_type != TokenType.ENDMARKER
-			]
-		except TokenError:
-			self.tokens = None
+		self.tokens = _lex(s)
+		if self.tokens is None:
+			# Something unusual, let tokenize deal with it
+			self.tokens = _tokenize(s)
 		self.index = 0
 		return self
 
@@ -8,8 +8,16 @@ python can't handle.
 All this is needed since I want to have entire thing installable, runnable
 from source tarball *and* debugable in working folder.
 """
+from __future__ import annotations
+
+import logging
 import os
 import sys
+import threading
+
+from scc.lib import inotify
+
+log = logging.getLogger("Paths")
 
 def get_config_path() -> str:
 	"""Return configuration directory.
@@ -140,3 +148,242 @@ def get_daemon_socket() -> str:
 	~/.config/scc/daemon.socket under normal conditions.
 	"""
 	return os.path.join(get_config_path(), "daemon.socket")
+
+
+class DirectoryIndex:
+	"""Index of files in list of directories, including subdirectories.
+
+	Used to find file in first of multiple directories where it exists
+	without checking every one of them. Index is built on first lookup and
+	kept fresh using inotify; all indexes share one inotify descriptor.
+	Pending changes are applied on every lookup, so file created just before
+	it is looked up is found. attach_poller() or attach_glib() makes main
+	loop apply them as well, so events don't pile up between lookups.
+
+	When inotify is not available, or directory and its parent don't exist,
+	lookup checks filesystem directly, same as it would without index.
+	"""
+	# Only changes to list of files are watched, not their content
+	WATCH_MASK = (inotify.IN_CREATE | inotify.IN_DELETE | inotify.IN_MOVED_FROM
+		| inotify.IN_MOVED_TO | inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF)
+
+	_inotify = None
+	_lock = threading.RLock()
+	_watches = {}		# wd -> list of (index, root number, relative path or None for parent)
+	_all = {}			# tuple of paths -> DirectoryIndex
+
+
+	def __init__(self, paths):
+		self.paths = tuple(paths)
+		self._files = None	# set of relative paths per root, None for roots that are not indexed
+
+
+	@staticmethod
+	def get(*paths) -> "DirectoryIndex":
+		"""Return shared index for given directories, in order of priority."""
+		with DirectoryIndex._lock:
+			index = DirectoryIndex._all.get(paths)
+			if index is None:
+				index = DirectoryIndex._all[paths] = DirectoryIndex(paths)
+			return index
+
+
+	def find(self, name: str) -> str | None:
+		"""Return full path to 'name' in first directory where it exists.
+
+		Returns None if it doesn't exist in any directory.
+		"""
+		with DirectoryIndex._lock:
+			files = self._update()
+			if name.startswith("/") or os.path.normpath(name) != name:
+				# Not something that is indexed
+				files = (None,) * len(self.paths)
+			for root, f in zip(self.paths, files):
+				if f is None:
+					path = os.path.join(root, name)
+					if os.path.exists(path):
+						return path
+				elif name in f:
+					return os.path.join(root, name)
+		return None
+
+
+	def list(self, suffix: str = "") -> dict:
+		"""Return dict of name -> full path for all files in top-level directories.
+
+		When same name exists in multiple directories, path to file in first
+		one is returned.
+		"""
+		rv = {}
+		with DirectoryIndex._lock:
+			files = self._update()
+			for root, f in zip(self.paths, files):
+				if f is None:
+					try:
+						f = os.listdir(root)
+					except OSError:
+						continue
+				for name in f:
+					if name.endswith(suffix) and "/" not in name and name not in rv:
+						rv[name] = os.path.join(root, name)
+		return rv
+
+
+	def _update(self):
+		"""Build index or apply pending changes. Should be called while _lock is acquired."""
+		if self._files is None:
+			if DirectoryIndex._init_inotify():
+				self._files = [ None ] * len(self.paths)
+				for i in range(len(self.paths)):
+					self._scan(i)
+			else:
+				self._files = [ None ] * len(self.paths)
+		else:
+			# Reading from inotify doesn't block, so this costs single
+			# syscall when there are no changes
+			DirectoryIndex.process_events()
+		return self._files
+
+
+	@staticmethod
+	def _init_inotify():
+		if DirectoryIndex._inotify is None:
+			try:
+				DirectoryIndex._inotify = inotify.Inotify()
+			except (OSError, AttributeError) as e:
+				# AttributeError is thrown when libc has no inotify at all
+				log.warning("Failed to initialize inotify: %s", e)
+				DirectoryIndex._inotify = False
+		return DirectoryIndex._inotify is not False
+
+
+	@staticmethod
+	def attach_poller(poller):
+		"""Process inotify events from Poller used by daemon's main loop."""
+		with DirectoryIndex._lock:
+			if DirectoryIndex._init_inotify():
+				poller.register(DirectoryIndex._inotify.fileno(), poller.POLLIN,
+					lambda *a: DirectoryIndex.process_events())
+
+
+	@staticmethod
+	def attach_glib():
+		"""Process inotify events from GLib main loop used by GUI and OSD."""
+		from gi.repository import GLib
+		def callback(*a):
+			DirectoryIndex.process_events()
+			return True
+
+		with DirectoryIndex._lock:
+			if DirectoryIndex._init_inotify():
+				GLib.unix_fd_add_full(GLib.PRIORITY_DEFAULT, DirectoryIndex._inotify.fileno(),
+					GLib.IOCondition.IN, callback)
+
+
+	@staticmethod
+	def process_events():
+		"""Apply all changes reported by inotify."""
+		with DirectoryIndex._lock:
+			if not DirectoryIndex._inotify:
+				return
+			for wd, mask, cookie, name in DirectoryIndex._inotify.read():
+				if mask & inotify.IN_Q_OVERFLOW:
+					# Some events were lost, nothing can be trusted
+					for index in DirectoryIndex._all.values():
+						if index._files is not None:
+							for i in range(len(index.paths)):
+								index._scan(i)
+					continue
+				if mask & inotify.IN_IGNORED:
+					DirectoryIndex._watches.pop(wd, None)
+					continue
+				for index, i, rel in list(DirectoryIndex._watches.get(wd, ())):
+					index._on_event(i, rel, mask, name)
+
+
+	def _on_event(self, i, rel, mask, name):
+		files = self._files[i]
+		if rel is None:
+			# Parent of directory that doesn't exist yet
+			if name == os.path.basename(self.paths[i]):
+				self._scan(i)
+			return
+		if mask & (inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF):
+			if rel == "":
+				self._scan(i)
+			return
+		if files is None:
+			return
+		name = rel + "/" + name if rel else name
+		if mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO):
+			files.add(name)
+			if mask & inotify.IN_ISDIR:
+				self._scan_dir(i, os.path.join(self.paths[i], name), name, files, set())
+		elif mask & (inotify.IN_DELETE | inotify.IN_MOVED_FROM):
+			files.discard(name)
+			if mask & inotify.IN_ISDIR:
+				prefix = name + "/"
+				files.difference_update([ x for x in files if x.startswith(prefix) ])
+				self._unwatch(i, lambda r: r == name or r.startswith(prefix))
+
+
+	def _scan(self, i):
+		"""(Re)builds index of one directory."""
+		self._unwatch(i, lambda r: True)
+		root = self.paths[i]
+		files = set()
+		if os.path.isdir(root):
+			self._scan_dir(i, root, "", files, set())
+			self._files[i] = files
+		elif self._watch(os.path.dirname(root), i, None):
+			# Directory is empty until it's created
+			self._files[i] = files
+		else:
+			self._files[i] = None
+
+
+	def _scan_dir(self, i, path, rel, files, seen):
+		real = os.path.realpath(path)
+		if real in seen:
+			# Symlink loop
+			return
+		seen.add(real)
+		# Watch is added before listing, so nothing created meanwhile is missed
+		if not self._watch(path, i, rel):
+			return
+		try:
+			entries = list(os.scandir(path))
+		except OSError:
+			return
+		for e in entries:
+			name = rel + "/" + e.name if rel else e.name
+			files.add(name)
+			try:
+				if e.is_dir():
+					self._scan_dir(i, e.path, name, files, seen)
+			except OSError:
+				pass
+
+
+	def _watch(self, path, i, rel):
+		try:
+			wd = DirectoryIndex._inotify.add_watch(path, DirectoryIndex.WATCH_MASK)
+		except OSError:
+			return False
+		listeners = DirectoryIndex._watches.setdefault(wd, [])
+		if (self, i, rel) not in listeners:
+			listeners.append((self, i, rel))
+		return True
+
+
+	def _unwatch(self, i, match):
+		"""Removes watches of root 'i' for which match(relative path) returns True."""
+		for wd, listeners in list(DirectoryIndex._watches.items()):
+			kept = [ x for x in listeners
+				if not (x[0] is self and x[1] == i and match(x[2] if x[2] is not None else "")) ]
+			if len(kept) != len(listeners):
+				if kept:
+					DirectoryIndex._watches[wd] = kept
+				else:
+					del DirectoryIndex._watches[wd]
+					DirectoryIndex._inotify.rm_watch(wd)
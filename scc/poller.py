@@ -1,13 +1,22 @@
 """SC Controller - Poller
 
-Uses select to pool for file descriptors. Driver classes can use
+Uses epoll to pool for file descriptors. Driver classes can use
 daemon.get_poller().register and .unregister to add file descriptors and
 register callbacks to be called when data is available in them.
 
 Callback is called as callback(fd, event) where event is one of select.POLL*
+
+poll() blocks until some registered descriptor is ready, timeout expires or
+wakeup() is called from another thread. wakeup() is backed by eventfd, so
+thread that queues work for main thread (socket server, for example) can
+interrupt poll() that would otherwise sleep until next scheduled task.
 """
 import logging
+import os
 import select
+import threading
+
+from scc import latency
 
 log = logging.getLogger("Poller")
 
@@ -18,41 +27,83 @@ class Poller:
 	POLLIN = select.POLLIN
 	POLLOUT = select.POLLOUT
 	POLLPRI = select.POLLPRI
+	# Reported by epoll even when not requested. Passed to callback as POLLIN,
+	# so it tries to read and notices that device is gone, same as with select
+	_POLLERR = select.EPOLLERR | select.EPOLLHUP
 
 	def __init__(self):
 		self._events = {}
 		self._callbacks = {}
-		self._pool_in = ()
-		self._pool_out = ()
-		self._pool_pri = ()
+		self._epoll = select.epoll()
+		self._thread = None
+		self._wakeup_fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+		self.register(self._wakeup_fd, Poller.POLLIN, self._on_wakeup)
 
 
 	def register(self, fd, events, callback):
 		if fd < 0:
 			raise ValueError("Invalid file descriptor")
+		if fd in self._events:
+			self._epoll.modify(fd, events)
+		else:
+			self._epoll.register(fd, events)
 		self._events[fd] = events
 		self._callbacks[fd] = callback
-		self._generate_lists()
 
 
 	def unregister(self, fd):
-		if fd in self._events: del self._events[fd]
+		if fd in self._events:
+			del self._events[fd]
+			try:
+				self._epoll.unregister(fd)
+			except (OSError, ValueError):
+				# Descriptor was closed before being unregistered
+				pass
 		if fd in self._callbacks: del self._callbacks[fd]
-		self._generate_lists()
-
-
-	def _generate_lists(self):
-		self._pool_in = [ fd for fd, events in self._events.items() if events & Poller.POLLIN ]
-		self._pool_out = [ fd for fd, events in self._events.items() if events & Poller.POLLOUT ]
-		self._pool_pri = [ fd for fd, events in self._events.items() if events & Poller.POLLPRI ]
-
 
-	def poll(self, timeout=0.01):
-		inn, out, pri = select.select( self._pool_in, self._pool_out, self._pool_pri, timeout )
 
-		for fd in inn:
-			self._callbacks.get(fd, DO_NOTHING)(fd, Poller.POLLIN)
-		for fd in out:
-			self._callbacks.get(fd, DO_NOTHING)(fd, Poller.POLLOUT)
-		for fd in pri:
-			self._callbacks.get(fd, DO_NOTHING)(fd, Poller.POLLPRI)
+	def wakeup(self):
+		"""
+		Interrupts poll() blocked on another thread, so main loop can
+		process work queued by caller.
+		Does nothing when called from thread that is running poll(), as
+		main loop is not sleeping in such case.
+		"""
+		if threading.get_ident() != self._thread:
+			os.eventfd_write(self._wakeup_fd, 1)
+
+
+	def _on_wakeup(self, fd, event):
+		try:
+			os.eventfd_read(fd)
+		except BlockingIOError:
+			pass
+
+
+	def poll(self, timeout=0.01, on_wakeup=None):
+		"""
+		Waits until at least one registered descriptor is ready and calls
+		its callback. 'timeout' is in seconds; None means wait forever.
+
+		'on_wakeup', if set, is called after waiting is done, but before
+		any callback.
+		"""
+		self._thread = threading.get_ident()
+		try:
+			ready = self._epoll.poll(-1 if timeout is None else timeout)
+		except InterruptedError:
+			ready = ()
+		if ready and latency.enabled:
+			latency.mark_received()
+		if on_wakeup:
+			on_wakeup()
+
+		for fd, events in ready:
+			if events & Poller._POLLERR:
+				events |= self._events.get(fd, 0)
+			if events & Poller.POLLIN:
+				self._callbacks.get(fd, DO_NOTHING)(fd, Poller.POLLIN)
+			if events & Poller.POLLOUT:
+				self._callbacks.get(fd, DO_NOTHING)(fd, Poller.POLLOUT)
+			if events & Poller.POLLPRI:
+				self._callbacks.get(fd, DO_NOTHING)(fd, Poller.POLLPRI)
@@ -0,0 +1,160 @@
+"""SC Controller - Profile cache
+
+Keeps parsed and compressed profiles pickled, both in memory and in
+~/.config/scc/cache/profiles, so switching profile doesn't need to
+parse json and every action string again.
+
+Cached profile is used when file it was loaded from has same mtime and size
+as when it was cached or, if mtime or size changed, when content hash is
+still the same. Cache is never trusted across different daemon versions
+or when source code of any scc module changed, as pickled profile
+references classes that may have changed since.
+"""
+import hashlib
+import io
+import logging
+import os
+import pickle
+import threading
+from collections import namedtuple
+
+import scc
+from scc.paths import get_config_path
+from scc.profile import Profile
+from scc.tools import load_cache, store_cache
+
+log = logging.getLogger("ProfileCache")
+
+CacheEntry = namedtuple('CacheEntry', 'mtime size digest data')
+
+_source_fingerprint = None
+
+
+def get_source_fingerprint() -> str:
+	"""
+	Returns hash of source code of every scc module. Computed only once,
+	as code cannot change while it's running.
+	"""
+	global _source_fingerprint
+	if _source_fingerprint is None:
+		h = hashlib.sha1()
+		root = os.path.dirname(os.path.abspath(scc.__file__))
+		for path, dirs, files in os.walk(root):
+			dirs.sort()
+			for name in sorted(files):
+				if name.endswith(".py"):
+					h.update(os.path.relpath(os.path.join(path, name), root).encode("utf-8"))
+					with open(os.path.join(path, name), "rb") as f:
+						h.update(f.read())
+		_source_fingerprint = h.hexdigest()
+	return _source_fingerprint
+
+
+class ProfileCache:
+	# Increase when format of cache files changes
+	VERSION = 2
+
+	def __init__(self, path=None):
+		self.path = path or os.path.join(get_config_path(), "cache", "profiles")
+		self._entries = {}		# filename -> CacheEntry
+		self._lock = threading.Lock()
+
+
+	def load(self, filename, parser):
+		"""
+		Returns compressed Profile loaded from 'filename', using 'parser' for
+		any later parsing. Profile is either taken from cache or loaded and
+		cached.
+
+		Every call returns new Profile instance, so returned profile can be
+		modified freely.
+		"""
+		key = os.path.abspath(filename)
+		st = os.stat(key)
+		with self._lock:
+			entry = self._entries.get(key)
+		if entry is None:
+			entry = self._read_entry(key)
+		if entry is None or (entry.mtime, entry.size) != (st.st_mtime_ns, st.st_size):
+			with open(key, "rb") as fileobj:
+				raw = fileobj.read()
+			digest = hashlib.sha1(raw).hexdigest()
+			if entry is None or entry.digest != digest:
+				return self._parse(filename, key, raw, digest, st, parser)
+			# Touched, but not changed
+			entry = entry._replace(mtime=st.st_mtime_ns, size=st.st_size)
+			self._store(key, entry)
+
+		try:
+			profile = Profile.__new__(Profile)
+			profile.__dict__.update(pickle.loads(entry.data))
+			profile.parser = parser
+			profile.filename = filename
+			return profile
+		except Exception as e:
+			# Treated as cache miss
+			log.warning("Failed to use cached '%s': %s", filename, e)
+			with open(key, "rb") as fileobj:
+				raw = fileobj.read()
+			return self._parse(filename, key, raw, hashlib.sha1(raw).hexdigest(), st, parser)
+
+
+	def prewarm(self, filenames, parser_class):
+		"""
+		Loads every profile from 'filenames' into cache.
+		Meant to be called on background thread.
+		"""
+		for filename in filenames:
+			try:
+				self.load(filename, parser_class())
+			except Exception as e:
+				log.debug("Failed to pre-load profile '%s': %s", filename, e)
+
+
+	def _parse(self, filename, key, raw, digest, st, parser):
+		""" Loads profile from already read file and stores it in cache """
+		profile = Profile(parser)
+		profile.load_fileobj(io.StringIO(raw.decode("utf-8")))
+		profile.compress()
+		profile.filename = filename
+
+		data = dict(profile.__dict__)
+		del data["parser"]
+		try:
+			data = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+		except Exception as e:
+			# Some action can't be cached. Profile is still usable
+			log.debug("Cannot cache '%s': %s", filename, e)
+			return profile
+		self._store(key, CacheEntry(st.st_mtime_ns, st.st_size, digest, data))
+		return profile
+
+
+	def _get_cache_file(self, filename):
+		return os.path.join(self.path,
+			hashlib.sha1(filename.encode("utf-8")).hexdigest() + ".pickle")
+
+
+	def _read_entry(self, filename):
+		""" Reads cache entry stored on disk. Returns None if there is none """
+		data = load_cache(self._get_cache_file(filename), ProfileCache.VERSION)
+		if data is None:
+			return None
+		try:
+			fingerprint, stored_filename, entry = data
+			if (fingerprint, stored_filename) != (get_source_fingerprint(), filename):
+				return None
+			entry = CacheEntry(*entry)
+		except (TypeError, ValueError) as e:
+			log.debug("Failed to use cache for '%s': %s", filename, e)
+			return None
+		with self._lock:
+			self._entries[filename] = entry
+		return entry
+
+
+	def _store(self, filename, entry):
+		with self._lock:
+			self._entries[filename] = entry
+		store_cache(self._get_cache_file(filename), ProfileCache.VERSION,
+			(get_source_fingerprint(), filename, tuple(entry)))
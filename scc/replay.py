@@ -0,0 +1,354 @@
+"""SC Controller - Input recording and replay
+
+Records raw packets received from controllers, along with time when they
+were received, and replays them through drivers and Mapper without any
+hardware attached. Used by benchmarks/replay.py.
+
+Recording is started by daemon when SCC_RECORD environment variable is set
+to name of file. Drivers then pass every received packet to 'recorder', if
+it's set:
+	sc     - Steam Controller (dongle or cable), 64B input packet
+	deck   - Steam Deck, 64B input packet
+	ds4    - DS4 over USB, HID report
+	ds5    - DS5 over USB, HID report
+	evdev  - single evdev event, packed as EVDEV_EVENT. Only main device is
+			 recorded, so gyro and touchpad of DS4 and DS5 over evdev are lost.
+
+File starts with HEADER and continues with records. Every record starts with
+RECORD_HEADER (time in microseconds since recording started, record kind,
+stream number and length) followed by that much data.
+There is one stream per controller and it's declared by KIND_STREAM record
+before first packet. Data of KIND_STREAM record is JSON with driver name,
+controller type and, for evdev, controller configuration.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import struct
+import time
+
+from scc.controller import Controller
+from scc.mapper import Mapper
+from scc.scheduler import Scheduler
+from scc.uinput import Dummy
+
+log = logging.getLogger("Replay")
+
+ENV_VAR = "SCC_RECORD"
+HEADER = b"SCCREC\x00\x02"
+RECORD_HEADER = struct.Struct("<QBBH")
+EVDEV_EVENT = struct.Struct("<HHi")
+KIND_STREAM = 0
+KIND_PACKET = 1
+MAX_STREAMS = 256
+
+# Set while recording. Checked by drivers for every received packet.
+recorder = None
+
+
+class Recorder:
+	""" Writes received packets to file """
+
+	def __init__(self, filename):
+		self._file = open(filename, "wb")
+		self._file.write(HEADER)
+		self._streams = {}
+		self._start = time.monotonic()
+
+
+	def packet(self, controller, driver, data, config=None):
+		"""
+		Records packet received by 'controller'.
+		'driver' is one of names listed in module docstring.
+		'config' is stored with first packet of every controller.
+		"""
+		stream = self._streams.get(controller)
+		if stream is None:
+			if len(self._streams) >= MAX_STREAMS:
+				return
+			stream = self._streams[controller] = len(self._streams)
+			self._write(KIND_STREAM, stream, json.dumps({
+				"driver": driver,
+				"type": controller.get_type(),
+				"config": config,
+			}).encode("utf-8"))
+		self._write(KIND_PACKET, stream, bytes(data))
+
+
+	def _write(self, kind, stream, data):
+		t = int((time.monotonic() - self._start) * 1000000)
+		self._file.write(RECORD_HEADER.pack(t, kind, stream, len(data)))
+		self._file.write(data)
+
+
+	def close(self):
+		self._file.close()
+
+
+def start_recording(filename):
+	global recorder
+	stop_recording()
+	recorder = Recorder(filename)
+	log.info("Recording input to %s", filename)
+
+
+def stop_recording():
+	global recorder
+	if recorder is not None:
+		recorder.close()
+		recorder = None
+
+
+class Stream:
+	""" Packets recorded from one controller """
+
+	def __init__(self, driver, type, config):
+		self.driver = driver
+		self.type = type
+		self.config = config
+		self.packets = []		# (time in seconds, data)
+
+
+	def __repr__(self):
+		return "<Stream %s (%s) %s packets>" % (self.type, self.driver, len(self.packets))
+
+
+def load(filename):
+	""" Loads recording. Returns list of Stream instances """
+	with open(filename, "rb") as f:
+		data = f.read()
+	if not data.startswith(HEADER):
+		if data.startswith(HEADER[0:6]):
+			raise ValueError("%s was recorded by different version" % (filename,))
+		raise ValueError("%s is not input recording" % (filename,))
+	streams = []
+	offset = len(HEADER)
+	while offset + RECORD_HEADER.size <= len(data):
+		t, kind, stream, length = RECORD_HEADER.unpack_from(data, offset)
+		offset += RECORD_HEADER.size
+		payload = data[offset:offset + length]
+		offset += length
+		if len(payload) < length:
+			# Truncated by killed daemon
+			break
+		if kind == KIND_STREAM:
+			info = json.loads(payload.decode("utf-8"))
+			streams.append(Stream(info["driver"], info["type"], info.get("config")))
+		elif kind == KIND_PACKET and stream < len(streams):
+			streams[stream].packets.append((t / 1000000.0, payload))
+	return streams
+
+
+def save(filename, streams):
+	""" Writes list of Stream instances to file, in format that load() reads """
+	records = []
+	for number, stream in enumerate(streams):
+		records.append((-1.0, KIND_STREAM, number, json.dumps({
+			"driver": stream.driver,
+			"type": stream.type,
+			"config": stream.config,
+		}).encode("utf-8")))
+		for t, data in stream.packets:
+			records.append((t, KIND_PACKET, number, data))
+	records.sort(key=lambda r: (r[0], r[1]))
+	with open(filename, "wb") as f:
+		f.write(HEADER)
+		for t, kind, number, data in records:
+			t = int(max(0.0, t) * 1000000)
+			f.write(RECORD_HEADER.pack(t, kind, number, len(data)))
+			f.write(data)
+
+
+class RecordingDevice(Dummy):
+	"""
+	Stand-in for UInput, Keyboard and Mouse that only counts generated events
+	"""
+
+	def __init__(self, *a, **b):
+		Dummy.__init__(self)
+		self.events = 0
+		self.syns = 0
+
+
+	def keyEvent(self, *a, **b):
+		self.events += 1
+
+	axisEvent = keyEvent
+	relEvent = keyEvent
+	scanEvent = keyEvent
+	moveEvent = keyEvent
+	moveStickEvent = keyEvent
+	scrollEvent = keyEvent
+
+
+	def pressEvent(self, keys):
+		self.events += len(keys)
+
+	releaseEvent = pressEvent
+
+
+	def emit(self, events):
+		self.events += len(events) // 3
+
+
+	def synEvent(self):
+		self.syns += 1
+
+
+	def clearRemainders(self):
+		pass
+
+
+class _NoDevice:
+	""" Replaces USB device of replayed controller; Ignores everything sent to it """
+
+	def overwrite_control(self, *a):
+		pass
+
+	send_control = overwrite_control
+
+
+class _EvdevEvent:
+	__slots__ = ("type", "code", "value")
+
+
+class _EvdevDevice:
+	""" Replaces evdev InputDevice of replayed controller """
+
+	name = "replay"
+	fd = -1
+
+	def __init__(self):
+		self.event = _EvdevEvent()
+		self.events = (self.event,)
+
+
+	def read(self):
+		return self.events
+
+
+def _create_sc(stream):
+	from scc.drivers.sc_dongle import SCController
+	c = SCController(None, 0, 0)
+	c._driver = _NoDevice()
+	def feed(data):
+		c.read_input(data)
+		c.input()
+	return c, feed
+
+
+def _create_deck(stream):
+	from scc.drivers.sc_dongle import SCController
+	from scc.drivers.steamdeck import CONTROLIDX, ENDPOINT, Deck, DeckInput
+	c = Deck.__new__(Deck)
+	SCController.__init__(c, None, CONTROLIDX, ENDPOINT)
+	c._driver = _NoDevice()
+	c._old_state, c._input = DeckInput(), DeckInput()
+	c._ready = True
+	def feed(data):
+		c._on_input(ENDPOINT, data)
+	return c, feed
+
+
+def _create_hid(cls):
+	c = cls.__new__(cls)
+	Controller.__init__(c)
+	c._load_hid_descriptor(None, 64, 0, 0, False)
+	def feed(data):
+		c.input(0, data)
+	return c, feed
+
+
+def _create_ds4(stream):
+	from scc.drivers.ds4drv import DS4Controller
+	return _create_hid(DS4Controller)
+
+
+def _create_ds5(stream):
+	from scc.drivers.ds5drv import DS5Controller
+	return _create_hid(DS5Controller)
+
+
+def _create_evdev(stream):
+	from scc.drivers.evdevdrv import EvdevController
+	c = EvdevController(None, _EvdevDevice(), None, stream.config or {})
+	event = c.device.event
+	def feed(data):
+		event.type, event.code, event.value = EVDEV_EVENT.unpack(data)
+		c.input()
+	return c, feed
+
+
+FACTORIES = {
+	"sc": _create_sc,
+	"deck": _create_deck,
+	"ds4": _create_ds4,
+	"ds5": _create_ds5,
+	"evdev": _create_evdev,
+}
+
+
+class Replayer:
+	"""
+	Feeds recorded packets through driver of recorded controller and Mapper
+	using given profile. Nothing is sent to real devices; events generated
+	by mapper are only counted by RecordingDevice instances.
+	"""
+
+	def __init__(self, stream, profile):
+		if stream.driver not in FACTORIES:
+			raise ValueError("Cannot replay input recorded from '%s' driver" % (stream.driver,))
+		self.stream = stream
+		# Time of packet being replayed, as offset from time when replay
+		# started. Used instead of real time by scheduler and mapper
+		self.start = time.time()
+		self.now = self.start
+		self.scheduler = Scheduler(clock=self.clock)
+		self.mapper = Mapper(profile, self.scheduler, keyboard=False,
+			mouse=False, gamepad=False, poller=None, clock=self.clock)
+		self.mapper.keyboard = RecordingDevice()
+		self.mapper.mouse = RecordingDevice()
+		self.mapper.gamepad = RecordingDevice()
+		self.controller, self.feed = FACTORIES[stream.driver](stream)
+		self.controller.set_mapper(self.mapper)
+		self.mapper.set_controller(self.controller)
+		if profile.gyro:
+			self.controller.set_gyro_enabled(True)
+
+
+	def get_event_count(self):
+		""" Returns number of events generated on all emulated devices """
+		return sum(d.events for d in (self.mapper.keyboard, self.mapper.mouse, self.mapper.gamepad))
+
+
+	def clock(self):
+		return self.now
+
+
+	def replay(self, measure=None):
+		"""
+		Feeds all recorded packets, as fast as possible.
+
+		If 'measure' is set, measure(step, data) is called for every packet
+		instead of step(data); 'step' feeds packet to driver and runs
+		scheduled tasks.
+
+		Scheduler and mapper take time from clock that follows recorded
+		timestamps, so scheduled tasks and everything computed from elapsed
+		time behaves as it did when input was recorded.
+		"""
+		feed, run = self.feed, self.scheduler.run
+		def step(data):
+			feed(data)
+			run()
+
+		self.start = self.now = time.time()
+		self.controller.lastTime = self.start
+		self.scheduler.update_time()
+		for t, data in self.stream.packets:
+			self.now = self.start + t
+			if measure is None:
+				step(data)
+			else:
+				measure(step, data)
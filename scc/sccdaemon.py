@@ -16,21 +16,24 @@ from scc.gestures import GestureDetector
 from scc.parser import TalkingActionParser
 from scc.controller import HapticData
 from scc.scheduler import Scheduler
-from scc.menu_data import MenuData
+from scc.menu_data import MenuCache
+from scc.special_actions import ChangeProfileAction
 from scc.profile import Profile
+from scc.profile_cache import ProfileCache
 from scc.actions import Action
 from scc.config import Config
+from scc.paths import DirectoryIndex
 from scc.poller import Poller
 from scc.mapper import Mapper
-from scc import drivers
+from scc import drivers, latency, replay
 
-from socketserver import UnixStreamServer, ThreadingMixIn, StreamRequestHandler
+from collections import deque
 import os
 import sys
+import socket
 import pkgutil
 import signal
 import time
-import json
 import logging
 import threading
 import traceback
@@ -38,10 +41,6 @@ import subprocess
 log = logging.getLogger("SCCDaemon")
 tlog = logging.getLogger("Socket Thread")
 
-class ThreadingUnixStreamServer(ThreadingMixIn, UnixStreamServer):
-	daemon_threads = True
-
-
 class SCCDaemon(Daemon):
 
 	def __init__(self, piddile, socket_file):
@@ -53,9 +52,9 @@ class SCCDaemon(Daemon):
 		self.socket_file = socket_file
 		self.poller = Poller()
 		self.dev_monitor = create_device_monitor(self)
-		self.scheduler = Scheduler()
+		self.scheduler = Scheduler(wakeup=self.poller.wakeup)
 		self.xdisplay = None
-		self.sserver = None			# UnixStreamServer instance
+		self.sserver = None			# listening socket
 		self.errors = []
 		self.alone = False			# Set by launching script from --alone flag
 		self.custom_py_loaded = False
@@ -65,7 +64,7 @@ class SCCDaemon(Daemon):
 		# TODO: Use osd_ids for all menus
 		self.osd_ids = {}
 		self.controllers = []
-		self.mainloops = [ self.poller.poll, self.scheduler.run ]
+		self.mainloops = [ ]
 		self.rescan_cbs = [ ]
 		self.on_exit_cbs = []
 		self.subprocs = []
@@ -74,6 +73,9 @@ class SCCDaemon(Daemon):
 		self.default_mapper = None
 		self.free_mappers = [ ]
 		self.clients = set()
+		self._clients_by_fd = {}
+		self.profile_cache = ProfileCache()
+		self.menu_cache = MenuCache(TalkingActionParser())
 		self.cwd = os.getcwd()
 
 
@@ -156,11 +158,24 @@ class SCCDaemon(Daemon):
 		"""
 		Adds function that is called in every mainloop iteration.
 		Can be called only durring initialization, in driver 'init' method.
+
+		Mainloop iterates only after some file descriptor registered in
+		poller becomes ready, scheduled task is due or wakeup() is called,
+		so 'fn' must not depend on being called periodically.
 		"""
 		if fn not in self.mainloops:
 			self.mainloops.append(fn)
 
 
+	def wakeup(self):
+		"""
+		Wakes up mainloop so all functions added by add_mainloop are called
+		as soon as possible. Meant to be called from other threads, does
+		nothing when called from mainloop itself.
+		"""
+		self.poller.wakeup()
+
+
 	def remove_mainloop(self, fn):
 		"""
 		Removes function added by add_mainloop
@@ -187,9 +202,7 @@ class SCCDaemon(Daemon):
 
 
 	def _set_profile(self, mapper, filename):
-		# Called from socket server thread
-		p = Profile(TalkingActionParser())
-		p.load(filename).compress()
+		p = self.profile_cache.load(filename, TalkingActionParser())
 		self.profile_file = filename
 
 		if mapper.profile.gyro and not p.gyro:
@@ -227,10 +240,7 @@ class SCCDaemon(Daemon):
 		Message should be utf-8 encoded str.
 		"""
 		for client in self.clients:
-			try:
-				client.wfile.write(message_str)
-			except Exception:
-				pass
+			client.send(message_str)
 
 
 	def on_sa_turnoff(self, mapper, action):
@@ -308,13 +318,11 @@ class SCCDaemon(Daemon):
 			log.warning("Cannot show OSD; there is no scc-osd-daemon registered")
 			return False
 		# Send request
-		try:
-			self.osd_daemon.wfile.write(data)
-			self.osd_daemon.wfile.flush()
-		except Exception as e:
-			log.error("Failed to display OSD: %s", e)
+		if self.osd_daemon.closed:
+			log.error("Failed to display OSD: scc-osd-daemon disconnected")
 			self.osd_daemon = None
 			return False
+		self.osd_daemon.send(data)
 		return True
 
 
@@ -420,7 +428,7 @@ class SCCDaemon(Daemon):
 			fn(self)
 		for d in (self.osd_daemon, self.autoswitch_daemon):
 			if d:
-				d.wfile.close()
+				d.close()
 		self.osd_daemon, self.autoswitch_daemon = None, None
 		for p in self.subprocs:
 			p.kill()
@@ -489,7 +497,7 @@ class SCCDaemon(Daemon):
 
 		mapper.set_special_actions_handler(self)
 		mapper.set_xdisplay(self.xdisplay)
-		mapper.schedule(1.0, self.fix_xinput)
+		self.scheduler.schedule(1.0, self.fix_xinput, mapper)
 		return mapper
 
 
@@ -518,12 +526,47 @@ class SCCDaemon(Daemon):
 				# Broken config is not reason to fail here
 				pass
 		try:
-			mapper.profile.load(self.default_profile).compress()
+			mapper.profile = self.profile_cache.load(self.default_profile, TalkingActionParser())
+			mapper.invalidate_plan()
 		except Exception as e:
 			log.warning("Failed to load profile. Starting with no mappings.")
 			log.warning("Reason: %s", e)
 
 
+	def prewarm_profiles(self):
+		"""
+		Loads profiles that may be switched to by scc-autoswitch-daemon,
+		along with recently used profiles, into profile cache.
+		Done on background thread.
+		"""
+		def prewarm():
+			cfg = Config()
+			names = list(cfg["recent_profiles"])
+			parser = TalkingActionParser()
+			for c in cfg["autoswitch"]:
+				try:
+					astr = c['action']
+					if type(astr) == dict and "action" in astr:
+						astr = astr["action"]
+					for a in parser.restart(astr).parse().get_all_actions():
+						if isinstance(a, ChangeProfileAction):
+							names.append(a.profile)
+				except Exception:
+					# Reported by scc-autoswitch-daemon
+					pass
+			filenames = []
+			for name in names:
+				filename = find_profile(name)
+				if filename and filename not in filenames:
+					filenames.append(filename)
+			self.profile_cache.prewarm(filenames, TalkingActionParser)
+			log.debug("Pre-loaded %s profiles", len(filenames))
+
+		t = threading.Thread(target=prewarm)
+		t.daemon = True
+		t.start()
+
+
 	def add_controller(self, c):
 		if len(self.free_mappers) > 0:
 			# Reuse already created mapper, so SCC will not spam system
@@ -554,6 +597,9 @@ class SCCDaemon(Daemon):
 	def remove_controller(self, c):
 		mapper = c.mapper
 		if mapper:
+			# Drop pending macro steps and timeouts first, so nothing
+			# presses virtual button again after it's released
+			mapper.cancel_scheduled()
 			mapper.release_virtual_buttons()
 		c.disconnected()
 
@@ -660,12 +706,17 @@ class SCCDaemon(Daemon):
 	def run(self):
 		log.debug("Starting SCCDaemon...")
 		signal.signal(signal.SIGTERM, self.sigterm)
+		if replay.ENV_VAR in os.environ:
+			replay.start_recording(os.environ[replay.ENV_VAR])
+			self.add_on_exit(lambda *a: replay.stop_recording())
+		DirectoryIndex.attach_poller(self.poller)
 		self.init_drivers()
 		self.dev_monitor.start()
 		load_custom_module(log)
 		self.default_mapper = self.init_default_mapper()
 		self.free_mappers.append(self.default_mapper)
 		self.load_default_profile()
+		self.prewarm_profiles()
 		self.lock.acquire()
 		self.start_listening()
 		self.connect_x()
@@ -674,27 +725,91 @@ class SCCDaemon(Daemon):
 		self.dev_monitor.rescan()
 
 		while True:
+			self.poller.poll(self.scheduler.get_timeout(), self.scheduler.update_time)
+			self.scheduler.run()
 			for fn in self.mainloops:
 				fn()
 
 
 	def start_listening(self):
+		"""
+		Creates control socket. Socket and all connected clients are handled
+		by poller, on main thread. Nothing is ever written to client
+		directly; messages are queued and sent once socket is writable,
+		so slow client cannot block mainloop.
+		"""
 		if os.path.exists(self.socket_file):
 			os.unlink(self.socket_file)
-		instance = self
-
-		class SSHandler(StreamRequestHandler):
-			def handle(self):
-				instance._sshandler(self.connection, self.rfile, self.wfile)
-
-		self.sserver = ThreadingUnixStreamServer(self.socket_file, SSHandler)
-		t = threading.Thread(target=self.sserver.serve_forever)
-		t.daemon = True
-		t.start()
+		self.sserver = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.sserver.bind(self.socket_file)
+		self.sserver.listen(16)
+		self.sserver.setblocking(False)
+		self.poller.register(self.sserver.fileno(), self.poller.POLLIN, self._on_connection)
 		os.chmod(self.socket_file, stat.S_IRUSR | stat.S_IWUSR)
 		log.debug("Created control socket %s", self.socket_file)
 
 
+	def _on_connection(self, fd, event):
+		try:
+			connection, address = self.sserver.accept()
+		except (BlockingIOError, InterruptedError):
+			return
+		connection.setblocking(False)
+		with self.lock:
+			client = Client(connection, self.default_mapper, self.poller, self._on_client_ready)
+			self.clients.add(client)
+			self._clients_by_fd[client.fileno] = client
+			client.send(b"SCCDaemon\n")
+			client.send(("Version: %s\n" % (DAEMON_VERSION,)).encode("utf-8"))
+			client.send(("PID: %s\n" % (os.getpid(),)).encode("utf-8"))
+			self.send_controller_list(client.send)
+			self.send_all_profiles(client.send)
+			if len(self.errors) == 0:
+				client.send(b"Ready.\n")
+			else:
+				for id, error in self.errors:
+					client.send(("Error: %s\n" % (error,)).encode("utf-8"))
+
+
+	def _on_client_ready(self, fd, event):
+		client = self._clients_by_fd.get(fd)
+		if client is None:
+			return
+		if event == self.poller.POLLOUT:
+			client.flush()
+			return
+		try:
+			lines = client.receive()
+		except OSError:
+			lines = None
+		if lines is None:
+			# Connection terminated
+			self._client_lost(client)
+			return
+		for line in lines:
+			if len(line.strip(b"\t\n ")) > 0:
+				try:
+					self._handle_message(client, line.strip(b"\n"))
+				except Exception:
+					# Runs on main thread, so error here must not propagate
+					log.exception("Failed to handle message from client")
+
+
+	def _client_lost(self, client):
+		with self.lock:
+			client.unlock_actions(self)
+			if self.osd_daemon == client:
+				log.info("scc-osd-daemon lost")
+				self.osd_daemon = None
+			if self.autoswitch_daemon == client:
+				log.info("scc-autoswitch-daemon lost")
+				self.autoswitch_daemon = None
+			self.clients.discard(client)
+			self._clients_by_fd.pop(client.fileno, None)
+		self.poller.unregister(client.fileno)
+		client.destroy()
+
+
 	def _start_gesture(self, mapper, what, up_angle, callback):
 		"""
 		Starts gesture detection on specified pad.
@@ -726,43 +841,6 @@ class SCCDaemon(Daemon):
 		return gd
 
 
-	def _sshandler(self, connection, rfile, wfile):
-		with self.lock:
-			client = Client(connection, self.default_mapper, rfile, wfile)
-			self.clients.add(client)
-			wfile.write(b"SCCDaemon\n")
-			wfile.write(("Version: %s\n" % (DAEMON_VERSION,)).encode("utf-8"))
-			wfile.write(("PID: %s\n" % (os.getpid(),)).encode("utf-8"))
-			self.send_controller_list(wfile.write)
-			self.send_all_profiles(wfile.write)
-			if len(self.errors) == 0:
-				wfile.write(b"Ready.\n")
-			else:
-				for id, error in self.errors:
-					wfile.write(("Error: %s\n" % (error,)).encode("utf-8"))
-
-		while True:
-			try:
-				line = rfile.readline()
-			except Exception:
-				# Connection terminated
-				break
-			if len(line) == 0:
-				break
-			if len(line.strip(b"\t\n ")) > 0:
-				self._handle_message(client, line.strip(b"\n"))
-
-		with self.lock:
-			client.unlock_actions(self)
-			if self.osd_daemon == client:
-				log.info("scc-osd-daemon lost")
-				self.osd_daemon = None
-			if self.autoswitch_daemon == client:
-				log.info("scc-autoswitch-daemon lost")
-				self.autoswitch_daemon = None
-			self.clients.remove(client)
-
-
 	def _handle_message(self, client, message):
 		"""
 		Handles message received from client.
@@ -773,24 +851,24 @@ class SCCDaemon(Daemon):
 					filename = message[8:].decode("utf-8").strip("\t ")
 					self._set_profile(client.mapper, filename)
 					log.info("Loaded profile '%s'", filename)
-					client.wfile.write(b"OK.\n")
+					client.send(b"OK.\n")
 				except Exception as e:
 					exc = traceback.format_exc()
 					log.exception(e)
 					tb = str(exc).encode("utf-8").decode('unicode_escape').encode("latin1")
-					client.wfile.write(b"Fail: " + tb + b"\n")
+					client.send(b"Fail: " + tb + b"\n")
 		elif message.startswith(b"OSD:"):
 			if not self.osd_daemon:
-				client.wfile.write(b"Fail: Cannot show OSD; there is no scc-osd-daemon registered\n")
+				client.send(b"Fail: Cannot show OSD; there is no scc-osd-daemon registered\n")
 			else:
 				try:
 					text = message[5:].decode("utf-8").strip("\t ")
 					with self.lock:
 						if not self._osd("message", text):
 							raise Exception()
-					client.wfile.write(b"OK.\n")
+					client.send(b"OK.\n")
 				except Exception:
-					client.wfile.write(b"Fail: cannot display OSD\n")
+					client.send(b"Fail: cannot display OSD\n")
 		elif message.startswith(b"Feedback:"):
 			try:
 				position, amplitude = message[9:].strip().split(b" ", 2)
@@ -800,14 +878,14 @@ class SCCDaemon(Daemon):
 				)
 				if client.mapper.get_controller():
 					client.mapper.get_controller().feedback(data)
-				client.wfile.write(b"OK.\n")
+				client.send(b"OK.\n")
 			except Exception as e:
 				log.exception(e)
-				client.wfile.write(b"Fail: %s\n" % (e,))
+				client.send(b"Fail: %s\n" % (e,))
 		elif message.startswith(b"Controller."):
 			with self.lock:
 				client.mapper = self.default_mapper
-				client.wfile.write(b"OK.\n")
+				client.send(b"OK.\n")
 		elif message.startswith(b"Controller:"):
 			with self.lock:
 				try:
@@ -815,24 +893,50 @@ class SCCDaemon(Daemon):
 					for c in self.controllers:
 						if c.get_id() == controller_id:
 							client.mapper = c.get_mapper()
-							client.wfile.write(b"OK.\n")
+							client.send(b"OK.\n")
 							break
 					else:
 						raise Exception("goto fail")
 				except Exception:
-					client.wfile.write(b"Fail: no such controller\n")
+					client.send(b"Fail: no such controller\n")
 		elif message.startswith(b"State."):
 			if Config()["enable_sniffing"]:
-				client.wfile.write(b"State: %s\n" % (str(client.mapper.state), ))
+				client.send(b"State: %s\n" % (str(client.mapper.state), ))
 			else:
 				log.warning("Refused 'State' request: Sniffing disabled")
-				client.wfile.write(b"Fail: Sniffing disabled.\n")
+				client.send(b"Fail: Sniffing disabled.\n")
+		elif message.startswith(b"Stats."):
+			if not latency.enabled:
+				client.send(b"Fail: Latency statistics are disabled\n")
+				return
+			with self.lock:
+				mappers = [ (c.get_id(), c.get_mapper()) for c in self.controllers ]
+			for controller_id, mapper in mappers:
+				if mapper is None or mapper.latency is None:
+					continue
+				for row in mapper.latency.summary():
+					client.send(("Stats: %s %s %s %.0f %.0f %.0f %.0f\n" % (
+						(controller_id,) + row)).encode("utf-8"))
+			client.send(b"OK.\n")
+		elif message.startswith(b"Stats:"):
+			what = message[6:].strip()
+			if what in (b"on", b"off"):
+				latency.set_enabled(what == b"on")
+			elif what == b"reset":
+				with self.lock:
+					for mapper in [ c.get_mapper() for c in self.controllers ] + [ self.default_mapper ]:
+						if mapper is not None:
+							mapper.latency = None
+			else:
+				client.send(b"Fail: expected 'on', 'off' or 'reset'\n")
+				return
+			client.send(b"OK.\n")
 		elif message.startswith(b"Led:"):
 			try:
 				number = int(message[4:])
 				number = clamp(0, number, 100)
 			except Exception as e:
-				client.wfile.write(b"Fail: %s\n" % (e,))
+				client.send(b"Fail: %s\n" % (e,))
 				return
 			if client.mapper.get_controller():
 				client.mapper.get_controller().set_led_level(number)
@@ -842,48 +946,48 @@ class SCCDaemon(Daemon):
 				with self.lock:
 					for l in to_observe:
 						client.observe_action(self, SCCDaemon.source_to_constant(l))
-					client.wfile.write(b"OK.\n")
+					client.send(b"OK.\n")
 			else:
 				log.warning("Refused 'Observe' request: Sniffing disabled")
-				client.wfile.write(b"Fail: Sniffing disabled.\n")
+				client.send(b"Fail: Sniffing disabled.\n")
 		elif message.startswith(b"Replace:"):
 			try:
 				l, actionstr = message.split(b":", 1)[1].strip(b" \t\r").split(b" ", 1)
 				action = TalkingActionParser().restart(actionstr).parse().compress()
 			except Exception as e:
 				e = str(e).encode("utf-8").decode('unicode_escape').encode("latin1")
-				client.wfile.write(b"Fail: failed to parse: " + e + b"\n")
+				client.send(b"Fail: failed to parse: " + e + b"\n")
 				return
 			with self.lock:
 				try:
 					if not self._can_lock_action(client.mapper, SCCDaemon.source_to_constant(l)):
-						client.wfile.write(b"Fail: Cannot lock " + l.encode("utf-8") + b"\n")
+						client.send(b"Fail: Cannot lock " + l.encode("utf-8") + b"\n")
 						return
 				except ValueError:
 					tb = str(traceback.format_exc()).encode("utf-8").decode('unicode_escape').encode("latin1")
-					client.wfile.write(b"Fail: " + tb + b"\n")
+					client.send(b"Fail: " + tb + b"\n")
 					return
 				client.replace_action(self, SCCDaemon.source_to_constant(l), action)
-				client.wfile.write(b"OK.\n")
+				client.send(b"OK.\n")
 		elif message.startswith(b"Lock:"):
 			to_lock = [ x for x in message.split(b":", 1)[1].strip(b" \t\r").split(b" ") ]
 			with self.lock:
 				try:
 					for l in to_lock:
 						if not self._can_lock_action(client.mapper, SCCDaemon.source_to_constant(l)):
-							client.wfile.write(b"Fail: Cannot lock " + l.encode("utf-8") + b"\n")
+							client.send(b"Fail: Cannot lock " + l.encode("utf-8") + b"\n")
 							return
 				except ValueError:
 					tb = str(traceback.format_exc()).encode("utf-8").decode('unicode_escape').encode("latin1")
-					client.wfile.write(b"Fail: " + tb + b"\n")
+					client.send(b"Fail: " + tb + b"\n")
 					return
 				for l in to_lock:
 					client.lock_action(self, SCCDaemon.source_to_constant(l))
-				client.wfile.write(b"OK.\n")
+				client.send(b"OK.\n")
 		elif message.startswith(b"Unlock."):
 			with self.lock:
 				client.unlock_actions(self)
-				client.wfile.write(b"OK.\n")
+				client.send(b"OK.\n")
 		elif message.startswith(b"Reconfigure."):
 			with self.lock:
 				# Load config
@@ -899,21 +1003,16 @@ class SCCDaemon(Daemon):
 					self._remove_subproccess("scc-autoswitch-daemon")
 					self.autoswitch_daemon.close()
 					self.autoswitch_daemon = None
+				self.prewarm_profiles()
 				# Respond
-				try:
-					client.wfile.write(b"OK.\n")
-					self._send_to_all("Reconfigured.\n".encode("utf-8"))
-				except Exception:
-					pass
+				client.send(b"OK.\n")
+				self._send_to_all("Reconfigured.\n".encode("utf-8"))
 		elif message.startswith(b"Rescan."):
 			cbs = []
 			with self.lock:
 				cbs += self.rescan_cbs
 				# Respond first
-				try:
-					client.wfile.write(b"OK.\n")
-				except Exception:
-					pass
+				client.send(b"OK.\n")
 			# Do stuff later
 			# (this cannot be done while self.lock is held, as creating new
 			# controller would create race condition)
@@ -937,25 +1036,25 @@ class SCCDaemon(Daemon):
 					to_turn_off += [ c for c in self.controllers ]
 			for c in to_turn_off:
 				c.turnoff()
-			client.wfile.write(b"OK.\n")
+			client.send(b"OK.\n")
 		elif message.startswith(b"Gesture:"):
 			try:
 				what, up_angle = message[8:].strip().split(b" ", 2)
 				up_angle = int(up_angle)
 			except Exception:
 				tb = str(traceback.format_exc()).encode("utf-8").decode('unicode_escape').encode("latin1")
-				client.wfile.write(b"Fail: " + tb + b"\n")
+				client.send(b"Fail: " + tb + b"\n")
 				return
 			with self.lock:
 				client.request_gesture(self, what, up_angle)
-				client.wfile.write(b"OK.\n")
+				client.send(b"OK.\n")
 		elif message.startswith(b"Restart."):
 			self.on_sa_restart()
 		elif message.startswith(b"Gestured:"):
 			gstr = message[9:].strip()
 			client.gesture_action.gesture(client.mapper, gstr)
 			with self.lock:
-				client.wfile.write(b"OK.\n")
+				client.send(b"OK.\n")
 		elif message.startswith(b"Selected:"):
 			menuaction = None
 			def press(mapper):
@@ -982,16 +1081,13 @@ class SCCDaemon(Daemon):
 					if menu_id in (None, "None"):
 						menuaction = self.osd_ids[item_id]
 					elif "." in menu_id:
-						# TODO: Move this common place
-						data = json.loads(open(menu_id, "r").read())
-						menudata = MenuData.from_json_data(data, TalkingActionParser())
-						menuaction = menudata.get_by_id(item_id).action
+						menuaction = self.menu_cache.get_item(menu_id, item_id).action
 					else:
 						menuaction = client.mapper.profile.menus[menu_id].get_by_id(item_id).action
-					client.wfile.write(b"OK.\n")
+					client.send(b"OK.\n")
 				except Exception:
 					log.warning("Selected menu item is no longer valid.")
-					client.wfile.write(b"Fail: Selected menu item is no longer valid\n")
+					client.send(b"Fail: Selected menu item is no longer valid\n")
 				if menuaction:
 					client.mapper.schedule(0, press)
 		elif message.startswith(b"Register:"):
@@ -1006,9 +1102,9 @@ class SCCDaemon(Daemon):
 						self.autoswitch_daemon.close()
 					self.autoswitch_daemon = client
 					log.info("Registered scc-autoswitch-daemon")
-				client.wfile.write(b"OK.\n")
+				client.send(b"OK.\n")
 		else:
-			client.wfile.write(b"Fail: Unknown command\n")
+			client.send(b"Fail: Unknown command\n")
 
 
 	def _remove_subproccess(self, binary_name):
@@ -1095,6 +1191,7 @@ class SCCDaemon(Daemon):
 			mapper.profile.pads[what] = a
 		else:
 			raise ValueError("Unknown source: %s" % (what,))
+		mapper.invalidate_plan()
 
 
 	@staticmethod
@@ -1119,7 +1216,8 @@ class SCCDaemon(Daemon):
 
 
 	def _remove_socket(self):
-		self.sserver.shutdown()
+		self.poller.unregister(self.sserver.fileno())
+		self.sserver.close()
 		if os.path.exists(self.socket_file):
 			os.unlink(self.socket_file)
 		log.debug("Control socket removed")
@@ -1137,23 +1235,146 @@ class SCCDaemon(Daemon):
 
 
 class Client:
-	def __init__(self, connection, mapper, rfile, wfile):
+	"""
+	Connected client. Everything sent to client is queued and written only
+	when socket becomes writable, so send() never blocks.
+
+	'Event:' messages with position of axis or pad can be queued with 'key';
+	When message with same key is already waiting in queue, it's dropped
+	and only newest position is sent.
+	Client that doesn't read fast enough to keep queue under MAX_QUEUED
+	bytes is disconnected.
+	"""
+	MAX_QUEUED = 256 * 1024
+	# Client is disconnected if it sends line longer than this
+	MAX_LINE = 64 * 1024
+	# Maximum number of bytes written by single send() call
+	WRITE_SIZE = 64 * 1024
+
+	def __init__(self, connection, mapper, poller, callback):
 		self.connection = connection
-		self.rfile = rfile
-		self.wfile = wfile
+		self.fileno = connection.fileno()
 		self.mapper = mapper
 		self.gesture_action = None
 		self.locked_actions = {}
+		self.closed = False
+		self._poller = poller
+		self._callback = callback
+		self._lock = threading.Lock()		# send() may be called from any thread
+		self._queue = deque()			# [ data, key ] waiting to be sent
+		self._coalesced = {}			# key -> item in _queue
+		self._queued = 0				# number of bytes in _queue
+		self._out = b""				# data being sent
+		self._writing = False			# True if waiting for socket to become writable
+		self._in = b""				# received data without newline
+		poller.register(self.fileno, poller.POLLIN, callback)
+
+
+	def send(self, data, key=None):
+		"""
+		Queues data (bytes) to be sent to client.
+		If 'key' is set, previously queued data with same key is dropped.
+		"""
+		with self._lock:
+			if self.closed:
+				return
+			if key is not None:
+				item = self._coalesced.get(key)
+				if item is not None:
+					self._queued -= len(item[0])
+					item[0] = b""
+			item = [ data, key ]
+			self._queue.append(item)
+			self._queued += len(data)
+			if key is not None:
+				self._coalesced[key] = item
+			if self._queued > Client.MAX_QUEUED:
+				log.warning("Client %x doesn't read sent data, disconnecting", hash(self))
+				self._shutdown()
+				return
+			if not self._writing:
+				self._writing = True
+				self._poller.register(self.fileno, self._poller.POLLIN | self._poller.POLLOUT, self._callback)
+
+
+	def flush(self):
+		""" Sends as much of queued data as socket accepts. Called from poller """
+		with self._lock:
+			while not self.closed:
+				if not self._out:
+					if not self._queue:
+						break
+					parts, size = [], 0
+					while self._queue and size < Client.WRITE_SIZE:
+						data, key = item = self._queue.popleft()
+						if key is not None and self._coalesced.get(key) is item:
+							del self._coalesced[key]
+						parts.append(data)
+						size += len(data)
+					self._queued -= size
+					self._out = b"".join(parts)
+					continue
+				try:
+					sent = self.connection.send(self._out)
+				except (BlockingIOError, InterruptedError):
+					return
+				except OSError:
+					# Connection terminated; Poller will report it as POLLIN
+					self._shutdown()
+					return
+				self._out = self._out[sent:]
+			if self._writing and not self.closed:
+				self._writing = False
+				self._poller.register(self.fileno, self._poller.POLLIN, self._callback)
 
 
-	def close(self):
-		""" Closes connection to this client """
+	def receive(self):
+		"""
+		Reads available data. Returns list of complete lines received or
+		None if connection was terminated.
+		"""
 		try:
-			self.connection.shutdown(True)
-		except Exception:
+			data = self.connection.recv(65536)
+		except (BlockingIOError, InterruptedError):
+			return []
+		if not data or self.closed:
+			return None
+		lines = (self._in + data).split(b"\n")
+		self._in = lines.pop()
+		if len(self._in) > Client.MAX_LINE:
+			log.warning("Client %x sent too long line, disconnecting", hash(self))
+			return None
+		return lines
+
+
+	def _shutdown(self):
+		"""
+		Stops sending and shuts socket down. Poller then reports
+		socket as readable and connection is cleaned up on main thread.
+		"""
+		self.closed = True
+		self._queue.clear()
+		self._coalesced.clear()
+		self._queued, self._out = 0, b""
+		try:
+			self.connection.shutdown(socket.SHUT_RDWR)
+		except OSError:
 			pass
 
 
+	def close(self):
+		""" Closes connection to this client """
+		with self._lock:
+			self._shutdown()
+
+
+	def destroy(self):
+		""" Closes socket. Called once client is unregistered from poller """
+		with self._lock:
+			self.closed = True
+			self.connection.close()
+
+
 	def request_gesture(self, daemon, what, up_angle):
 		"""
 		Handler used when client requested gesture detection with
@@ -1163,10 +1384,7 @@ class Client:
 		"""
 		def cb(gesture):
 			# Called while lock is being held
-			try:
-				self.wfile.write(b"Gesture: %s %s\n" % (what, gesture))
-			except Exception:
-				pass
+			self.send(b"Gesture: %s %s\n" % (what, gesture))
 
 		gd = daemon._start_gesture(self.mapper, what, up_angle, cb)
 		gd.enable()
@@ -1255,13 +1473,8 @@ class ReportingAction(Action):
 	__str__ = __repr__
 
 
-	def _report(self, message):
-		try:
-			self.client.wfile.write(message.encode("utf-8"))
-		except Exception:
-			# May fail when client dies
-			self.client.rfile.close()
-			self.client.wfile.close()
+	def _report(self, message, key=None):
+		self.client.send(message.encode("utf-8"), key)
 
 
 	def trigger(self, mapper, position, old_position):
@@ -1269,7 +1482,7 @@ class ReportingAction(Action):
 			self._report("Event: %s %s %s %s\n" % (
 				mapper.get_controller().get_id(),
 				nameof(self.what), position, old_position
-			))
+			), (self.mapper, self.what))
 
 
 	def button_press(self, mapper, number=1):
@@ -1302,7 +1515,7 @@ class ReportingAction(Action):
 				self._report("Event: %s %s %s %s\n" % (
 					mapper.get_controller().get_id(),
 					what, x, y
-				))
+				), (self.mapper, what))
 
 
 class LockedAction(ReportingAction):
@@ -5,83 +5,201 @@ Runs in SCCDaemon's (single-threaded) mainloop. That means all callbacks are
 also called on main thread.
 
 Use schedule(delay, callback, *data) to register one-time task.
+
+Daemon mainloop doesn't spin; it sleeps in Poller.poll for time returned by
+get_timeout(). Tasks scheduled from other threads have to wake it up, what is
+done by calling 'wakeup' callback passed to constructor.
+
+Tasks are kept in binary heap ordered by time and order in which they were
+scheduled. Canceling task only marks it as canceled; it's then dropped once
+it gets to top of heap, or when there is too many canceled tasks in heap.
+All times are taken from time.monotonic() by default, so changing system
+clock doesn't affect scheduled tasks.
 """
-import time, queue, logging
+import time, heapq, logging, threading
 log = logging.getLogger("Scheduler")
 
-# TODO: Maybe create actual thread for this? Use poler? Scrap everything and rewrite it in GO?
 
 class Scheduler:
+	# Heap is rebuilt when it holds more canceled tasks than this
+	# and canceled tasks make more than half of it
+	COMPACT_THRESHOLD = 64
 
-	def __init__(self):
-		self._scheduled = queue.PriorityQueue()
-		self._next = None
-		self._now = time.time()
-
-
-	def schedule(self, delay, callback, *data):
+	def __init__(self, wakeup=None, clock=None):
+		"""
+		'wakeup', if set, is called when task is scheduled from another thread
+		or when newly scheduled task becomes the first one that should be
+		executed.
+		'clock' is function returning current time in seconds. Defaults to
+		time.monotonic.
+		"""
+		self._clock = clock or time.monotonic
+		self._heap = []				# (time, sequence number, Task)
+		self._incoming = []			# tasks scheduled from other threads
+		self._owned = {}			# owner -> set of pending tasks
+		self._canceled = 0			# number of canceled tasks still in heap
+		self._sequence = 0
+		self._now = self._clock()
+		self._thread = threading.get_ident()
+		self._wakeup = wakeup
+
+
+	def schedule(self, delay, callback, *data, owner=None):
 		"""
 		Schedules one-time task to be executed no sooner than after 'delay' of
 		seconds. Delay may be float number.
 		'callback' is called as callback(*data).
 
+		If 'owner' is set, task can be canceled along with all other tasks of
+		same owner using cancel_owned(owner).
+
 		Returned Task instance can be used to cancel task once scheduled.
 		"""
-		task = Task(self._now + delay, callback, data)
-		if self._next is None or task.time < self._next.time:
-			if self._next:
-				self._scheduled.put(self._next)
-			self._next = task
+		if threading.get_ident() == self._thread:
+			task = Task(self._now + delay, callback, data, owner)
+			self._push(task)
+			if self._wakeup and self._heap[0][2] is task:
+				self._wakeup()
 		else:
-			self._scheduled.put(task)
+			# Called from another thread while mainloop may be sleeping
+			# for a long time; cached time cannot be used then.
+			# Heap is not touched here, task is passed to main thread.
+			task = Task(self._clock() + delay, callback, data, owner)
+			self._incoming.append(task)
+			if self._wakeup:
+				self._wakeup()
 		return task
 
 
+	def _push(self, task):
+		self._sequence += 1
+		task._scheduler = self
+		heapq.heappush(self._heap, (task.time, self._sequence, task))
+		if task.owner is not None:
+			owned = self._owned.get(task.owner)
+			if owned is None:
+				owned = self._owned[task.owner] = set()
+			owned.add(task)
+
+
+	def _forget(self, task):
+		""" Removes task from owner index """
+		task._scheduler = None
+		if task.owner is not None:
+			owned = self._owned.get(task.owner)
+			if owned is not None:
+				owned.discard(task)
+				if not owned:
+					del self._owned[task.owner]
+
+
 	def cancel_task(self, task):
 		"""
 		Returns True if task was sucessfully removed or False if task was
-		already executed or not known at all.
+		already executed, canceled or not known at all.
+
+		Task is not removed from queue right away, it's just marked as
+		canceled and dropped later, so this takes constant time.
+		Has to be called on main thread.
+		"""
+		if task._scheduler is not self:
+			if task in self._incoming:
+				# Scheduled from other thread and not yet picked up
+				self._incoming.remove(task)
+				return True
+			return False
+		self._forget(task)
+		task.callback, task.data = None, ()
+		self._canceled += 1
+		if self._canceled > Scheduler.COMPACT_THRESHOLD and self._canceled * 2 > len(self._heap):
+			# Compacted in place, as run() may be iterating over heap
+			self._heap[:] = [ x for x in self._heap if x[2]._scheduler is self ]
+			heapq.heapify(self._heap)
+			self._canceled = 0
+		return True
+
+
+	def cancel_owned(self, owner):
+		"""
+		Cancels all pending tasks scheduled with specified owner.
+		Returns number of canceled tasks.
+		"""
+		owned = self._owned.get(owner)
+		if not owned:
+			return 0
+		count = 0
+		for task in list(owned):
+			if self.cancel_task(task):
+				count += 1
+		return count
+
+
+	def _merge_incoming(self):
+		while self._incoming:
+			self._push(self._incoming.pop())
+
+
+	def _drop_canceled(self):
+		heap = self._heap
+		while heap and heap[0][2]._scheduler is not self:
+			heapq.heappop(heap)
+			self._canceled -= 1
+
 
-		Note that this is slow as hell and completly thread-unsafe,
-		so it _has_ to be called on main thread.
+	def get_timeout(self):
 		"""
-		if task == self._next:
-			self._next = None if self._scheduled.empty() else self._scheduled.get()
-			return True
-		# Fun part: All tasks are removed from PriorityQueue
-		# until correct is found. Then everything is put back
-		tasks, found = [], False
-		while not self._scheduled.empty():
-			t = self._scheduled.get()
-			if t == task:
-				found = True
-				break
-			tasks.append(t)
-		for t in tasks:
-			self._scheduled.put(t)
-		return found
+		Returns number of seconds until next task is due, 0 if it's already
+		late or None if there is nothing scheduled.
+		"""
+		if self._incoming:
+			self._merge_incoming()
+		self._drop_canceled()
+		if not self._heap:
+			return None
+		return max(0.0, self._heap[0][0] - self._clock())
+
+
+	def update_time(self):
+		"""
+		Updates time used as base for newly scheduled tasks.
+		Called by mainloop right after waking up, so tasks scheduled from
+		poller callbacks don't count from time when mainloop went to sleep.
+		"""
+		self._thread = threading.get_ident()
+		self._now = self._clock()
 
 
 	def run(self):
-		self._now = time.time()
-		while self._next and self._now >= self._next.time:
-			callback, data = self._next.callback, self._next.data
-			self._next = None if self._scheduled.empty() else self._scheduled.get()
-			callback(*data)
+		self.update_time()
+		if self._incoming:
+			self._merge_incoming()
+		heap = self._heap
+		while heap and self._now >= heap[0][0]:
+			task = heapq.heappop(heap)[2]
+			if task._scheduler is not self:
+				# Canceled
+				self._canceled -= 1
+				continue
+			self._forget(task)
+			task.callback(*task.data)
 
 
 class Task:
+	__slots__ = ("time", "callback", "data", "owner", "_scheduler")
 
-	def __init__(self, time, callback, data):
+	def __init__(self, time, callback, data, owner=None):
 		self.time = time
 		self.callback = callback
 		self.data = data
+		self.owner = owner
+		self._scheduler = None
 
 
 	def cancel(self):
-		""" Marks task as canceled, without actually removing it from scheduler """
-		self.callback = lambda *a, **b: False
-		self.data = ()
+		""" Cancels task, if it wasn't executed yet """
+		if self._scheduler is not None:
+			self._scheduler.cancel_task(self)
+
 
 	def __lt__(self, other):
-		self.time < other.time
+		return self.time < other.time
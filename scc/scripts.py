@@ -116,6 +116,91 @@ def cmd_list_profiles(argv0: str, argv: list[str]) -> int:
 	return 0
 
 
+def cmd_convert_vdf(argv0: str, argv: list[str]) -> int:
+	"""Convert Steam profiles (.vdf, .vdffz and *_legacy.bin) to sccprofiles.
+
+	Usage: scc convert-vdf [-j jobs] [-o output_directory] path [path ...]
+
+	Every path can be file or directory, which is searched recursively.
+	Profiles are converted in parallel and saved into output directory,
+	keeping directory structure of source, with names of source files.
+	Action sets are saved as separate profiles, as when imported by GUI.
+
+	Arguments:
+		-j   Number of worker processes (default: number of CPUs)
+		-o   Output directory (default: user profiles directory). Required
+		     when converting directory, so its structure is not copied into
+		     user profiles directory.
+	"""
+	import getopt
+	import time
+	from concurrent.futures import ProcessPoolExecutor
+
+	from scc.foreign.vdf import convert_file
+	from scc.paths import get_profiles_path
+
+	try:
+		opts, paths = getopt.getopt(argv, "j:o:")
+		opts = dict(opts)
+		jobs = int(opts.get("-j", os.cpu_count() or 1))
+	except (getopt.GetoptError, ValueError):
+		raise InvalidArguments()
+	if not paths or jobs < 1:
+		raise InvalidArguments()
+	if "-o" not in opts and any(os.path.isdir(path) for path in paths):
+		print("Output directory (-o) has to be set when converting directory", file=sys.stderr)
+		return 1
+	output = opts.get("-o", get_profiles_path())
+
+	# List of (source filename, output directory, profile name)
+	tasks = []
+	for path in paths:
+		if os.path.isdir(path):
+			files = []
+			for root, dirs, names in os.walk(path):
+				dirs.sort()
+				files += [ os.path.join(root, x) for x in sorted(names) ]
+		else:
+			files, path = [ path ], os.path.dirname(path)
+		for filename in files:
+			name, ext = os.path.splitext(os.path.relpath(filename, path))
+			if ext in (".vdf", ".vdffz") or filename.endswith("_legacy.bin"):
+				target = os.path.join(output, os.path.dirname(name))
+				tasks.append(( filename, target, os.path.basename(name) ))
+	if not tasks:
+		print("No profiles found", file=sys.stderr)
+		return 1
+	sources = {}
+	for filename, target, name in tasks:
+		key = os.path.join(target, name)
+		if key in sources:
+			print("Both %s and %s would be saved as %s" % (sources[key], filename, key), file=sys.stderr)
+			return 1
+		sources[key] = filename
+
+	jobs = min(jobs, len(tasks))
+	start = time.perf_counter()
+	failed, saved = [], 0
+	with ProcessPoolExecutor(max_workers=jobs) as executor:
+		futures = []
+		for filename, target, name in tasks:
+			os.makedirs(target, exist_ok=True)
+			futures.append(executor.submit(convert_file, filename, target, name))
+		for (filename, target, name), future in zip(tasks, futures):
+			try:
+				saved += len(future.result())
+			except Exception as e:
+				failed.append(( filename, e ))
+
+	duration = time.perf_counter() - start
+	for filename, e in failed:
+		print("%s: %s: %s" % (filename, e.__class__.__name__, e), file=sys.stderr)
+	print("Converted %s of %s files into %s profiles in %.2fs (%.1fms per file, %s processes)" % (
+		len(tasks) - len(failed), len(tasks), saved, duration,
+		duration * 1000.0 / len(tasks), jobs))
+	return 1 if failed else 0
+
+
 def cmd_set_profile(argv0: str, argv: list[str]) -> int:
 	"""Set controller profile.
 
@@ -179,6 +264,55 @@ def cmd_info(argv0: str, argv: list[str]) -> int:
 	return 0
 
 
+def cmd_latency(argv0: str, argv: list[str]) -> int:
+	"""Display input latency measured by daemon.
+
+	Usage: scc latency [on|off|reset]
+
+	Without arguments, prints percentiles of time spent in every stage of
+	input processing, per controller. Times are in microseconds.
+	Measuring is disabled by default and has to be enabled with 'on' first.
+
+	Stages:
+		receive    - from receiving data from device to passing it to mapper
+		dispatch   - executing actions
+		scheduled  - executing scheduled tasks
+		generate   - generating and writing emulated events
+		total      - everything above
+	"""
+	if len(argv) > 1 or (argv and argv[0] not in ("on", "off", "reset")):
+		raise InvalidArguments()
+	s = connect_to_daemon()
+	if s is None: return -1
+	if argv:
+		print("Stats: %s" % (argv[0],), file=s)
+		return 0 if check_error(s) else 1
+	print("Stats.", file=s)
+	s.flush()
+	rows = []
+	while True:
+		line = s.readline()
+		if len(line) == 0:
+			print("Connection closed", file=sys.stderr)
+			return 1
+		line = line.strip("\r\n\t ")
+		if line.startswith("Stats:"):
+			rows.append(line[6:].split())
+		elif line == "OK.":
+			break
+		elif line.startswith("Fail:"):
+			print(line, file=sys.stderr)
+			return 1
+	if not rows:
+		print("No input measured yet")
+		return 0
+	print("%-16s %-10s %8s %8s %8s %8s %8s" % (
+		"controller", "stage", "count", "p50", "p90", "p99", "max"))
+	for row in rows:
+		print("%-16s %-10s %8s %8s %8s %8s %8s" % tuple(row))
+	return 0
+
+
 def cmd_dependency_check(argv0: str, argv: list[str]) -> int:
 	"""Check if all required libraries are installed on this system."""
 	try:
@@ -0,0 +1,155 @@
+"""SC Controller - Gyro sensor fusion
+
+Computes orientation of controller that has gyroscope and accelerometer but,
+unlike Steam Controller, doesn't compute it by itself. Result is stored in
+q1-q4 fields of controller state, in same format as Steam Controller uses.
+
+SensorFusion is Mahony filter: gyro is integrated into orientation
+quaternion, which is continuously pulled towards gravity measured by
+accelerometer, so pitch and roll do not drift. Gyro bias, which would make
+yaw drift, is calibrated whenever controller lies still.
+
+SensorClock converts sensor timestamps sent by controller into seconds
+between reports, or uses monotonic clock for controllers without them.
+"""
+import time
+from math import pi, sqrt
+
+# Raw gyro values per degree per second, same for DS4 and DS5
+GYRO_RES_IN_DEG_SEC = 16
+# Accelerometer value for 1G, as stored in accel_x-z fields
+ACCEL_RES_PER_G = 16384
+
+
+class SensorClock:
+	"""
+	Computes time between reports from counter sent by controller, which
+	has 'bits' bits and increases by one every 'resolution' seconds.
+	If controller sends no timestamps, time.monotonic is used.
+	"""
+	# Longer time between reports is considered as pause and not used
+	MAX_DELTA = 0.1
+
+	def __init__(self, bits=None, resolution=None):
+		self._mask = (1 << bits) - 1 if bits else None
+		self._resolution = resolution
+		self._last = None
+
+
+	def get_delta(self, counter=None):
+		"""
+		Returns time in seconds since previous call, or 0.0 on first call
+		and after pause.
+		"""
+		if self._mask is None:
+			now = time.monotonic()
+			delta = 0.0 if self._last is None else now - self._last
+		else:
+			now = counter
+			delta = 0.0 if self._last is None else ((now - self._last) & self._mask) * self._resolution
+		self._last = now
+		if delta > SensorClock.MAX_DELTA:
+			return 0.0
+		return delta
+
+
+class SensorFusion:
+	"""
+	Orientation computed from gyro and accelerometer.
+
+	Sensor values are expected in same format as stored in controller state
+	by DS5 driver: 'pitch', 'yaw' and 'roll' are raw gyro values, with
+	GYRO_RES_IN_DEG_SEC units per degree per second, and 'accel_x-z' are
+	accelerometer values with ACCEL_RES_PER_G units per 1G.
+	All state is kept in attributes, so update() allocates nothing but floats.
+	"""
+	# How fast is orientation pulled towards gravity
+	KP = 1.0
+	# Accelerometer is ignored when measured acceleration is too different
+	# from 1G, as it's then not gravity that is being measured
+	MAX_ACCEL_ERROR = 0.25
+	# Gyro is considered still while it's this close to calibrated bias
+	STILL_THRESHOLD = 3.0 * GYRO_RES_IN_DEG_SEC
+	# ... for this many seconds. Bias is then averaged over CALIBRATION_TIME
+	STILL_TIME = 0.5
+	CALIBRATION_TIME = 2.0
+
+	def __init__(self, kp=KP):
+		self.kp = kp
+		self.reset()
+
+
+	def reset(self):
+		""" Resets orientation to identity and forgets calibrated bias """
+		self.qw, self.qx, self.qy, self.qz = 1.0, 0.0, 0.0, 0.0
+		self.bias_pitch, self.bias_yaw, self.bias_roll = 0.0, 0.0, 0.0
+		self._still_time = 0.0
+
+
+	def _calibrate(self, pitch, yaw, roll, dt):
+		""" Moves bias towards current gyro value if controller lies still """
+		threshold = SensorFusion.STILL_THRESHOLD
+		if (abs(pitch - self.bias_pitch) > threshold
+				or abs(yaw - self.bias_yaw) > threshold
+				or abs(roll - self.bias_roll) > threshold):
+			self._still_time = 0.0
+			return
+		self._still_time += dt
+		if self._still_time > SensorFusion.STILL_TIME:
+			k = min(1.0, dt / SensorFusion.CALIBRATION_TIME)
+			self.bias_pitch += (pitch - self.bias_pitch) * k
+			self.bias_yaw += (yaw - self.bias_yaw) * k
+			self.bias_roll += (roll - self.bias_roll) * k
+
+
+	def update(self, pitch, yaw, roll, accel_x, accel_y, accel_z, dt):
+		""" Updates orientation with one sample. 'dt' is in seconds """
+		if dt <= 0.0:
+			return
+		self._calibrate(pitch, yaw, roll, dt)
+		# Rotation axes: x is roll, y pitch and z yaw axis
+		scale = pi / (180.0 * GYRO_RES_IN_DEG_SEC)
+		gx = (roll - self.bias_roll) * scale
+		gy = (pitch - self.bias_pitch) * scale
+		gz = (yaw - self.bias_yaw) * scale
+		qw, qx, qy, qz = self.qw, self.qx, self.qy, self.qz
+
+		# Gravity, in same axes. Controller lying flat measures (0, 0, 1G)
+		ax, ay, az = -accel_y, -accel_x, accel_z
+		norm = sqrt(ax * ax + ay * ay + az * az)
+		if abs(norm - ACCEL_RES_PER_G) < ACCEL_RES_PER_G * SensorFusion.MAX_ACCEL_ERROR:
+			ax, ay, az = ax / norm, ay / norm, az / norm
+			# Gravity as expected from current orientation
+			vx = 2.0 * (qx * qz - qw * qy)
+			vy = 2.0 * (qw * qx + qy * qz)
+			vz = qw * qw - qx * qx - qy * qy + qz * qz
+			# Error is cross product of measured and expected gravity
+			gx += self.kp * (ay * vz - az * vy)
+			gy += self.kp * (az * vx - ax * vz)
+			gz += self.kp * (ax * vy - ay * vx)
+
+		# Integrate rate of change of quaternion
+		gx, gy, gz = gx * 0.5 * dt, gy * 0.5 * dt, gz * 0.5 * dt
+		qw, qx, qy, qz = (
+			qw - qx * gx - qy * gy - qz * gz,
+			qx + qw * gx + qy * gz - qz * gy,
+			qy + qw * gy - qx * gz + qz * gx,
+			qz + qw * gz + qx * gy - qy * gx,
+		)
+		norm = 1.0 / sqrt(qw * qw + qx * qx + qy * qy + qz * qz)
+		self.qw, self.qx, self.qy, self.qz = qw * norm, qx * norm, qy * norm, qz * norm
+
+
+	def get_quaternion(self):
+		"""
+		Returns orientation as (q1, q2, q3, q4) tuple, in format expected
+		in controller state.
+		"""
+		# q1 (Theta), q2 (Pitch), q3 (Roll), q4 (Yaw, inverted to match
+		# Steam Controller)
+		return (
+			int(self.qw * 32767.0),
+			int(self.qy * 32767.0),
+			int(self.qx * 32767.0),
+			int(self.qz * -32767.0),
+		)
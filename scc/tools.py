@@ -8,12 +8,16 @@ import ctypes
 import importlib.machinery
 import logging
 import os
+import pickle
 import shlex
 import sysconfig
+import tempfile
 from math import atan2, cos, sin, sqrt
 from math import pi as PI
 
+from scc.constants import DAEMON_VERSION
 from scc.paths import (
+	DirectoryIndex,
 	get_button_images_path,
 	get_controller_icons_path,
 	get_default_controller_icons_path,
@@ -191,6 +195,30 @@ def get_profile_name(path):
 	return ".".join(parts)
 
 
+# Directories searched by find_* functions, in order of priority
+_INDEX_PATHS = {
+	"profiles":			lambda: (get_profiles_path(), get_default_profiles_path()),
+	"menus":			lambda: (get_menus_path(), get_default_menus_path()),
+	"menu-icons":		lambda: (get_default_menuicons_path(), get_menuicons_path()),
+	"button-images":	lambda: (get_button_images_path(),),
+	"controller-icons":	lambda: (get_controller_icons_path(), get_default_controller_icons_path()),
+}
+_indexes = {}
+
+
+def get_directory_index(kind):
+	"""
+	Returns DirectoryIndex used to find one kind of files, one of
+	"profiles", "menus", "menu-icons", "button-images" and "controller-icons".
+	Directories are determined only on first call, as determining share
+	path takes few stat calls as well.
+	"""
+	index = _indexes.get(kind)
+	if index is None:
+		index = _indexes[kind] = DirectoryIndex.get(*_INDEX_PATHS[kind]())
+	return index
+
+
 def find_profile(name):
 	"""
 	Returns filename for specified profile name.
@@ -200,12 +228,7 @@ def find_profile(name):
 
 	Returns None if profile cannot be found.
 	"""
-	filename = "%s.sccprofile" % (name,)
-	for p in (get_profiles_path(), get_default_profiles_path()):
-		path = os.path.join(p, filename)
-		if os.path.exists(path):
-			return path
-	return None
+	return get_directory_index("profiles").find("%s.sccprofile" % (name,))
 
 
 def find_icon(name, prefer_bw=False, paths=None, extensions=("png", "svg")):
@@ -222,32 +245,24 @@ def find_icon(name, prefer_bw=False, paths=None, extensions=("png", "svg")):
 
 	Returns (None, False) if icon cannot be found.
 	"""
+	if paths is None:
+		index = get_directory_index("menu-icons")
+	else:
+		index = DirectoryIndex.get(*paths)
+	return _find_icon(index, name, prefer_bw, extensions)
+
+
+def _find_icon(index, name, prefer_bw, extensions):
 	if name is None:
 		# Special case, so code can pass menuitem.icon directly
 		return None, False
-	if paths is None:
-		paths = get_default_menuicons_path(), get_menuicons_path()
 	if name.endswith(".bw"):
 		name = name[0:-3]
 	for extension in extensions:
-		gray_filename = "%s.bw.%s" % (name, extension)
-		colors_filename = "%s.%s" % (name, extension)
-		gray, colors = None, None
-		for p in paths:
-			# Check grayscale
-			if gray is None:
-				path = os.path.join(p, gray_filename)
-				if os.path.exists(path):
-					if prefer_bw:
-						return path, False
-					gray = path
-			# Check colors
-			if colors is None:
-				path = os.path.join(p, colors_filename)
-				if os.path.exists(path):
-					if not prefer_bw:
-						return path, True
-					colors = path
+		gray = index.find("%s.bw.%s" % (name, extension))
+		if gray is not None and prefer_bw:
+			return gray, False
+		colors = index.find("%s.%s" % (name, extension))
 		if colors is not None:
 			return colors, True
 		if gray is not None:
@@ -257,8 +272,7 @@ def find_icon(name, prefer_bw=False, paths=None, extensions=("png", "svg")):
 
 def find_button_image(name, prefer_bw=False):
 	""" Similar to find_icon, but searches for button image """
-	return find_icon(nameof(name), prefer_bw,
-			paths=[get_button_images_path()], extensions=("svg",))
+	return _find_icon(get_directory_index("button-images"), nameof(name), prefer_bw, ("svg",))
 
 
 def menu_is_default(name):
@@ -277,11 +291,7 @@ def find_menu(name):
 
 	Returns None if menu cannot be found.
 	"""
-	for p in (get_menus_path(), get_default_menus_path()):
-		path = os.path.join(p, name)
-		if os.path.exists(path):
-			return path
-	return None
+	return get_directory_index("menus").find(name)
 
 
 def find_controller_icon(name):
@@ -292,11 +302,7 @@ def find_controller_icon(name):
 
 	Returns None if icon cannot be found.
 	"""
-	for p in (get_controller_icons_path(), get_default_controller_icons_path()):
-		path = os.path.join(p, name)
-		if os.path.exists(path):
-			return path
-	return None
+	return get_directory_index("controller-icons").find(name)
 
 
 def find_binary(name):
@@ -370,6 +376,60 @@ def find_gksudo() -> list[str] | None:
 	return None
 
 
+def write_atomic(filename: str, data: bytes) -> None:
+	"""
+	Writes data to file so no other thread or process can ever read it
+	partially written. Data goes to uniquely named temporary file in same
+	directory first, which then replaces 'filename'. Missing directories are
+	created. Raises OSError on failure.
+	"""
+	path = os.path.dirname(filename)
+	os.makedirs(path, exist_ok=True)
+	fd, tmp = tempfile.mkstemp(dir=path, prefix=os.path.basename(filename) + ".", suffix=".tmp")
+	try:
+		with os.fdopen(fd, "wb") as f:
+			f.write(data)
+		os.replace(tmp, filename)
+	except BaseException:
+		try:
+			os.unlink(tmp)
+		except OSError:
+			pass
+		raise
+
+
+def load_cache(filename: str, version: int):
+	"""
+	Returns data stored by store_cache, or None if file is missing, broken
+	or was stored with different 'version' or by different daemon version.
+	"""
+	try:
+		with open(filename, "rb") as f:
+			stored_version, daemon_version, data = pickle.load(f)
+	except FileNotFoundError:
+		return None
+	except Exception as e:
+		log.debug("Failed to read cache '%s': %s", filename, e)
+		return None
+	if (stored_version, daemon_version) != (version, DAEMON_VERSION):
+		return None
+	return data
+
+
+def store_cache(filename: str, version: int, data) -> bool:
+	"""
+	Pickles 'data' into cache file, along with 'version' and daemon version.
+	Returns False if data cannot be stored. Failure is only logged.
+	"""
+	try:
+		write_atomic(filename, pickle.dumps((version, DAEMON_VERSION, data),
+			pickle.HIGHEST_PROTOCOL))
+		return True
+	except Exception as e:
+		log.debug("Failed to store cache '%s': %s", filename, e)
+		return False
+
+
 def check_access(filename, write_required=True) -> bool:
 	"""Check if user has read and optionally write access to the specified file.
 
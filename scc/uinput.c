@@ -34,7 +34,7 @@
 #include <unistd.h>
 
 #pragma GCC diagnostic ignored "-Wunused-result"
-#define UNPUT_MODULE_VERSION 9
+#define UNPUT_MODULE_VERSION 10
 #define MAX_FF_EVENTS 4
 
 #define INFINITE_RUMBLE		10000		// Not really infinite, but longer than controller can handle
@@ -247,6 +247,17 @@ void uinput_syn(int fd)
 	write(fd, &ev, sizeof(ev));
 }
 
+/**
+ * Writes 'count' events, prepared by caller, with single write() call.
+ * Returns number of bytes written or -1 on error.
+ */
+int uinput_write_events(int fd, struct input_event* events, int count)
+{
+	if (count <= 0)
+		return 0;
+	return write(fd, events, sizeof(struct input_event) * count);
+}
+
 // #define RUMBLE_DEBUG(...) do { printf(__VA_ARGS__); } while (0)
 #define RUMBLE_DEBUG(...) do { } while (0)
 
@@ -23,7 +23,8 @@ from __future__ import annotations
 
 import ctypes
 import os
-from ctypes import POINTER, byref, c_bool, c_int16, c_int32, c_uint16
+import struct
+from ctypes import POINTER, c_bool, c_char, c_char_p, c_int, c_int16, c_int32, c_uint16
 from enum import IntEnum
 from math import copysign, fmod, sqrt
 
@@ -32,7 +33,7 @@ from usb1.libusb1 import timeval
 from scc.cheader import defines
 from scc.tools import find_library
 
-UNPUT_MODULE_VERSION = 9
+UNPUT_MODULE_VERSION = 10
 
 # Get All defines from linux headers
 if os.path.exists("/usr/include/linux/input-event-codes.h"):
@@ -43,6 +44,13 @@ else:
 	CHEAD = defines("/usr/include", "linux/input.h")
 
 MAX_FEEDBACK_EFFECTS = 4
+# Number of events buffered for single device before they are written
+# even without SYN_REPORT
+EVENT_BUFFER_SIZE = 64
+
+EV_SYN, EV_KEY, EV_REL, EV_ABS, EV_MSC = (CHEAD[x] for x in
+	("EV_SYN", "EV_KEY", "EV_REL", "EV_ABS", "EV_MSC"))
+SYN_REPORT, MSC_SCAN = CHEAD["SYN_REPORT"], CHEAD["MSC_SCAN"]
 
 class Keys(IntEnum):
 	"""Keys enum contains all keys and button from linux/uinput.h (KEY_* BTN_*)."""
@@ -198,6 +206,21 @@ class InputEvent(ctypes.Structure):
 		('value', c_int32)
 	]
 
+# Packs type, code and value of input_event. Timestamp is left zeroed,
+# kernel fills it in when event is written to uinput device.
+_EVENT = struct.Struct("=HHi")
+_EVENT_OFFSET = InputEvent.type.offset
+_EVENT_SIZE = ctypes.sizeof(InputEvent)
+_EVENTS = {}		# number of events -> Struct packing that many whole InputEvents
+
+
+def _get_events_struct(count: int) -> struct.Struct:
+	if count not in _EVENTS:
+		_EVENTS[count] = struct.Struct("=" + "%ixHHi%ix" % (
+			_EVENT_OFFSET, _EVENT_SIZE - _EVENT_OFFSET - _EVENT.size) * count)
+	return _EVENTS[count]
+
+
 class FeedbackEvent(ctypes.Structure):
 	_fields_ = [
 		('in_use', c_bool),
@@ -213,6 +236,48 @@ class FeedbackEvent(ctypes.Structure):
 		self.in_use = False
 
 
+_lib = None
+
+def _load_library() -> ctypes.CDLL:
+	"""Loads libuinput and declares prototypes of its functions.
+
+	Library is loaded only once and shared by all devices, so ctypes doesn't
+	have to guess argument types on every call. Version is checked before
+	anything else, as library built from older source may be missing some
+	of functions.
+	"""
+	global _lib
+	if _lib is None:
+		lib = find_library("libuinput")
+		try:
+			lib.uinput_module_version.argtypes = []
+			lib.uinput_module_version.restype = c_int
+			if lib.uinput_module_version() != UNPUT_MODULE_VERSION:
+				raise Exception()
+		except:
+			import sys
+			print("Invalid native module version. Please, recompile 'libuinput.so'", file=sys.stderr)
+			print("If you are running sc-controller from source, you can do this by removing 'build' directory", file=sys.stderr)
+			print("and runinng 'python setup.py build' or 'run.sh' script", file=sys.stderr)
+			raise Exception("Invalid native module version")
+		lib.uinput_init.argtypes = [
+			c_int, POINTER(c_uint16),
+			c_int, POINTER(c_uint16), POINTER(c_int32), POINTER(c_int32), POINTER(c_int32), POINTER(c_int32),
+			c_int, POINTER(c_uint16),
+			c_int, c_uint16, c_uint16, c_uint16, c_int, c_char_p ]
+		lib.uinput_init.restype = c_int
+		lib.uinput_write_events.argtypes = [ c_int, POINTER(c_char), c_int ]
+		lib.uinput_write_events.restype = c_int
+		lib.uinput_set_delay_period.argtypes = [ c_int, c_int32, c_int32 ]
+		lib.uinput_set_delay_period.restype = None
+		lib.uinput_ff_read.argtypes = [ c_int, c_int, POINTER(POINTER(FeedbackEvent)) ]
+		lib.uinput_ff_read.restype = c_int
+		lib.uinput_destroy.argtypes = [ c_int ]
+		lib.uinput_destroy.restype = None
+		_lib = lib
+	return _lib
+
+
 class UInput:
 	"""UInput class permits to create a uinput device.
 
@@ -230,23 +295,14 @@ class UInput:
 
 		self._r = rels
 
-		self._lib = find_library("libuinput")
+		self._init_buffer()
+		self._lib = _load_library()
 		self._ff_events = None
 		if rumble:
 			self._ff_events = (POINTER(FeedbackEvent) * MAX_FEEDBACK_EFFECTS)()
 			for i in range(MAX_FEEDBACK_EFFECTS):
 				self._ff_events[i].contents = FeedbackEvent()
 
-		try:
-			if self._lib.uinput_module_version() != UNPUT_MODULE_VERSION:
-				raise Exception()
-		except:
-			import sys
-			print("Invalid native module version. Please, recompile 'libuinput.so'", file=sys.stderr)
-			print("If you are running sc-controller from source, you can do this by removing 'build' directory", file=sys.stderr)
-			print("and runinng 'python setup.py build' or 'run.sh' script", file=sys.stderr)
-			raise Exception("Invalid native module version")
-
 		c_k		= (ctypes.c_uint16 * len(self._k))(*self._k)
 		c_a		= (ctypes.c_uint16 * len(self._a))(*self._a)
 		c_amin	 = (ctypes.c_int32  * len(self._amin ))(*self._amin )
@@ -254,54 +310,88 @@ class UInput:
 		c_afuzz	= (ctypes.c_int32  * len(self._afuzz))(*self._afuzz)
 		c_aflat	= (ctypes.c_int32  * len(self._aflat))(*self._aflat)
 		c_r		= (ctypes.c_uint16 * len(self._r))(*self._r)
-		c_vendor   = ctypes.c_uint16(vendor)
-		c_product  = ctypes.c_uint16(product)
-		c_version  = ctypes.c_uint16(version)
-		c_keyboard = ctypes.c_int(keyboard)
-		c_rumble = ctypes.c_int(MAX_FEEDBACK_EFFECTS if rumble else 0)
-		c_name = ctypes.c_char_p(name.encode("utf-8") if type(name) is str else name)
+		c_name = name.encode("utf-8") if type(name) is str else name
 
 		self._fd = self._lib.uinput_init(
-			ctypes.c_int(len(self._k)),
+			len(self._k),
 			c_k,
-			ctypes.c_int(len(self._a)),
+			len(self._a),
 			c_a,
 			c_amin,
 			c_amax,
 			c_afuzz,
 			c_aflat,
-			ctypes.c_int(len(self._r)),
+			len(self._r),
 			c_r,
-			c_keyboard,
-			c_vendor,
-			c_product,
-			c_version,
-			c_rumble,
+			int(keyboard),
+			vendor,
+			product,
+			version,
+			MAX_FEEDBACK_EFFECTS if rumble else 0,
 			c_name)
 		if self._fd < 0:
 			raise CannotCreateUInputException("Failed to create uinput device. Error code: %s" % (self._fd,))
 
 
+	@classmethod
+	def from_fd(cls, fd: int) -> UInput:
+		"""Creates instance that writes events to already opened 'fd',
+		without creating uinput device. Closing 'fd' is up to caller.
+
+		Used by tests and benchmarks.
+		"""
+		dev = cls.__new__(cls)
+		dev._lib = None
+		dev._k, dev._a, dev._r = (), (), ()
+		dev.name = None
+		dev._init_buffer()
+		dev._ff_events = None
+		dev._fd = fd
+		return dev
+
+
+	def _init_buffer(self):
+		"""Allocates buffer where events are collected, to be written
+		all at once by synEvent.
+		"""
+		self._buffer = bytearray(_EVENT_SIZE * EVENT_BUFFER_SIZE)
+		self._c_buffer = (ctypes.c_char * len(self._buffer)).from_buffer(self._buffer)
+		self._queued = 0
+		self._abs_values = {}
+		self._write_events = _load_library().uinput_write_events
+
+
 	def getDescriptor(self):
 		return self._fd
 
 
+	def _queue(self, type: int, code: int, val: int):
+		"""Appends event to buffer, writting buffer out if it's full."""
+		if self._queued >= EVENT_BUFFER_SIZE:
+			self.flush()
+		_EVENT.pack_into(self._buffer, self._queued * _EVENT_SIZE + _EVENT_OFFSET, type, code, val)
+		self._queued += 1
+
+
 	def keyEvent(self, key: int, val: int):
 		"""Generate a key or btn event.
 
 		@param int axis		 key or btn event (KEY_* or BTN_*)
 		@param int val		  event value
 		"""
-		self._lib.uinput_key(self._fd, ctypes.c_uint16(key), ctypes.c_int32(val))
+		self._queue(EV_KEY, key, val)
 
 
 	def axisEvent(self, axis: int, val: int):
 		"""Generate a abs event (joystick/pad axes).
+		Nothing is generated if axis already has same value.
 
 		@param int axis		 abs event (ABS_*)
 		@param int val		  event value
 		"""
-		self._lib.uinput_abs(self._fd, ctypes.c_uint16(axis), ctypes.c_int32(val))
+		if self._abs_values.get(axis) != val:
+			self._abs_values[axis] = val
+			self._queue(EV_ABS, axis, val)
 
 	def relEvent(self, rel: int, val: int):
 		"""Generate a rel event (move move).
@@ -309,18 +399,53 @@ class UInput:
 		@param int rel		  rel event (REL_*)
 		@param int val		  event value
 		"""
-		self._lib.uinput_rel(self._fd, ctypes.c_uint16(rel), ctypes.c_int32(val))
+		self._queue(EV_REL, rel, val)
 
 	def scanEvent(self, val: int):
 		"""Generate a scan event (MSC_SCAN).
 
 		@param int val		  scan event value (scancode)
 		"""
-		self._lib.uinput_scan(self._fd, ctypes.c_int32(val))
+		self._queue(EV_MSC, MSC_SCAN, val)
 
 	def synEvent(self):
-		"""Generate a syn event."""
-		self._lib.uinput_syn(self._fd)
+		"""Generate a syn event and write all buffered events to device
+		with single write() call.
+
+		Does nothing if there was no event generated since last syn.
+		"""
+		if self._queued:
+			self._queue(EV_SYN, SYN_REPORT, 0)
+			self.flush()
+
+	def emit(self, events):
+		"""Generate multiple events at once.
+
+		'events' is array('i') or memoryview of integers, where every three
+		consecutive items are type, code and value of one event. Events are
+		copied into buffer with single pack_into call, in same way as ones
+		generated by keyEvent & co. and are written by next synEvent.
+		Unlike axisEvent, ABS events are not deduplicated. If there is any,
+		axisEvent then sends next value of every axis, even if unchanged.
+		"""
+		count = len(events) // 3
+		start = 0
+		while start < count:
+			if self._queued >= EVENT_BUFFER_SIZE:
+				self.flush()
+			n = min(count - start, EVENT_BUFFER_SIZE - self._queued)
+			_get_events_struct(n).pack_into(self._buffer, self._queued * _EVENT_SIZE,
+				*events[start * 3:(start + n) * 3])
+			self._queued += n
+			start += n
+		if EV_ABS in events[0::3]:
+			self._abs_values.clear()
+
+	def flush(self):
+		"""Write buffered events to device without adding syn event."""
+		if self._queued:
+			self._write_events(self._fd, self._c_buffer, self._queued)
+			self._queued = 0
 
 
 	def setDelayPeriod(self, delay: int, period: int):
@@ -329,7 +454,7 @@ class UInput:
 		@param int delay		delay in ms
 		@param int period	   period is ms
 		"""
-		self._lib.uinput_set_delay_period(self._fd, ctypes.c_int32(delay), ctypes.c_int32(period))
+		self._lib.uinput_set_delay_period(self._fd, delay, period)
 
 	def keyManaged(self, ev):
 		return ev in self._k
@@ -343,7 +468,7 @@ class UInput:
 	def ff_read(self):
 		"""Return effect that should be played or None if there were no such request."""
 		if self._ff_events:
-			id = self._lib.uinput_ff_read(self._fd, MAX_FEEDBACK_EFFECTS, byref(self._ff_events))
+			id = self._lib.uinput_ff_read(self._fd, MAX_FEEDBACK_EFFECTS, self._ff_events)
 			if id >= 0:
 				return self._ff_events[id].contents
 		return None
@@ -707,6 +832,8 @@ class Dummy:
 	relEvent = keyEvent
 	scanEvent = keyEvent
 	synEvent = keyEvent
+	flush = keyEvent
+	emit = keyEvent
 	setDelayPeriod = keyEvent
 	updateParams = keyEvent
 	updateScrollParams = keyEvent
@@ -14,11 +14,17 @@ from scc.actions import Action
 from scc.mapper import Mapper
 from scc.config import Config
 
-import os, sys, re, time, socket, traceback, threading, logging
+from ctypes import byref
+import os, sys, re, time, socket, select, traceback, threading, logging
 log = logging.getLogger("AutoSwitcher")
 
 class AutoSwitcher:
-	INTERVAL = 1
+	"""
+	Waits for PropertyNotify events from X server. Root window reports when
+	active window is changed and active window reports when its title is.
+	Daemon connection, handled by separate thread, wakes main loop up
+	through pipe when it learns something that may change result of check().
+	"""
 
 	def __init__(self):
 		self.dpy = X.open_display(os.environ["DISPLAY"].encode("utf-8"))
@@ -33,7 +39,12 @@ class AutoSwitcher:
 		self.exit_code = None
 		self.current_profile = None
 		self.current_window = None
+		self.current_actions = None
 		self.conds = AutoSwitcher.parse_conditions(self.config)
+		self.index = ConditionIndex(self.conds)
+		self._wakeup_r, self._wakeup_w = os.pipe()
+		self._event = X.XEvent()
+		self._atoms = {}
 
 
 	@staticmethod
@@ -109,24 +120,49 @@ class AutoSwitcher:
 					profile = line.split(":", 1)[-1].strip()
 					log.debug("Daemon reported profile change: %s", profile)
 					self.current_profile = profile
+					self.wake_up()
 				elif line.startswith("Reconfigured."):
 					log.debug("Reloading config...")
 					self.config = Config()
 					self.conds = AutoSwitcher.parse_conditions(self.config)
+					self.index = ConditionIndex(self.conds)
 				elif line.startswith("Controller Count:"):
 					self.enabled = int(line.split(":")[-1]) > 0
 					log.debug("Enabled: %s", self.enabled)
+					self.wake_up()
 
 			self.lock.release()
 
 
+	def wake_up(self):
+		""" Interrupts waiting for X event, so check() is called again """
+		os.write(self._wakeup_w, b"w")
+
+
+	def watch_window(self, w):
+		""" Starts receiving property changes of window 'w' instead of current one """
+		root = X.get_default_root_window(self.dpy)
+		if self.current_window and self.current_window != root:
+			X.select_input(self.dpy, self.current_window, X.NOEVENTMASK)
+		if w and w != root:
+			X.select_input(self.dpy, w, X.PROPERTYCHANGEMASK)
+
+
 	def check(self, *a):
+		"""
+		Executes actions of matching conditions when active window is
+		switched. When title of active window changes, actions are executed
+		only if different conditions are matching.
+		"""
 		w = X.get_current_window(self.dpy)
-		if w == self.current_window or not self.current_profile:
-			# Window not switched or profile is not known yet
+		if not self.current_profile:
+			# Profile is not known yet
 			return
-		self.current_window = w
-		log.debug("Window switched: %s", w)
+		if w != self.current_window:
+			self.watch_window(w)
+			self.current_window = w
+			self.current_actions = None
+			log.debug("Window switched: %s", w)
 		pars = X.get_window_title(self.dpy, w), X.get_window_class(self.dpy, w)
 
 		if pars[0] is None:
@@ -135,11 +171,38 @@ class AutoSwitcher:
 		if pars[1] is None:
 			pars = (pars[0], ("",""))
 
-		for c in self.conds:
-			if c.matches(*pars):
-				action = self.conds[c]
-				action.button_press(self.mapper)
-				action.button_release(self.mapper)
+		actions = self.index.get_actions(*pars)
+		if actions == self.current_actions:
+			return
+		self.current_actions = actions
+		for action in actions:
+			action.button_press(self.mapper)
+			action.button_release(self.mapper)
+
+
+	def wait(self):
+		"""
+		Blocks until active window or its title is changed or until
+		woken up by wake_up().
+		"""
+		root = X.get_default_root_window(self.dpy)
+		fd = X.connection_number(self.dpy)
+		while True:
+			changed = False
+			while X.pending(self.dpy):
+				X.next_event(self.dpy, byref(self._event))
+				if self._event.type == X.PROPERTYNOTIFY:
+					e = self._event.xproperty
+					if e.window == root:
+						changed |= e.atom == self._atoms["_NET_ACTIVE_WINDOW"]
+					elif e.window == self.current_window:
+						changed |= e.atom in (self._atoms["_NET_WM_NAME"], self._atoms["WM_NAME"])
+			if changed:
+				return
+			r, trash, trash = select.select([ fd, self._wakeup_r ], [], [])
+			if self._wakeup_r in r:
+				os.read(self._wakeup_r, 1024)
+				return
 
 
 	def on_sa_profile(self, mapper, action):
@@ -187,12 +250,17 @@ class AutoSwitcher:
 
 
 	def run(self):
+		# Active window may be destroyed before its title is read
+		X.ignore_errors()
+		for name in ("_NET_ACTIVE_WINDOW", "_NET_WM_NAME", "WM_NAME"):
+			self._atoms[name] = X.intern_atom(self.dpy, name.encode("utf-8"), False)
+		X.select_input(self.dpy, X.get_default_root_window(self.dpy), X.PROPERTYCHANGEMASK)
 		self.thread.start()
 		log.debug("AutoSwitcher started")
 		while self.exit_code is None:
 			if self.enabled:
 				self.check()
-			time.sleep(self.INTERVAL)
+			self.wait()
 		return 1
 
 
@@ -298,6 +366,80 @@ class Condition:
 		return True
 
 
+class ConditionIndex:
+	"""
+	Conditions indexed by what they match, so only conditions that may match
+	are tested when window is switched.
+
+	Conditions with exact title are found by title, conditions with window
+	class by class. Rest of them is tested only if regular expression combined
+	from all of them matches title. Conditions with regexp that cannot be
+	combined (because of groups or flags) are tested always.
+	"""
+
+	def __init__(self, conds):
+		self._conds = list(conds.items())		# (condition, action) pairs
+		self._by_title = {}
+		self._by_class = {}
+		self._by_regexp = []
+		self._always = []
+		patterns = []
+		for i, (c, action) in enumerate(self._conds):
+			if c.empty:
+				# Matches nothing
+				continue
+			if c.exact_title:
+				self._by_title.setdefault(c.exact_title, []).append(i)
+			elif c.wm_class:
+				self._by_class.setdefault(c.wm_class, []).append(i)
+			else:
+				pattern = ConditionIndex._get_pattern(c)
+				if pattern is None:
+					self._always.append(i)
+				else:
+					patterns.append(pattern)
+					self._by_regexp.append(i)
+
+		self._regexp = None
+		if patterns:
+			try:
+				self._regexp = re.compile("|".join(patterns))
+			except re.error:
+				self._always = sorted(self._always + self._by_regexp)
+				self._by_regexp = []
+
+
+	@staticmethod
+	def _get_pattern(c):
+		"""
+		Returns regular expression matching same titles as condition, to be
+		used as part of combined one. Returns None if there is no such.
+		"""
+		if c.regexp:
+			if c.regexp.groups or c.regexp.flags & ~re.UNICODE:
+				return None
+			return "(?:%s)" % (c.regexp.pattern,)
+		return "(?s:.*?)%s" % (re.escape(c.title),)
+
+
+	def get_actions(self, window_title, wm_class):
+		"""
+		Returns list of actions of all conditions matching provided window
+		properties, in order in which conditions were defined.
+		"""
+		indexes = self._by_title.get(window_title, []) + self._always
+		for cls in set(wm_class):
+			indexes += self._by_class.get(cls, [])
+		if self._regexp is not None and self._regexp.match(window_title):
+			indexes += self._by_regexp
+		rv = []
+		for i in sorted(indexes):
+			c, action = self._conds[i]
+			if c.matches(window_title, wm_class):
+				rv.append(action)
+		return rv
+
+
 class AutoswitchOptsMenuGenerator(MenuGenerator):
 	""" Generates entire Autoswich Options submenu """
 	GENERATOR_NAME = "autoswitch"
@@ -34,14 +34,84 @@ from scc.osd.area import Area
 from scc.special_actions import OSDAction
 from scc.tools import shsplit
 from scc.config import Config
+from scc.paths import DirectoryIndex
 
 
 log = logging.getLogger("osd.daemon")
 
+
+class WindowPool:
+	"""
+	Keeps one spare, already constructed but not yet displayed window of
+	every OSD type. Creating window with all its widgets (and rendering
+	background of radial menu) is most of what it takes to display OSD, so
+	it's done in advance, while nothing is displayed.
+
+	Window taken from pool is not returned back; it's destroyed when closed
+	as before, because every OSD class keeps state of single invocation
+	(parsed arguments, packed items, connected signals). Replacement is
+	created later by fill().
+	"""
+
+	def __init__(self, factories, is_busy):
+		self._factories = factories		# class -> callable creating window
+		self._is_busy = is_busy			# returns True while OSD is displayed
+		self._spares = {}
+		self._idle = None
+
+
+	def get(self, cls):
+		"""
+		Returns spare window of given class or creates new one.
+		Second value returned is True if window was taken from pool.
+		"""
+		window = self._spares.pop(cls, None)
+		if window is None:
+			return self._factories[cls](), False
+		return window, True
+
+
+	def fill(self):
+		"""
+		Schedules creating of missing spare windows. Windows are created one
+		at time when mainloop is idle, so events are not delayed for long.
+		Nothing is created while other OSD is displayed; fill() has to be
+		called again after it's closed.
+		"""
+		if self._idle is None:
+			self._idle = GLib.idle_add(self._create_spare, priority=GLib.PRIORITY_LOW)
+
+
+	def _create_spare(self):
+		if self._is_busy():
+			self._idle = None
+			return False
+		for cls in self._factories:
+			if cls not in self._spares:
+				try:
+					self._spares[cls] = self._factories[cls]()
+				except Exception:
+					log.error(traceback.format_exc())
+					log.error("Failed to create spare %s", cls.__name__)
+					continue
+				return True
+		self._idle = None
+		return False
+
+
+	def clear(self):
+		""" Destroys all spare windows and schedules creating new ones """
+		for window in self._spares.values():
+			window.destroy()
+		self._spares = {}
+		self.fill()
+
+
 class OSDDaemon:
 	def __init__(self):
 		self.exit_code = -1
 		self.mainloop = GLib.MainLoop()
+		DirectoryIndex.attach_glib()
 		self.config = None
 		# hash_of_colors is used to determine if css needs to be reapplied
 		# after configuration change
@@ -51,6 +121,17 @@ class OSDDaemon:
 		self._registered = False
 		self._last_profile_change = 0
 		self._recent_profiles_undo = None
+		self.pool = WindowPool({
+			Menu:				Menu,
+			HorizontalMenu:		HorizontalMenu,
+			RadialMenu:			RadialMenu,
+			QuickMenu:			QuickMenu,
+			GridMenu:			GridMenu,
+			Dialog:				Dialog,
+			Area:				Area,
+			Keyboard:			lambda: Keyboard(self.config),
+			GestureDisplay:		lambda: GestureDisplay(self.config),
+		}, lambda: self._window is not None)
 
 
 	def quit(self, code=-1):
@@ -66,6 +147,8 @@ class OSDDaemon:
 		log.debug("Reloading config...")
 		self.config.reload()
 		self._check_colorconfig_change()
+		# Spare windows were created with old configuration
+		self.pool.clear()
 
 
 	def on_profile_changed(self, daemon, profile):
@@ -117,6 +200,7 @@ class OSDDaemon:
 	def on_menu_closed(self, m):
 		""" Called after OSD menu is hidden from screen """
 		self._window = None
+		self.pool.fill()
 		if m.get_exit_code() == 0:
 			# 0 means that user selected item and confirmed selection
 			self.daemon.request(
@@ -136,11 +220,13 @@ class OSDDaemon:
 	def on_keyboard_closed(self, *a):
 		""" Called after on-screen keyboard is hidden from the screen """
 		self._window = None
+		self.pool.fill()
 
 
 	def on_gesture_recognized(self, gd):
 		""" Called after on-screen keyboard is hidden from the screen """
 		self._window = None
+		self.pool.fill()
 		if gd.get_exit_code() == 0:
 			self.daemon.request('Gestured: %s' % ( gd.get_gesture(), ),
 				lambda *a : False, lambda *a : False)
@@ -148,27 +234,58 @@ class OSDDaemon:
 			self.daemon.request('Gestured: x', lambda *a : False, lambda *a : False)
 
 
+	# Maps message prefix to menu class. Order matters, "OSD: menu" would
+	# match "OSD: menu..." messages of other types otherwise
+	MENU_MESSAGES = (
+		("OSD: hmenu",		HorizontalMenu),
+		("OSD: radialmenu",	RadialMenu),
+		("OSD: quickmenu",	QuickMenu),
+		("OSD: gridmenu",	GridMenu),
+		("OSD: dialog",		Dialog),
+		("OSD: menu",		Menu),
+	)
+
 	@staticmethod
 	def _is_menu_message(m):
 		"""
 		Returns True if m starts with 'OSD: [grid|radial]menu'
 		or "OSD: dialog"
 		"""
-		return (
-			m.startswith("OSD: menu")
-			or m.startswith("OSD: radialmenu")
-			or m.startswith("OSD: quickmenu")
-			or m.startswith("OSD: gridmenu")
-			or m.startswith("OSD: dialog")
-			or m.startswith("OSD: hmenu")
-		)
+		return OSDDaemon._get_menu_class(m) is not None
+
+
+	@staticmethod
+	def _get_menu_class(m):
+		""" Returns menu class for message or None if m is not menu message """
+		for prefix, cls in OSDDaemon.MENU_MESSAGES:
+			if m.startswith(prefix):
+				return cls
+		return None
+
+
+	def _measure_first_frame(self, window, requested, from_pool):
+		"""
+		Logs time between receiving request and drawing first frame
+		of displayed window.
+		"""
+		def on_draw(*a):
+			window.disconnect(handler)
+			log.debug("%s displayed %.1fms after request%s",
+				window.__class__.__name__, (time.perf_counter() - requested) * 1000.0,
+				" (from pool)" if from_pool else "")
+		handler = window.connect_after('draw', on_draw)
 
 
 	def on_unknown_message(self, daemon, message):
 		if not message.startswith("OSD:"):
 			return
-		if message.startswith("OSD: message"):
+		requested = time.perf_counter()
+		try:
 			args = shsplit(message)[1:]
+		except ValueError:
+			log.warning("Failed to parse command from daemon: '%s'", message)
+			return
+		if message.startswith("OSD: message"):
 			m = Message()
 			m.parse_argumets(args)
 			hsh = m.hash()
@@ -192,8 +309,8 @@ class OSDDaemon:
 			if self._window:
 				log.warning("Another OSD is already visible - refusing to show keyboard")
 			else:
-				args = shsplit(message)[1:]
-				self._window = Keyboard(self.config)
+				self._window, from_pool = self.pool.get(Keyboard)
+				self._measure_first_frame(self._window, requested, from_pool)
 				self._window.connect('destroy', self.on_keyboard_closed)
 				self._window.parse_argumets(args)
 				self._window.show()
@@ -202,29 +319,19 @@ class OSDDaemon:
 			if self._window:
 				log.warning("Another OSD is already visible - refusing to show keyboard")
 			else:
-				args = shsplit(message)[1:]
-				self._window = GestureDisplay(self.config)
+				self._window, from_pool = self.pool.get(GestureDisplay)
+				self._measure_first_frame(self._window, requested, from_pool)
+				self._window.use_config(self.config)
 				self._window.parse_argumets(args)
 				self._window.use_daemon(self.daemon)
 				self._window.show()
 				self._window.connect('destroy', self.on_gesture_recognized)
 		elif self._is_menu_message(message):
-			args = shsplit(message)[1:]
 			if self._window:
 				log.warning("Another OSD is already visible - refusing to show menu")
 			else:
-				if message.startswith("OSD: hmenu"):
-					self._window = HorizontalMenu()
-				elif message.startswith("OSD: radialmenu"):
-					self._window = RadialMenu()
-				elif message.startswith("OSD: quickmenu"):
-					self._window = QuickMenu()
-				elif message.startswith("OSD: gridmenu"):
-					self._window = GridMenu()
-				elif message.startswith("OSD: dialog"):
-					self._window = Dialog()
-				else:
-					self._window = Menu()
+				self._window, from_pool = self.pool.get(self._get_menu_class(message))
+				self._measure_first_frame(self._window, requested, from_pool)
 				self._window.connect('destroy', self.on_menu_closed)
 				self._window.use_config(self.config)
 				try:
@@ -239,12 +346,11 @@ class OSDDaemon:
 					log.error("Failed to show menu")
 					self._window = None
 		elif message.startswith("OSD: area"):
-			args = shsplit(message)[1:]
 			if self._window:
 				log.warning("Another OSD is already visible - refusing to show area")
 			else:
-				args = shsplit(message)[1:]
-				self._window = Area()
+				self._window, from_pool = self.pool.get(Area)
+				self._measure_first_frame(self._window, requested, from_pool)
 				self._window.connect('destroy', self.on_keyboard_closed)
 				if self._window.parse_argumets(args):
 					self._window.show()
@@ -291,7 +397,6 @@ class OSDDaemon:
 			if self._window and isinstance(self._window, Keyboard):
 				self._window.recolor()
 				self._window.update_labels()
-				self._window.redraw_background()
 
 
 	def run(self):
@@ -303,6 +408,7 @@ class OSDDaemon:
 		self.daemon.connect('profile-changed', self.on_profile_changed)
 		self.daemon.connect('reconfigured', self.on_daemon_reconfigured)
 		self.daemon.connect('unknown-msg', self.on_unknown_message)
+		self.pool.fill()
 		self.mainloop.run()
 
 
@@ -0,0 +1,46 @@
+from scc.special_actions import ChangeProfileAction
+from scc.x11.autoswitcher import Condition, ConditionIndex
+
+CONDITIONS = [
+	Condition(wm_class="Steam"),
+	Condition(title="Mozilla"),
+	Condition(exact_title="Terminal", wm_class="xterm"),
+	Condition(regexp="^.*Chromium$"),
+	Condition(regexp=r"(a+)\1"),
+	Condition(regexp="(?i)doom"),
+	Condition(title="Doom", wm_class="gzdoom"),
+	Condition(title="Mozilla"),
+	Condition(exact_title="Only title"),
+	Condition(),
+]
+
+WINDOWS = [
+	("", ("", "")),
+	("Terminal", ("xterm", "XTerm")),
+	("Terminal", ("urxvt", "URxvt")),
+	("Steam", ("Steam", "Steam")),
+	("Web - Mozilla Firefox", ("Navigator", "Firefox")),
+	("New Tab - Chromium", ("chromium", "Chromium")),
+	("Chromium - New Tab", ("chromium", "Chromium")),
+	("aa", ("", "")),
+	("ab", ("", "")),
+	("DOOM", ("gzdoom", "gzdoom")),
+	("Doom", ("gzdoom", "gzdoom")),
+	("Only title", ("", "")),
+	("Line\nwith Mozilla", ("", "")),
+]
+
+
+class TestConditionIndex:
+
+	def test_get_actions(self):
+		"""
+		Tests that index returns same actions, in same order, as testing
+		every condition would.
+		"""
+		conds = { c : ChangeProfileAction("profile%s" % (i,)) for i, c in enumerate(CONDITIONS) }
+		index = ConditionIndex(conds)
+		for title, wm_class in WINDOWS:
+			expected = [ conds[c] for c in conds if c.matches(title, wm_class) ]
+			assert index.get_actions(title, wm_class) == expected, title
+		assert len(index.get_actions("Steam - Mozilla", ("Steam", "Steam"))) == 3
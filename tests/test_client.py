@@ -0,0 +1,88 @@
+import socket
+
+from scc.poller import Poller
+from scc.sccdaemon import Client
+
+
+class TestClient:
+	"""
+	Tests queuing of messages sent to clients connected to daemon
+	"""
+
+	def setup_method(self):
+		self.poller = Poller()
+		self.lost = []
+		a, self.remote = socket.socketpair()
+		a.setblocking(False)
+		self.remote.settimeout(1.0)
+		self.client = Client(a, None, self.poller, self.callback)
+
+
+	def teardown_method(self):
+		self.poller.unregister(self.client.fileno)
+		self.client.destroy()
+		self.remote.close()
+
+
+	def callback(self, fd, event):
+		if event == Poller.POLLOUT:
+			self.client.flush()
+		elif self.client.receive() is None:
+			self.lost.append(fd)
+
+
+	def read(self):
+		self.poller.poll(0)
+		return self.remote.recv(1 << 20)
+
+
+	def test_send_is_queued(self):
+		""" Tests that nothing is written until socket is reported writable """
+		self.client.send(b"A\n")
+		self.client.send(b"B\n")
+		self.remote.setblocking(False)
+		try:
+			assert self.remote.recv(100) == b""
+		except BlockingIOError:
+			pass
+		self.remote.setblocking(True)
+		assert self.read() == b"A\nB\n"
+
+
+	def test_coalescing(self):
+		""" Tests that only newest message with same key is sent, in order """
+		self.client.send(b"Event: sc0 LEFT 1 1\n", "LEFT")
+		self.client.send(b"Event: sc0 A 1\n")
+		self.client.send(b"Event: sc0 LEFT 2 2\n", "LEFT")
+		self.client.send(b"Event: sc0 RIGHT 3 3\n", "RIGHT")
+		assert self.read() == (b"Event: sc0 A 1\n"
+			b"Event: sc0 LEFT 2 2\nEvent: sc0 RIGHT 3 3\n")
+		# Once sent, same key is queued again
+		self.client.send(b"Event: sc0 LEFT 4 4\n", "LEFT")
+		assert self.read() == b"Event: sc0 LEFT 4 4\n"
+
+
+	def test_overflow(self):
+		""" Tests that client that doesn't read is disconnected """
+		data = b"x" * 1023 + b"\n"
+		# Fills socket buffer first
+		while not (self.client._queued or self.client._out):
+			self.client.send(data)
+			self.poller.poll(0)
+		assert not self.client.closed
+		for i in range(Client.MAX_QUEUED // len(data) + 1):
+			self.client.send(data)
+		assert self.client.closed
+		self.poller.poll(0)
+		assert self.lost == [ self.client.fileno ]
+
+
+	def test_receive(self):
+		""" Tests that received data is split to lines """
+		self.remote.sendall(b"Profile: a\nLock: ")
+		assert self.client.receive() == [ b"Profile: a" ]
+		self.remote.sendall(b"A B\n\n")
+		assert self.client.receive() == [ b"Lock: A B", b"" ]
+		self.remote.close()
+		assert self.client.receive() is None
+		self.remote = socket.socket()
@@ -0,0 +1,81 @@
+import ctypes
+import random
+
+from scc.constants import STICK_PAD_MAX, STICK_PAD_MIN, STICK_PAD_RES, SCButtons
+from scc.drivers.ds5drv import (
+	BT_INPUT_REPORT_SIZE,
+	DualSenseBTControllerInput,
+	decode_bt_input,
+)
+
+FIELDS = [ name for name, type in DualSenseBTControllerInput._fields_ ]
+
+
+def _convert_input_data(data):
+	""" Decodes report as DS5HidRawController did before lookup tables were used """
+	def stick_axis_scale(value, invert):
+		result = value - 128
+		ratio = (result / 127.0) if (value >= 128) else (result / (128.0))
+		if invert:
+			ratio = -ratio
+		return int((ratio + 1.0) * 0.5 * STICK_PAD_RES + STICK_PAD_MIN)
+
+	dpad = {
+		0: (0, STICK_PAD_MAX), 1: (STICK_PAD_MAX, STICK_PAD_MAX),
+		2: (STICK_PAD_MAX, 0), 3: (STICK_PAD_MAX, STICK_PAD_MIN),
+		4: (0, STICK_PAD_MIN), 5: (STICK_PAD_MIN, STICK_PAD_MIN),
+		6: (STICK_PAD_MIN, 0), 7: (STICK_PAD_MIN, STICK_PAD_MAX),
+	}
+	bits = [
+		(9, 7, SCButtons.Y), (9, 6, SCButtons.B), (9, 5, SCButtons.A), (9, 4, SCButtons.X),
+		(10, 7, SCButtons.RPAD), (10, 6, SCButtons.STICKPRESS), (10, 5, SCButtons.START),
+		(10, 4, SCButtons.BACK), (10, 3, SCButtons.RT), (10, 2, SCButtons.LT),
+		(10, 1, SCButtons.RB), (10, 0, SCButtons.LB),
+		(11, 0, SCButtons.C), (11, 1, SCButtons.CPADPRESS),
+	]
+	state = DualSenseBTControllerInput()
+	state.stick_x = stick_axis_scale(data[2], False)
+	state.stick_y = stick_axis_scale(data[3], True)
+	state.rpad_x = stick_axis_scale(data[4], False)
+	state.rpad_y = stick_axis_scale(data[5], True)
+	state.ltrig = data[6]
+	state.rtrig = data[7]
+	for byte, bit, button in bits:
+		if data[byte] & (1 << bit):
+			state.buttons |= button
+	if data[9] & 0x0F != 8:
+		state.buttons |= SCButtons.LPAD | SCButtons.LPADTOUCH
+		state.lpad_x, state.lpad_y = dpad.get(data[9] & 0x0F, (0, 0))
+	state.gpitch = ctypes.c_int16((data[18] << 8) | data[17]).value
+	state.gyaw = ctypes.c_int16((data[20] << 8) | data[19]).value * -1
+	state.groll = ctypes.c_int16((data[22] << 8) | data[21]).value * -1
+	state.accel_x = ctypes.c_int16((data[24] << 8) | data[23]).value * 2
+	state.accel_y = ctypes.c_int16((data[28] << 8) | data[27]).value * -2
+	state.accel_z = ctypes.c_int16((data[26] << 8) | data[25]).value * 2
+	if (data[34] & 0x80) == 0:
+		state.buttons |= SCButtons.CPADTOUCH
+	state.cpad_x = ((data[36] & 0x0F) << 8) | data[35]
+	state.cpad_y = ((data[37] & 0x0F) << 4) | ((data[36] & 0xF0) >> 4)
+	return state
+
+
+class TestDS5:
+
+	def test_decode_bt_input(self):
+		"""
+		Tests that decoding report using lookup tables produces same state
+		as testing every bit did, even when state object is reused.
+		"""
+		rnd = random.Random(5)
+		state = DualSenseBTControllerInput()
+		for i in range(2000):
+			data = bytearray(rnd.getrandbits(8) for x in range(BT_INPUT_REPORT_SIZE))
+			data[0] = 0x31
+			if i % 3 == 0:
+				# Centered dpad
+				data[9] = (data[9] & 0xF0) | 8
+			expected = _convert_input_data(data)
+			decode_bt_input(data, state)
+			for name in FIELDS:
+				assert getattr(state, name) == getattr(expected, name), name
+
@@ -0,0 +1,101 @@
+from collections import namedtuple
+
+from evdev import ecodes
+
+from scc.constants import SCButtons
+from scc.drivers.ds4drv import DS4EvdevController
+from scc.drivers.evdevdrv import EvdevController
+
+Event = namedtuple("Event", "type code value")
+Info = namedtuple("Info", "version")
+
+CONFIG = { "buttons": { ecodes.BTN_SOUTH: "A", ecodes.BTN_EAST: "B" } }
+
+
+def key(code, value):
+	return Event(ecodes.EV_KEY, code, value)
+
+
+def syn(code=ecodes.SYN_REPORT):
+	return Event(ecodes.EV_SYN, code, 0)
+
+
+class FakeDevice:
+	""" Returns events set by test from read() """
+	name = "fake"
+	fd = -1
+	info = Info(0x8000)
+
+	def __init__(self):
+		self.events = []
+
+
+	def read(self):
+		return self.events
+
+
+	def grab(self):
+		pass
+
+
+class FakeMapper:
+	""" Remembers buttons of states passed to input() """
+
+	def __init__(self):
+		self.inputs = []
+
+
+	def input(self, controller, old_state, state):
+		self.inputs.append(state.buttons)
+
+
+class TestEvdevDrv:
+
+	def test_syn_dropped(self):
+		"""
+		Tests that state is committed only on SYN_REPORT and that events
+		are discarded from SYN_DROPPED until next SYN_REPORT.
+		"""
+		device = FakeDevice()
+		c = EvdevController(None, device, None, CONFIG)
+		mapper = FakeMapper()
+		c.set_mapper(mapper)
+
+		device.events = [ key(ecodes.BTN_SOUTH, 1), syn(ecodes.SYN_MT_REPORT) ]
+		c.input()
+		assert mapper.inputs == []
+		device.events = [ syn() ]
+		c.input()
+		assert mapper.inputs == [ SCButtons.A ]
+
+		# Release of A is discarded together with everything up to SYN_REPORT
+		device.events = [ key(ecodes.BTN_SOUTH, 0), syn(ecodes.SYN_DROPPED),
+			key(ecodes.BTN_EAST, 1) ]
+		c.input()
+		device.events = [ key(ecodes.BTN_EAST, 0), syn() ]
+		c.input()
+		assert mapper.inputs == [ SCButtons.A ]
+		assert c._pending.buttons == SCButtons.A
+
+		device.events = [ key(ecodes.BTN_EAST, 1), syn() ]
+		c.input()
+		assert mapper.inputs == [ SCButtons.A, SCButtons.A | SCButtons.B ]
+
+
+	def test_gyro_syn_dropped(self):
+		""" Tests same with events read from DS4 gyro device """
+		gyro = FakeDevice()
+		c = DS4EvdevController(None, FakeDevice(), gyro, FakeDevice())
+		mapper = FakeMapper()
+		c.set_mapper(mapper)
+
+		gyro.events = [ Event(ecodes.EV_ABS, ecodes.ABS_RX, 100), syn(ecodes.SYN_DROPPED),
+			Event(ecodes.EV_ABS, ecodes.ABS_RY, 100), syn() ]
+		c._gyro_input()
+		assert mapper.inputs == []
+		assert (c._pending.gpitch, c._pending.gyaw) == (0, 0)
+
+		gyro.events = [ Event(ecodes.EV_ABS, ecodes.ABS_RY, 100), syn() ]
+		c._gyro_input()
+		assert len(mapper.inputs) == 1
+		assert (c._state.gpitch, c._state.gyaw) == (0, 1)
@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+
+from evdev import AbsInfo, ecodes
+
+from scc.drivers.evdevdrv import config_from_sdl_mapping
+from scc.lib import gamecontrollerdb
+from scc.lib.gamecontrollerdb import GameControllerDB, get_guid, get_sdl_axes, get_sdl_buttons
+
+GUID = "03000000c82d00001930000011010000"
+DB = "\n".join([
+	"# Comment",
+	GUID + ",8BitDo 64,a:b0,b:b1,back:b10,dpup:h0.1,leftx:a0,lefty:a1,platform:Linux,",
+	"03000000c82d00001930000000000000,8BitDo 64 any version,a:b1,platform:Linux,",
+	"03000000c82d00001930000011010000,8BitDo 64 for Windows,a:b2,platform:Windows,",
+	"",
+])
+
+
+def _write(filename, data):
+	with open(filename, "w") as f:
+		f.write(data)
+
+
+class TestGameControllerDB:
+
+	def test_get_guid(self):
+		assert get_guid(0x03, 0x2dc8, 0x3019, 0x0111) == GUID
+
+
+	def test_lookup(self):
+		""" Tests parsing, lookup by version-less GUID and merging of databases """
+		path = tempfile.mkdtemp()
+		try:
+			_write(os.path.join(path, "shipped.txt"), DB)
+			_write(os.path.join(path, "user.txt"), "\n".join([
+				"03000000c82d00001930000000000000,User mapping,a:b3,",
+				"0300000003040000ffff000000000000,User pad,a:b0,platform:Linux",
+			]))
+			db = GameControllerDB([ os.path.join(path, "shipped.txt"),
+				os.path.join(path, "user.txt"), os.path.join(path, "missing.txt") ],
+				os.path.join(path, "cache.pickle"))
+			mapping = db.get_mapping(GUID.upper())
+			assert mapping.name == "8BitDo 64"
+			assert mapping.fields == { "a": "b0", "b": "b1", "back": "b10",
+				"dpup": "h0.1", "leftx": "a0", "lefty": "a1" }
+			assert db.get_mapping(get_guid(0x03, 0x2dc8, 0x3019, 0x0222)).name == "User mapping"
+			assert db.get_mapping(get_guid(0x03, 0x0403, 0xffff, 0x0001)).name == "User pad"
+			assert db.get_mapping(get_guid(0x03, 0x0403, 0x1234, 0x0001)) is None
+			assert len(db) == 3
+		finally:
+			shutil.rmtree(path)
+
+
+	def test_cache(self):
+		""" Tests that parsed database is cached and invalidated by mtime """
+		path = tempfile.mkdtemp()
+		filename = os.path.join(path, "db.txt")
+		cache_file = os.path.join(path, "cache.pickle")
+		parse_mappings = gamecontrollerdb.parse_mappings
+		try:
+			_write(filename, DB)
+			assert GameControllerDB([ filename ], cache_file).get_mapping(GUID).name == "8BitDo 64"
+			assert os.path.exists(cache_file)
+			# Cached database is used without parsing file again
+			gamecontrollerdb.parse_mappings = None
+			db = GameControllerDB([ filename ], cache_file)
+			assert db.get_mapping(GUID).name == "8BitDo 64"
+			# ... until file is changed
+			gamecontrollerdb.parse_mappings = parse_mappings
+			_write(filename, DB.replace("8BitDo 64,", "Changed,"))
+			st = os.stat(filename)
+			os.utime(filename, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+			assert db.get_mapping(GUID).name == "Changed"
+			assert GameControllerDB([ filename ], cache_file).get_mapping(GUID).name == "Changed"
+		finally:
+			gamecontrollerdb.parse_mappings = parse_mappings
+			shutil.rmtree(path)
+
+
+	def test_sdl_order(self):
+		""" Tests that buttons and axes are numbered as SDL numbers them """
+		assert get_sdl_buttons([ ecodes.BTN_SOUTH, ecodes.BTN_0, ecodes.BTN_TRIGGER, ecodes.BTN_EAST ]) == [
+			ecodes.BTN_TRIGGER, ecodes.BTN_SOUTH, ecodes.BTN_EAST, ecodes.BTN_0 ]
+		assert get_sdl_axes([ ecodes.ABS_HAT0X, ecodes.ABS_X, ecodes.ABS_HAT0Y, ecodes.ABS_Y, ecodes.ABS_BRAKE ]) == [
+			ecodes.ABS_X, ecodes.ABS_Y, ecodes.ABS_BRAKE ]
+
+
+	def test_config_from_sdl_mapping(self):
+		""" Tests generating evdev driver configuration from mapping """
+		stick = AbsInfo(value=0, min=-32768, max=32767, fuzz=16, flat=128, resolution=0)
+		trigger = AbsInfo(value=0, min=0, max=255, fuzz=0, flat=0, resolution=0)
+		hat = AbsInfo(value=0, min=-1, max=1, fuzz=0, flat=0, resolution=0)
+		caps = {
+			ecodes.EV_KEY: [ ecodes.BTN_SOUTH, ecodes.BTN_EAST, ecodes.BTN_TL, ecodes.BTN_MODE, ecodes.BTN_TL2 ],
+			ecodes.EV_ABS: [ (ecodes.ABS_X, stick), (ecodes.ABS_Y, stick), (ecodes.ABS_Z, trigger),
+				(ecodes.ABS_HAT0X, hat), (ecodes.ABS_HAT0Y, hat) ],
+		}
+		fields = { "a": "b0", "b": "b1", "leftshoulder": "b2", "guide": "b4",
+			"lefttrigger": "b3", "righttrigger": "a2", "leftx": "a0", "lefty": "a1",
+			"dpup": "h0.1", "dpleft": "h0.8", "misc1": "b15", "rightx": "a7" }
+		config = config_from_sdl_mapping(fields, caps)
+		assert config["buttons"] == {
+			ecodes.BTN_SOUTH: "A", ecodes.BTN_EAST: "B", ecodes.BTN_TL: "LB",
+			ecodes.BTN_MODE: "C", ecodes.BTN_TL2: "ltrig" }
+		assert config["axes"] == {
+			ecodes.ABS_X: { "axis": "stick_x", "min": -32768, "max": 32767, "deadzone": 128 },
+			ecodes.ABS_Y: { "axis": "stick_y", "min": 32767, "max": -32768, "deadzone": 128 },
+			ecodes.ABS_Z: { "axis": "rtrig", "min": 0, "max": 255 },
+			ecodes.ABS_HAT0X: { "axis": "lpad_x", "min": -1, "max": 1, "deadzone": 0 },
+			ecodes.ABS_HAT0Y: { "axis": "lpad_y", "min": 1, "max": -1, "deadzone": 0 },
+		}
+		# Dpad as buttons
+		config = config_from_sdl_mapping({ "dpup": "b0", "dpleft": "b1" }, caps)
+		assert config["dpads"][ecodes.BTN_SOUTH]["axis"] == "lpad_y"
+		assert config["dpads"][ecodes.BTN_SOUTH]["positive"]
+		assert not config["dpads"][ecodes.BTN_EAST]["positive"]
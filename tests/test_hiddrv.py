@@ -0,0 +1,54 @@
+import shutil
+import tempfile
+
+from scc.drivers.hiddrv import DecoderCache, HIDController
+
+# Gamepad with 16 buttons, 4 axes and hatswitch
+DESCRIPTOR = bytes([
+	0x05, 0x01, 0x09, 0x05, 0xA1, 0x01,
+	0x05, 0x09, 0x19, 0x01, 0x29, 0x10, 0x15, 0x00, 0x25, 0x01,
+	0x75, 0x01, 0x95, 0x10, 0x81, 0x02,
+	0x05, 0x01, 0x09, 0x30, 0x09, 0x31, 0x09, 0x32, 0x09, 0x35,
+	0x26, 0xFF, 0x00, 0x75, 0x08, 0x95, 0x04, 0x81, 0x02,
+	0x09, 0x39, 0x25, 0x07, 0x75, 0x04, 0x95, 0x01, 0x81, 0x42,
+	0x75, 0x04, 0x95, 0x01, 0x81, 0x01,
+	0xC0,
+])
+CONFIG = {
+	"axes": {
+		"0": { "axis": "stick_x", "min": 0, "max": 255, "deadzone": 5 },
+		"1": { "axis": "stick_y", "min": 255, "max": 0 },
+		"3": { "axis": "rtrig", "min": 0, "max": 255 },
+		"4": { "axis": "lpad_x", "min": -1, "max": 1 },
+	},
+	"buttons": { "288": "A", "289": "B", "295": "START" },
+}
+
+
+def _build(config):
+	c = HIDController.__new__(HIDController)
+	c._build_hid_decoder(DESCRIPTOR, config, 64)
+	return c._decoder
+
+
+class TestHIDDrv:
+
+	def test_decoder_cache(self):
+		"""
+		Tests that decoder loaded from cache is same as one built
+		by parsing descriptor.
+		"""
+		path = tempfile.mkdtemp()
+		try:
+			for config in (None, CONFIG):
+				decoder = _build(config)
+				key = DecoderCache.get_key(DESCRIPTOR, config, 64)
+				assert DecoderCache(path).load(key) is None
+				DecoderCache(path).store(key, decoder)
+				assert bytes(DecoderCache(path).load(key)) == bytes(decoder)
+			# Different configuration or packet size is cached separately
+			assert DecoderCache.get_key(DESCRIPTOR, CONFIG, 64) != DecoderCache.get_key(DESCRIPTOR, None, 64)
+			assert DecoderCache.get_key(DESCRIPTOR, CONFIG, 64) != DecoderCache.get_key(DESCRIPTOR, CONFIG, 32)
+			assert DecoderCache.get_key(list(DESCRIPTOR), CONFIG, 64) == DecoderCache.get_key(DESCRIPTOR, CONFIG, 64)
+		finally:
+			shutil.rmtree(path)
@@ -0,0 +1,61 @@
+import random
+
+from scc.lib.hidparse import CompiledParsers, HIDAxisParser, HIDButtonParser, make_parsers
+
+# Joystick with 10 buttons, 10bit X and Y axes, 8bit throttle and hatswitch
+DESCRIPTOR = bytes([
+	0x05, 0x01, 0x09, 0x04, 0xA1, 0x01,
+	0x05, 0x09, 0x19, 0x01, 0x29, 0x0A, 0x15, 0x00, 0x25, 0x01,
+	0x75, 0x01, 0x95, 0x0A, 0x81, 0x02,
+	0x05, 0x01, 0x09, 0x30, 0x09, 0x31, 0x26, 0xFF, 0x03,
+	0x75, 0x0A, 0x95, 0x02, 0x81, 0x02,
+	0x09, 0x36, 0x26, 0xFF, 0x00, 0x75, 0x08, 0x95, 0x01, 0x81, 0x02,
+	0x09, 0x39, 0x25, 0x07, 0x75, 0x04, 0x95, 0x01, 0x81, 0x42,
+	0xC0,
+])
+
+
+def _reference(parser, data):
+	""" Reads value bit by bit """
+	value = 0
+	for i in range(parser.len):
+		bit = parser.offset + i
+		if data[bit // 8] & (1 << (bit % 8)):
+			value |= 1 << i
+	return value
+
+
+class TestHIDParse:
+
+	def test_make_parsers(self):
+		""" Tests that report size and field offsets are integers """
+		size, parsers = make_parsers(DESCRIPTOR)
+		assert size == 6
+		assert [ (p.byte_offset, p.bit_offset, p.len) for p in parsers ] == [
+			(0, 0, 10), (1, 2, 10), (2, 4, 10), (3, 6, 8), (4, 6, 4) ]
+
+
+	def test_compiled_parsers(self):
+		"""
+		Tests that compiled parsers decode same values as reading every bit,
+		for aligned, unaligned and overlapping fields.
+		"""
+		rnd = random.Random(5)
+		layouts = [
+			make_parsers(DESCRIPTOR)[1],
+			[ HIDAxisParser(0, 16, 1, 16), HIDButtonParser(0, 3, 10, 1),
+			  HIDAxisParser(1, 8, 1, 8), HIDAxisParser(2, 37, 1, 12),
+			  HIDAxisParser(3, 64, 1, 32), HIDButtonParser(10, 60, 3, 2) ],
+			[ HIDAxisParser(0, 4, 1, 32) ],
+			[ HIDAxisParser(0, 0, 1, 8) ],
+		]
+		for parsers in layouts:
+			compiled = CompiledParsers(parsers)
+			values = compiled.values
+			for i in range(200):
+				data = bytes(rnd.getrandbits(8) for x in range(compiled.size))
+				assert compiled.decode(memoryview(data)) is values
+				assert values == [ _reference(p, data) for p in parsers ]
+				for p in parsers:
+					p.decode(data)
+					assert p.value == _reference(p, data)
@@ -38,7 +38,7 @@ parser = ActionParser()
 def input_test(fn):
 	"""Decorator that creates usable mapper."""
 	def wrapper(*a):
-		_time = time.time
+		_time, _monotonic = time.time, time.monotonic
 
 		def fake_time():
 			return fake_time.t
@@ -47,6 +47,7 @@ def input_test(fn):
 		fake_time.t = _time()
 		fake_time.add = add
 		time.time = fake_time
+		time.monotonic = fake_time
 
 		controller = FakeController(0)
 		profile = Profile(parser)
@@ -70,7 +71,7 @@ def input_test(fn):
 		try:
 			return fn(*a)
 		finally:
-			time.time = _time
+			time.time, time.monotonic = _time, _monotonic
 	return wrapper
 
 
@@ -252,3 +253,32 @@ class TestInputs:
 		_state, state = state, state._replace(buttons=SCButtons.A)
 		mapper.input(mapper.controller, _state, state)
 		assert Keys["KEY_Y"] in mapper.keyboard.pressed
+
+
+	@input_test
+	def test_multiple_buttons(self, mapper: Mapper):
+		"""Test pressing and releasing multiple buttons in single frame."""
+		mapper.profile.buttons[SCButtons.A] = (parser.restart("button(Keys.KEY_A)")).parse()
+		mapper.profile.buttons[SCButtons.LB] = (parser.restart("button(Keys.KEY_B)")).parse()
+		mapper.profile.buttons[SCButtons.START] = (parser.restart("button(Keys.KEY_C)")).parse()
+
+		state = ZERO_STATE._replace(buttons=SCButtons.A | SCButtons.LB | SCButtons.START)
+		mapper.input(mapper.controller, ZERO_STATE, state)
+		assert mapper.keyboard.pressed == { Keys["KEY_A"], Keys["KEY_B"], Keys["KEY_C"] }
+		_state, state = state, state._replace(buttons=SCButtons.LB | SCButtons.Y)
+		mapper.input(mapper.controller, _state, state)
+		assert mapper.keyboard.pressed == { Keys["KEY_B"] }
+
+
+	@input_test
+	def test_plan_invalidation(self, mapper: Mapper):
+		"""Test that inputs without action are skipped until plan is rebuilt."""
+		state = ZERO_STATE._replace(ltrig=255)
+		mapper.input(mapper.controller, ZERO_STATE, state)
+		assert mapper._check_ltrig not in mapper._plan
+
+		mapper.profile.triggers[Profile.LEFT] = (parser.restart("axis(Axes.ABS_Z)")).parse()
+		mapper.invalidate_plan()
+		mapper.input(mapper.controller, state, ZERO_STATE)
+		assert mapper._check_ltrig in mapper._plan
+		assert mapper.gamepad.axes[Axes["ABS_Z"]] == 0
@@ -0,0 +1,48 @@
+from scc import latency
+from scc.latency import STAGES, LatencyStats
+
+
+class TestLatency:
+
+	def test_summary(self):
+		""" Tests that durations are split into stages and percentiles computed """
+		stats = LatencyStats(size=100)
+		for i in range(100):
+			# 1us receive, 2us dispatch, 3us scheduled, i us generate
+			stats.add(0.0, 1e-6, 3e-6, 6e-6, 6e-6 + i * 1e-6)
+		summary = { row[0]: row[1:] for row in stats.summary() }
+		assert list(summary) == list(STAGES)
+		count, p50, p90, p99, mx = summary["generate"]
+		assert count == 100
+		assert (round(p50), round(p90), round(p99), round(mx)) == (50, 90, 99, 99)
+		assert round(summary["receive"][1]) == 1
+		assert round(summary["total"][4]) == 105
+
+
+	def test_ring(self):
+		""" Tests that only last 'size' samples are kept """
+		stats = LatencyStats(size=4)
+		stats.add(0.0, 0.0, 0.0, 0.0, 1.0)
+		for i in range(4):
+			stats.add(0.0, 0.0, 0.0, 0.0, 1e-6)
+		assert stats.get_count() == 4
+		assert round(stats.summary()[-1][-1]) == 1
+
+
+	def test_not_received(self):
+		"""
+		Tests that received time is used only by first input processed after
+		data was received and not by input generated later, e.g. by scheduled
+		task.
+		"""
+		stats = LatencyStats(size=4)
+		latency.mark_received()
+		received = latency.take_received()
+		assert received is not None
+		stats.add(received, received + 1.0, received + 1.0, received + 1.0, received + 1.0)
+		assert latency.take_received() is None
+		stats.add(latency.take_received(), received + 5.0, received + 5.0, received + 5.0, received + 6.0)
+		summary = { row[0]: row[1:] for row in stats.summary() }
+		assert summary["receive"][0] == 2
+		assert round(summary["receive"][4]) == 1000000
+		assert round(summary["total"][4]) == 1000000
@@ -0,0 +1,75 @@
+import json
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from scc.actions import ButtonAction
+from scc.menu_data import MenuCache
+from scc.parser import TalkingActionParser
+
+MENU = [
+	{ "id": "item1", "name": "First", "action": "button(Keys.KEY_A)" },
+	{ "separator": True },
+	{ "id": "item2", "action": "button(Keys.KEY_B)" },
+]
+
+
+class TestMenuCache:
+
+	def setup_method(self):
+		self.dir = tempfile.mkdtemp()
+		self.filename = os.path.join(self.dir, "test.menu")
+		self.profile = os.path.join(self.dir, "test.sccprofile")
+		self._write(self.filename, MENU)
+		self._write(self.profile, { "menus": { "menu1": MENU, "menu2": MENU[1:] } })
+
+
+	def teardown_method(self):
+		shutil.rmtree(self.dir)
+
+
+	def _write(self, filename, data):
+		with open(filename, "w") as f:
+			f.write(json.dumps(data))
+
+
+	def test_get_item(self):
+		""" Tests that items are found by ID and their actions parsed """
+		cache = MenuCache(TalkingActionParser())
+		item = cache.get_item(self.filename, "item2")
+		assert isinstance(item.action, ButtonAction)
+		assert cache.get_item(self.filename, "item2") is item
+		assert cache.get_item(self.profile, "item1", "menu1").label == "First"
+		with pytest.raises(KeyError):
+			cache.get_item(self.filename, "item3")
+		with pytest.raises(KeyError):
+			cache.get_item(self.profile, "item1", "menu2")
+		with pytest.raises(ValueError):
+			cache.get_item(self.profile, "item1", "menu3")
+
+
+	def test_load(self):
+		""" Tests that every load returns copy that can be modified """
+		cache = MenuCache()
+		a = cache.load(self.filename)
+		b = cache.load(self.filename)
+		assert a is not b and a[0] is not b[0]
+		assert [ i.id for i in a ] == [ i.id for i in b ]
+		a[0].widget = "widget"
+		assert b[0].widget is None
+		assert a[0].action is None
+		assert len(cache.load(self.profile, "menu2")) == 2
+
+
+	def test_invalidation(self):
+		""" Tests that menu is loaded again when file changes """
+		cache = MenuCache()
+		assert len(cache.load(self.filename)) == 3
+		self._write(self.filename, MENU[0:1])
+		assert len(cache.load(self.filename)) == 1
+		assert cache.get_item(self.profile, "item1", "menu1")
+		self._write(self.profile, { "menus": { "menu1": MENU[1:] } })
+		with pytest.raises(KeyError):
+			cache.get_item(self.profile, "item1", "menu1")
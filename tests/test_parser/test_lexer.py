@@ -0,0 +1,68 @@
+import glob
+import json
+import os
+
+from scc.parser import _lex, _tokenize
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+
+
+def _find_actions(data, rv):
+	if isinstance(data, dict):
+		for key, value in data.items():
+			if key == "action" and isinstance(value, str):
+				rv.append(value)
+			else:
+				_find_actions(value, rv)
+	elif isinstance(data, list):
+		for value in data:
+			_find_actions(value, rv)
+	return rv
+
+
+class TestLexer:
+
+	def test_same_as_tokenize(self):
+		"""
+		Tests if action strings are split to same tokens as tokenize module
+		would split them.
+		"""
+		for s in (
+				"button(Keys.KEY_A)", "button(Keys.KEY_A)\n", "a(1)\r\n",
+				"sens(2.5, .5, 1e3, -0x1F, 0b101, 0o17, 1_000, 3j, mouse())",
+				"trigger(50, 255, axis(Axes.ABS_Z))  ", "a;\n\nb", "a;\n\n\nb\n", "a(\n\t1,\n\t2\n)",
+				"mode(LT >= 0.7, a(), STICK<3, b())", "osd('Hello \\'world\\'', \"x\")",
+				"a and b and c", "menu('Default.menu', A, B)", "x.y.z", "[{}]", "",
+			):
+			assert _lex(s) == _tokenize(s), s
+
+
+	def test_unusual(self):
+		"""
+		Tests if lexer refuses everything what tokenize has to handle itself.
+		"""
+		for s in (
+				"  indented()", "\nnewline_first", "a # comment", "a(1", "a)",
+				"a('unterminated)", "a('''triple''')", "a(r'prefix')", "a $ b",
+				"a(\\\n1)", "a\rb",
+			):
+			assert _lex(s) is None, s
+
+
+	def test_default_actions(self):
+		"""
+		Tests if every action from default profiles and menus is handled
+		by lexer and split to same tokens as by tokenize module.
+		"""
+		strings = []
+		for filename in (glob.glob(os.path.join(ROOT, "default_profiles", "*.sccprofile"))
+				+ glob.glob(os.path.join(ROOT, "default_menus", "*.menu"))):
+			with open(filename, "r") as f:
+				_find_actions(json.loads(f.read()), strings)
+		assert strings
+		for s in strings:
+			if s.count("(") != s.count(")"):
+				# There are few broken actions in default profiles
+				continue
+			assert _lex(s) is not None, s
+			assert _lex(s) == _tokenize(s), s
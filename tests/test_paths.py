@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+
+from scc.paths import DirectoryIndex
+
+
+class TestDirectoryIndex:
+
+	def setup_method(self):
+		self.dir = tempfile.mkdtemp()
+		self.user = os.path.join(self.dir, "user")
+		self.default = os.path.join(self.dir, "default")
+		os.mkdir(self.default)
+		os.mkdir(os.path.join(self.default, "system"))
+		for name in ("a.menu", "b.menu", "system/icon.png"):
+			self._touch(self.default, name)
+		self.index = DirectoryIndex((self.user, self.default))
+
+
+	def teardown_method(self):
+		shutil.rmtree(self.dir)
+
+
+	def _touch(self, path, name):
+		with open(os.path.join(path, name), "w"):
+			pass
+
+
+	def test_find(self):
+		""" Tests lookups, including names that are not indexed """
+		assert self.index.find("a.menu") == os.path.join(self.default, "a.menu")
+		assert self.index.find("system/icon.png") == os.path.join(self.default, "system", "icon.png")
+		assert self.index.find("c.menu") is None
+		assert self.index.find("system/../a.menu") == os.path.join(self.default, "system/../a.menu")
+		assert self.index.find(os.path.join(self.default, "b.menu")) == os.path.join(self.default, "b.menu")
+
+
+	def test_changes(self):
+		""" Tests that created, removed and renamed files are noticed """
+		assert self.index.find("c.menu") is None
+		self._touch(self.default, "c.menu")
+		assert self.index.find("c.menu") == os.path.join(self.default, "c.menu")
+		os.rename(os.path.join(self.default, "c.menu"), os.path.join(self.default, "d.menu"))
+		assert self.index.find("c.menu") is None
+		assert self.index.find("d.menu") is not None
+		shutil.rmtree(os.path.join(self.default, "system"))
+		assert self.index.find("system/icon.png") is None
+		os.mkdir(os.path.join(self.default, "new"))
+		self._touch(os.path.join(self.default, "new"), "icon.png")
+		assert self.index.find("new/icon.png") is not None
+
+
+	def test_changes_attached(self):
+		"""
+		Tests that file created after index was attached to main loop is
+		found before main loop gets to process inotify events.
+		"""
+		class FakePoller:
+			POLLIN = 1
+			def register(self, fd, events, callback):
+				self.callback = callback
+
+		poller = FakePoller()
+		assert self.index.find("c.menu") is None
+		DirectoryIndex.attach_poller(poller)
+		self._touch(self.default, "c.menu")
+		assert self.index.find("c.menu") == os.path.join(self.default, "c.menu")
+		os.rename(os.path.join(self.default, "c.menu"), os.path.join(self.default, "d.menu"))
+		assert self.index.find("c.menu") is None
+		assert "d.menu" in self.index.list(".menu")
+		poller.callback()
+		assert self.index.find("d.menu") == os.path.join(self.default, "d.menu")
+
+
+	def test_priority(self):
+		"""
+		Tests that file from first directory is preferred, even if that
+		directory didn't exist when index was built.
+		"""
+		assert self.index.find("a.menu") == os.path.join(self.default, "a.menu")
+		os.mkdir(self.user)
+		self._touch(self.user, "a.menu")
+		assert self.index.find("a.menu") == os.path.join(self.user, "a.menu")
+		assert self.index.list(".menu") == {
+			"a.menu": os.path.join(self.user, "a.menu"),
+			"b.menu": os.path.join(self.default, "b.menu"),
+		}
+		shutil.rmtree(self.user)
+		assert self.index.find("a.menu") == os.path.join(self.default, "a.menu")
@@ -0,0 +1,55 @@
+import os
+import threading
+import time
+
+from scc.poller import Poller
+from scc.scheduler import Scheduler
+
+
+class TestPoller:
+
+	def test_fd_callback(self):
+		"""Tests if callback is called when registered descriptor is ready."""
+		poller = Poller()
+		r, w = os.pipe()
+		called = []
+		poller.register(r, poller.POLLIN, lambda fd, event: called.append((fd, event)))
+		os.write(w, b"x")
+		poller.poll(1.0)
+		assert called == [ (r, Poller.POLLIN) ]
+		poller.unregister(r)
+		os.close(r)
+		os.close(w)
+
+
+	def test_blocks_until_timeout(self):
+		"""Tests if poll sleeps instead of returning immediately."""
+		poller = Poller()
+		t = time.monotonic()
+		poller.poll(0.05)
+		assert time.monotonic() - t >= 0.04
+
+
+	def test_wakeup(self):
+		"""Tests if wakeup from other thread interrupts poll blocked forever."""
+		poller = Poller()
+		threading.Timer(0.05, poller.wakeup).start()
+		t = time.monotonic()
+		poller.poll(None)
+		assert time.monotonic() - t < 5.0
+
+
+	def test_scheduler_wakeup(self):
+		"""
+		Tests if task scheduled from other thread wakes up poller
+		and if get_timeout reflects the new task.
+		"""
+		poller = Poller()
+		scheduler = Scheduler(wakeup=poller.wakeup)
+		assert scheduler.get_timeout() is None
+		called = []
+		threading.Timer(0.05, scheduler.schedule, (0, called.append, True)).start()
+		poller.poll(scheduler.get_timeout())
+		assert scheduler.get_timeout() == 0
+		scheduler.run()
+		assert called == [ True ]
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+
+from scc.constants import SCButtons
+from scc.parser import TalkingActionParser
+from scc import profile_cache
+from scc.profile_cache import ProfileCache
+
+PROFILE = os.path.join(os.path.dirname(__file__), "..", "..",
+	"default_profiles", "XBox Controller.sccprofile")
+
+
+class TestProfileCache:
+
+	def setup_method(self):
+		self.dir = tempfile.mkdtemp()
+		self.filename = os.path.join(self.dir, "test.sccprofile")
+		shutil.copy(PROFILE, self.filename)
+		self.cache_path = os.path.join(self.dir, "cache")
+
+
+	def teardown_method(self):
+		shutil.rmtree(self.dir)
+
+
+	def test_cached(self):
+		"""
+		Tests that profile loaded from cache is same as parsed one,
+		but not same instance.
+		"""
+		cache = ProfileCache(self.cache_path)
+		parsed = cache.load(self.filename, TalkingActionParser())
+		cached = cache.load(self.filename, TalkingActionParser())
+		assert cached is not parsed
+		assert cached.filename == self.filename
+		assert cached.buttons[SCButtons.A] is not parsed.buttons[SCButtons.A]
+		assert cached.buttons[SCButtons.A].to_string() == parsed.buttons[SCButtons.A].to_string()
+		assert cached.stick.to_string() == parsed.stick.to_string()
+		# Loaded from disk by new instance
+		cached = ProfileCache(self.cache_path).load(self.filename, TalkingActionParser())
+		assert cached.stick.to_string() == parsed.stick.to_string()
+		assert len(os.listdir(self.cache_path)) == 1
+
+
+	def test_invalidation(self):
+		""" Tests that modified profile is parsed again """
+		cache = ProfileCache(self.cache_path)
+		cache.load(self.filename, TalkingActionParser())
+		with open(self.filename, "r") as f:
+			data = f.read()
+		data = data.replace('"is_template": false', '"is_template": true')
+		with open(self.filename, "w") as f:
+			f.write(data)
+		assert cache.load(self.filename, TalkingActionParser()).is_template
+		assert ProfileCache(self.cache_path).load(self.filename, TalkingActionParser()).is_template
+
+
+	def test_touched(self):
+		""" Tests that cache is still used if only mtime changed """
+		cache = ProfileCache(self.cache_path)
+		cache.load(self.filename, TalkingActionParser())
+		os.utime(self.filename, (0, 0))
+		parsed = []
+		cache._parse = lambda *a: parsed.append(a)
+		assert cache.load(self.filename, TalkingActionParser()) is not None
+		assert parsed == []
+
+
+	def test_source_changed(self, monkeypatch):
+		""" Tests that profile cached by different code is parsed again """
+		ProfileCache(self.cache_path).load(self.filename, TalkingActionParser())
+		monkeypatch.setattr(profile_cache, "_source_fingerprint", "changed")
+		cache = ProfileCache(self.cache_path)
+		assert cache._read_entry(os.path.abspath(self.filename)) is None
+		assert cache.load(self.filename, TalkingActionParser()) is not None
+		assert ProfileCache(self.cache_path)._read_entry(os.path.abspath(self.filename)) is not None
+
+
+	def test_unusable_entry(self):
+		""" Tests that entry which cannot be unpickled is treated as cache miss """
+		cache = ProfileCache(self.cache_path)
+		parsed = cache.load(self.filename, TalkingActionParser())
+		key = os.path.abspath(self.filename)
+		cache._store(key, cache._entries[key]._replace(data=b"broken"))
+		profile = ProfileCache(self.cache_path).load(self.filename, TalkingActionParser())
+		assert profile.stick.to_string() == parsed.stick.to_string()
+		assert cache._read_entry(key).data != b"broken"
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import time
+
+from scc import replay
+from scc.constants import SCButtons
+from scc.drivers.sc_dongle import SCController, SCInput, SCStatus
+from scc.parser import ActionParser
+from scc.profile import Profile
+from scc.uinput import Keys
+
+parser = ActionParser()
+
+
+class TestReplay:
+
+	def test_record_load(self):
+		""" Tests that recorded packets are loaded back into streams """
+		c1, c2 = SCController(None, 0, 0), SCController(None, 1, 0)
+		with tempfile.TemporaryDirectory() as d:
+			filename = os.path.join(d, "input")
+			replay.start_recording(filename)
+			try:
+				c1.read_input(bytes(64))
+				c2.read_input(b"\x01" * 64)
+				c1.read_input(b"\x02" * 64)
+			finally:
+				replay.stop_recording()
+			streams = replay.load(filename)
+		assert [ (s.driver, s.type) for s in streams ] == [ ("sc", "sc"), ("sc", "sc") ]
+		assert [ data for t, data in streams[0].packets ] == [ bytes(64), b"\x02" * 64 ]
+		assert [ data for t, data in streams[1].packets ] == [ b"\x01" * 64 ]
+
+
+	def test_replay(self):
+		""" Tests that replayed packets go through driver and mapper """
+		profile = Profile(parser)
+		profile.buttons[SCButtons.A] = parser.restart("button(Keys.KEY_ENTER)").parse()
+		stream = replay.Stream("sc", "sc", None)
+		state = SCInput()
+		state.status = SCStatus.INPUT
+		for i in range(10):
+			state.buttons = SCButtons.A if i % 2 else 0
+			stream.packets.append((i * 0.01, bytes(state)))
+
+		with tempfile.TemporaryDirectory() as d:
+			filename = os.path.join(d, "input")
+			replay.save(filename, [ stream ])
+			stream, = replay.load(filename)
+
+		r = replay.Replayer(stream, profile)
+		pressed = []
+		r.mapper.keyboard.pressEvent = pressed.extend
+		clocks = []
+		def measure(step, data):
+			clocks.append((time.time, time.monotonic))
+			step(data)
+		r.replay(measure)
+		assert pressed == [ Keys.KEY_ENTER ] * 5
+		assert round(r.controller.lastTime - r.start, 6) == 0.09
+		# Recorded time is used only by replayed mapper and scheduler
+		assert set(clocks) == { (time.time, time.monotonic) }
+
+
+	def test_long_recording(self):
+		""" Tests that timestamps are kept in recording longer than 2^32 microseconds """
+		stream = replay.Stream("sc", "sc", None)
+		stream.packets = [ (1.0, bytes(64)), (5000.0, bytes(64)) ]
+		with tempfile.TemporaryDirectory() as d:
+			filename = os.path.join(d, "input")
+			replay.save(filename, [ stream ])
+			stream, = replay.load(filename)
+		assert [ t for t, data in stream.packets ] == [ 1.0, 5000.0 ]
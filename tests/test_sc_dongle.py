@@ -0,0 +1,64 @@
+from scc.constants import SCButtons
+from scc.drivers.sc_dongle import SCController, SCStatus
+
+# Input packets as received from controller; A pressed with left pad
+# touched, then everything released
+PACKET_A = bytes.fromhex(
+	"01000100" "3412" "00" "00800008" "ff00" "000000"
+	"0010" "00f0" "0000" "0000" "00000000"
+	"0c00" "f8ff" "0040" "0500" "fbff" "0000"
+	"7f7f" "0000" "0000" "0000" + "00" * 16)
+PACKET_RELEASED = bytes.fromhex(
+	"01000100" "3512" "00" "00000000" "0000" "000000"
+	"0000" "0000" "0000" "0000" "00000000"
+	"0c00" "f8ff" "0040" "0000" "0000" "0000"
+	"7f7f" "0000" "0000" "0000" + "00" * 16)
+
+
+class FakeMapper:
+	""" Remembers states passed to input() """
+
+	def __init__(self):
+		self.inputs = []
+
+
+	def input(self, controller, old_state, state):
+		self.inputs.append((old_state, state, bytes(old_state), bytes(state)))
+
+
+class TestSCDongle:
+
+	def test_read_input(self):
+		"""
+		Tests that recorded packet is decoded into state and that receiving
+		next packet doesn't overwrite state that mapper got as current one
+		before it's passed back as old state.
+		"""
+		c = SCController(None, 0, 0)
+		mapper = FakeMapper()
+		c.set_mapper(mapper)
+		assert len(PACKET_A) == len(PACKET_RELEASED) == 64
+
+		c.read_input(PACKET_A)
+		c.input()
+		old, state, old_data, data = mapper.inputs[-1]
+		assert state.status == SCStatus.INPUT
+		assert state.seq == 0x1234
+		assert state.buttons == SCButtons.A | SCButtons.LPADTOUCH
+		assert (state.ltrig, state.rtrig) == (255, 0)
+		assert (state.lpad_x, state.lpad_y) == (4096, -4096)
+		assert (state.accel_x, state.accel_y, state.accel_z) == (12, -8, 16384)
+		assert (state.gpitch, state.groll, state.gyaw) == (5, -5, 0)
+		assert state.q1 == 32639
+		assert old_data == bytes(64)
+
+		c.read_input(PACKET_RELEASED)
+		# State mapper got as current is still there, unchanged
+		assert bytes(state) == PACKET_A
+		c.input()
+		old, state2, old_data, data = mapper.inputs[-1]
+		assert old is state
+		assert old_data == PACKET_A
+		assert data == PACKET_RELEASED
+		assert state2.buttons == 0
+		assert state2.seq == 0x1235
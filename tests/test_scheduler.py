@@ -0,0 +1,76 @@
+import time
+
+from scc.scheduler import Scheduler
+
+
+class TestScheduler:
+
+	def test_order(self):
+		"""Tests if tasks are executed by time and then in order they were scheduled."""
+		scheduler = Scheduler()
+		called = []
+		scheduler.schedule(0.02, called.append, "c")
+		scheduler.schedule(0, called.append, "a")
+		scheduler.schedule(0, called.append, "b")
+		scheduler.run()
+		assert called == [ "a", "b" ]
+		time.sleep(0.03)
+		scheduler.run()
+		assert called == [ "a", "b", "c" ]
+		assert scheduler.get_timeout() is None
+
+
+	def test_cancel(self):
+		"""Tests canceling using scheduler and Task.cancel."""
+		scheduler = Scheduler()
+		called = []
+		t1 = scheduler.schedule(0, called.append, 1)
+		t2 = scheduler.schedule(0, called.append, 2)
+		scheduler.schedule(0, called.append, 3)
+		assert scheduler.cancel_task(t1)
+		assert not scheduler.cancel_task(t1)
+		t2.cancel()
+		scheduler.run()
+		assert called == [ 3 ]
+		assert not scheduler.cancel_task(t2)
+
+
+	def test_cancel_owned(self):
+		"""Tests bulk-canceling of all tasks with same owner."""
+		scheduler = Scheduler()
+		called = []
+		for i in range(10):
+			scheduler.schedule(0, called.append, i, owner="a" if i % 2 else "b")
+		assert scheduler.cancel_owned("a") == 5
+		assert scheduler.cancel_owned("a") == 0
+		scheduler.run()
+		assert called == [ 0, 2, 4, 6, 8 ]
+
+
+	def test_compact(self):
+		"""Tests that heap doesn't grow when tasks are repeatedly canceled."""
+		scheduler = Scheduler()
+		for i in range(10000):
+			scheduler.cancel_task(scheduler.schedule(10, print))
+		assert len(scheduler._heap) <= Scheduler.COMPACT_THRESHOLD * 2 + 1
+		assert scheduler.get_timeout() is None
+
+
+	def test_compact_while_running(self):
+		"""
+		Tests that canceling many tasks from task callback doesn't break
+		run() that is iterating over heap.
+		"""
+		scheduler = Scheduler()
+		called = []
+		def cancel_all():
+			for task in tasks:
+				task.cancel()
+			scheduler.schedule(0, called.append, "new")
+		scheduler.schedule(0, cancel_all)
+		tasks = [ scheduler.schedule(0, called.append, i) for i in range(Scheduler.COMPACT_THRESHOLD * 2) ]
+		scheduler.schedule(0, called.append, "last")
+		scheduler.run()
+		assert called == [ "last", "new" ]
+		assert scheduler._canceled == 0
+		assert scheduler.get_timeout() is None
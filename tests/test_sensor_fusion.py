@@ -0,0 +1,114 @@
+import math
+import random
+
+from scc.sensor_fusion import ACCEL_RES_PER_G, GYRO_RES_IN_DEG_SEC, SensorClock, SensorFusion
+
+RATE = 250
+BIAS = (20.0, -25.0, 15.0)		# pitch, yaw, roll
+NOISE = 4.0
+
+
+def _qmul(a, b):
+	return (
+		a[0] * b[0] - a[1] * b[1] - a[2] * b[2] - a[3] * b[3],
+		a[0] * b[1] + a[1] * b[0] + a[2] * b[3] - a[3] * b[2],
+		a[0] * b[2] - a[1] * b[3] + a[2] * b[0] + a[3] * b[1],
+		a[0] * b[3] + a[1] * b[2] - a[2] * b[1] + a[3] * b[0],
+	)
+
+
+def _axis_angle(x, y, z, angle):
+	s = math.sin(angle / 2)
+	return (math.cos(angle / 2), x * s, y * s, z * s)
+
+
+def _orientation(t):
+	""" True orientation at time t, quaternion (w, x, y, z) """
+	q = _axis_angle(0, 0, 1, 1.0 * math.sin(0.3 * t))
+	q = _qmul(q, _axis_angle(0, 1, 0, 0.6 * math.sin(0.7 * t + 1)))
+	return _qmul(q, _axis_angle(1, 0, 0, 0.5 * math.sin(1.3 * t)))
+
+
+def _gravity(q):
+	""" Direction of gravity in controller axes """
+	w, x, y, z = q
+	return (2 * (x * z - w * y), 2 * (w * x + y * z), w * w - x * x - y * y + z * z)
+
+
+def _trace(seconds, still=False):
+	"""
+	Generates sensor samples (pitch, yaw, roll, accel_x, accel_y, accel_z)
+	along with true orientation, for controller that is moving all the time
+	or lying still. Gyro has constant bias and noise.
+	"""
+	rnd = random.Random(5)
+	dt = 1.0 / RATE
+	scale = 180.0 / math.pi * GYRO_RES_IN_DEG_SEC
+	for i in range(int(seconds * RATE)):
+		t = 0.0 if still else i * dt
+		q, next = _orientation(t), _orientation(0.0 if still else t + dt)
+		# Rotation between two samples, in controller axes
+		w, x, y, z = _qmul((q[0], -q[1], -q[2], -q[3]), next)
+		gx, gy, gz = [ 2.0 * v / dt for v in (x, y, z) ]
+		vx, vy, vz = _gravity(next)
+		yield (
+			gy * scale + BIAS[0] + rnd.gauss(0, NOISE),
+			gz * scale + BIAS[1] + rnd.gauss(0, NOISE),
+			gx * scale + BIAS[2] + rnd.gauss(0, NOISE),
+			-vy * ACCEL_RES_PER_G, -vx * ACCEL_RES_PER_G, vz * ACCEL_RES_PER_G,
+		), next
+
+
+def _tilt_error(fusion, q):
+	""" Returns angle between real and computed gravity, in degrees """
+	a = _gravity(q)
+	b = _gravity((fusion.qw, fusion.qx, fusion.qy, fusion.qz))
+	dot = sum(x * y for x, y in zip(a, b))
+	return math.degrees(math.acos(max(-1.0, min(1.0, dot))))
+
+
+class TestSensorFusion:
+
+	def test_tilt(self):
+		"""
+		Tests that orientation of moving controller doesn't drift,
+		while gyro integrated without accelerometer does.
+		"""
+		fusion, gyro_only = SensorFusion(), SensorFusion(kp=0.0)
+		# Start with known orientation
+		q = _orientation(0.0)
+		for f in (fusion, gyro_only):
+			f.qw, f.qx, f.qy, f.qz = q
+		errors = []
+		for sample, q in _trace(60):
+			fusion.update(*sample, 1.0 / RATE)
+			gyro_only.update(*sample, 1.0 / RATE)
+			errors.append(_tilt_error(fusion, q))
+		assert max(errors[-RATE * 10:]) < 3.0
+		assert _tilt_error(gyro_only, q) > 10.0
+
+
+	def test_calibration(self):
+		""" Tests that gyro bias is calibrated while controller lies still """
+		fusion = SensorFusion()
+		for sample, q in _trace(10, still=True):
+			fusion.update(*sample, 1.0 / RATE)
+		bias = (fusion.bias_pitch, fusion.bias_yaw, fusion.bias_roll)
+		for a, b in zip(bias, BIAS):
+			assert abs(a - b) < 1.0
+		# With calibrated bias, yaw stops drifting
+		q1 = fusion.get_quaternion()
+		for sample, q in _trace(10, still=True):
+			fusion.update(*sample, 1.0 / RATE)
+		assert abs(fusion.get_quaternion()[3] - q1[3]) < 100
+		assert _tilt_error(fusion, q) < 1.0
+
+
+	def test_sensor_clock(self):
+		""" Tests computing time from wrapping sensor timestamp """
+		clock = SensorClock(16, 0.001)
+		assert clock.get_delta(0xFFF0) == 0.0
+		assert abs(clock.get_delta(0x0010) - 0.032) < 1e-9
+		assert abs(clock.get_delta(0x0014) - 0.004) < 1e-9
+		# Too long pause
+		assert clock.get_delta(0x2000) == 0.0
@@ -0,0 +1,106 @@
+import glob
+import os
+import shutil
+import tempfile
+import threading
+from xml.etree import ElementTree as ET
+
+from scc.gui.svg_cache import SHAPES, RenderCache, SVGTemplate, get_digest, recolor_style
+
+IMAGES = os.path.join(os.path.dirname(__file__), "..", "images", "controller-images")
+ET.register_namespace("", "http://www.w3.org/2000/svg")
+
+
+def _recolor(svg, buttons):
+	""" Recolors image as SVGWidget did before SVGTemplate was used """
+	def find_by_id(tree, id):
+		for child in tree:
+			if child.attrib.get('id') == id:
+				return child
+			r = find_by_id(child, id)
+			if r is not None:
+				return r
+		return None
+
+	def recolor(element, color):
+		if element.tag.endswith(SHAPES):
+			if 'style' in element.attrib:
+				style = recolor_style(element.attrib['style'], color)
+				if style is not None:
+					element.attrib['style'] = style
+		elif element.tag.endswith("g"):
+			for child in element:
+				recolor(child, color)
+
+	tree = ET.fromstring(svg)
+	for id in buttons:
+		element = find_by_id(tree, id)
+		if element is not None:
+			recolor(element, buttons[id])
+	return ET.tostring(tree)
+
+
+class TestSVGCache:
+
+	def test_template(self):
+		"""
+		Tests that SVGTemplate produces exactly same document
+		as parsing, recoloring and serializing it.
+		"""
+		for filename in glob.glob(os.path.join(IMAGES, "*.svg")):
+			with open(filename, "r") as f:
+				svg = f.read()
+			template = SVGTemplate(svg)
+			assert template.render({}) == _recolor(svg, {})
+			for buttons in (
+					{ "AREA_A": "#FF0000", "AREA_B": "80FF00FF" },
+					{ "A": "00FF00", "LSTICK": "#0000FF", "nonexisting": "#FFFFFF" },
+					{ "LSTICK": "#FF00FF", "LPAD": "00FF00" },
+				):
+				assert template.render(buttons) == _recolor(svg, buttons), filename
+
+
+	def test_render_cache(self):
+		""" Tests storing, loading and removing of rendered images """
+		path = tempfile.mkdtemp()
+		try:
+			cache = RenderCache(path)
+			digest = get_digest("<svg />")
+			assert cache.load(digest, "A:#FF0000", None) is None
+			cache.store(digest, "A:#FF0000", None, b"png")
+			assert cache.load(digest, "A:#FF0000", None) == b"png"
+			assert cache.load(digest, "A:#FF0000", (10, 10)) is None
+			assert RenderCache(path).load(digest, "A:#FF0000", None) == b"png"
+
+			RenderCache.MAX_FILES, max_files = 4, RenderCache.MAX_FILES
+			try:
+				for i in range(10):
+					cache.store(digest, str(i), None, b"png")
+				cache.prune()
+			finally:
+				RenderCache.MAX_FILES = max_files
+			assert len(os.listdir(path)) == 2
+		finally:
+			shutil.rmtree(path)
+
+
+	def test_store_later(self):
+		""" Tests that images are encoded and stored by background thread """
+		path = tempfile.mkdtemp()
+		try:
+			cache = RenderCache(path)
+			digest = get_digest("<svg />")
+			threads = []
+			def encode():
+				threads.append(threading.current_thread())
+				return b"png"
+			cache.store_later(digest, "A:#FF0000", None, encode)
+			cache.store_later(digest, "B:#FF0000", None, lambda: None)
+			cache.store_later(digest, "C:#FF0000", None, lambda: 1 / 0)
+			cache.join()
+			assert threads and threading.current_thread() not in threads
+			assert cache.load(digest, "A:#FF0000", None) == b"png"
+			assert cache.load(digest, "B:#FF0000", None) is None
+			assert cache.load(digest, "C:#FF0000", None) is None
+		finally:
+			shutil.rmtree(path)
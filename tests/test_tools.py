@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from scc import tools
+from scc.tools import load_cache, store_cache, write_atomic
+
+
+class TestTools:
+
+	def setup_method(self):
+		self.dir = tempfile.mkdtemp()
+		self.filename = os.path.join(self.dir, "cache", "test.pickle")
+
+
+	def teardown_method(self):
+		shutil.rmtree(self.dir)
+
+
+	def test_write_atomic_threads(self, monkeypatch):
+		"""
+		Tests that threads writing same file at once don't share temporary
+		file and that no temporary file is left behind.
+		"""
+		barrier = threading.Barrier(2)
+		replaced = []
+		replace = os.replace
+		def fake_replace(tmp, filename):
+			replaced.append(tmp)
+			barrier.wait(timeout=5)
+			replace(tmp, filename)
+		monkeypatch.setattr(os, "replace", fake_replace)
+		threads = [ threading.Thread(target=write_atomic, args=(self.filename, b"data"))
+			for i in range(2) ]
+		for t in threads: t.start()
+		for t in threads: t.join()
+		assert len(set(replaced)) == 2
+		assert os.listdir(os.path.dirname(self.filename)) == [ "test.pickle" ]
+		with open(self.filename, "rb") as f:
+			assert f.read() == b"data"
+
+
+	def test_write_atomic_failure(self, monkeypatch):
+		""" Tests that failed write keeps original file and removes temporary one """
+		write_atomic(self.filename, b"old")
+		def fail(tmp, filename):
+			raise OSError("failed")
+		monkeypatch.setattr(os, "replace", fail)
+		try:
+			write_atomic(self.filename, b"new")
+			assert False, "OSError not raised"
+		except OSError:
+			pass
+		assert os.listdir(os.path.dirname(self.filename)) == [ "test.pickle" ]
+		with open(self.filename, "rb") as f:
+			assert f.read() == b"old"
+
+
+	def test_versioned_cache(self, monkeypatch):
+		""" Tests that cache is ignored when version or daemon version changes """
+		assert load_cache(self.filename, 1) is None
+		assert store_cache(self.filename, 1, { "a": [ 1, 2 ] })
+		assert load_cache(self.filename, 1) == { "a": [ 1, 2 ] }
+		assert load_cache(self.filename, 2) is None
+		monkeypatch.setattr(tools, "DAEMON_VERSION", "0.0")
+		assert load_cache(self.filename, 1) is None
+
+
+	def test_broken_cache(self):
+		""" Tests that broken or unpicklable cache is reported as missing """
+		assert not store_cache(self.filename, 1, lambda: None)
+		assert not os.path.exists(self.filename)
+		write_atomic(self.filename, b"garbage")
+		assert load_cache(self.filename, 1) is None
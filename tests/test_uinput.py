@@ -0,0 +1,95 @@
+import os
+from array import array
+
+from scc.uinput import (_EVENT, _EVENT_OFFSET, _EVENT_SIZE, EV_ABS, EV_KEY,
+	EV_SYN, EVENT_BUFFER_SIZE, Axes, Keys, UInput)
+
+
+class TestUInput:
+	"""
+	Tests event batching. Events are written to pipe instead of
+	uinput device, so they can be read back.
+	"""
+
+	def setup_method(self):
+		self.rfd, self.wfd = os.pipe()
+		os.set_blocking(self.rfd, False)
+		self.dev = UInput.from_fd(self.wfd)
+
+
+	def teardown_method(self):
+		os.close(self.rfd)
+		os.close(self.wfd)
+
+
+	def read_events(self):
+		try:
+			data = os.read(self.rfd, 65536)
+		except BlockingIOError:
+			return []
+		assert len(data) % _EVENT_SIZE == 0
+		return [ _EVENT.unpack_from(data, i + _EVENT_OFFSET)
+			for i in range(0, len(data), _EVENT_SIZE) ]
+
+
+	def test_written_on_syn(self):
+		"""
+		Tests that nothing is written until synEvent is called and that
+		everything is then written at once.
+		"""
+		self.dev.keyEvent(Keys.BTN_A, 1)
+		self.dev.axisEvent(Axes.ABS_X, 100)
+		assert self.read_events() == []
+		self.dev.synEvent()
+		assert self.read_events() == [
+			(EV_KEY, Keys.BTN_A, 1), (EV_ABS, Axes.ABS_X, 100), (EV_SYN, 0, 0) ]
+
+
+	def test_empty_syn(self):
+		""" Tests that syn without events generates nothing """
+		self.dev.synEvent()
+		assert self.read_events() == []
+
+
+	def test_abs_deduplication(self):
+		""" Tests that unchanged axis value is not sent again """
+		self.dev.axisEvent(Axes.ABS_X, 100)
+		self.dev.synEvent()
+		self.read_events()
+		self.dev.axisEvent(Axes.ABS_X, 100)
+		self.dev.synEvent()
+		assert self.read_events() == []
+		self.dev.axisEvent(Axes.ABS_X, 101)
+		self.dev.synEvent()
+		assert self.read_events() == [ (EV_ABS, Axes.ABS_X, 101), (EV_SYN, 0, 0) ]
+
+
+	def test_full_buffer(self):
+		""" Tests that full buffer is written out before syn """
+		for i in range(EVENT_BUFFER_SIZE + 1):
+			self.dev.keyEvent(Keys.BTN_A, i % 2)
+		assert len(self.read_events()) == EVENT_BUFFER_SIZE
+		self.dev.synEvent()
+		assert len(self.read_events()) == 2
+
+
+
+	def test_emit(self):
+		""" Tests writing events from array """
+		self.dev.emit(array("i", [ EV_KEY, Keys.BTN_B, 1, EV_ABS, Axes.ABS_Y, -5 ]))
+		self.dev.synEvent()
+		assert self.read_events() == [
+			(EV_KEY, Keys.BTN_B, 1), (EV_ABS, Axes.ABS_Y, -5), (EV_SYN, 0, 0) ]
+		# Axis value sent by emit is not deduplicated by axisEvent
+		self.dev.axisEvent(Axes.ABS_Y, -5)
+		self.dev.synEvent()
+		assert self.read_events() == [ (EV_ABS, Axes.ABS_Y, -5), (EV_SYN, 0, 0) ]
+
+
+	def test_emit_full_buffer(self):
+		""" Tests that emit writes out full buffer and keeps rest queued """
+		self.dev.keyEvent(Keys.BTN_A, 1)
+		self.dev.emit(array("i", [ EV_KEY, Keys.BTN_B, 1 ] * EVENT_BUFFER_SIZE))
+		assert len(self.read_events()) == EVENT_BUFFER_SIZE
+		self.dev.synEvent()
+		assert self.read_events() == [ (EV_KEY, Keys.BTN_B, 1), (EV_SYN, 0, 0) ]
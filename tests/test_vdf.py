@@ -1,11 +1,46 @@
 import os
+import shutil
+import tempfile
 from io import StringIO
 
 import pytest
 import vdf
 
 from scc.foreign.vdf import VDFProfile
-from scc.lib.vdf import parse_vdf
+from scc.foreign.vdf_index import VdfIndex
+from scc.scripts import cmd_convert_vdf
+from scc.lib.vdf import BLOCK_START, KEY_VALUE, get_vdf_value, iter_vdf, parse_vdf, parse_vdf_block
+
+LOCALCONFIG = """
+"UserLocalConfigStore"
+{
+	"friends"
+	{
+		"1" "2"
+	}
+	"controller_config"
+	{
+		"42"
+		{
+			"controller_steamcontroller_gordon"
+			{
+				"DEFAULT_FOR_TYPE"
+				{
+					"template"
+					{
+						"name" "x"
+					}
+					"440"
+					{
+						"selected" "1234"
+					}
+				}
+			}
+		}
+	}
+	"software" "x"
+}
+"""
 
 
 class TestVDF:
@@ -89,3 +124,91 @@ class TestVDF:
 			filename = os.path.join(path, f)
 			print("Testing import of '%s'" % (filename,))
 			VDFProfile().load(filename)
+
+
+	def test_iter_vdf(self):
+		"""
+		Tests if every *.vdf file in tests/vdfs is read by streaming reader
+		in same way as by parse_vdf.
+		"""
+		path = "tests/vdfs"
+		for f in os.listdir(path):
+			with open(os.path.join(path, f), "r") as file:
+				parsed = parse_vdf(file)
+			with open(os.path.join(path, f), "r") as file:
+				stack = [ vdf.VDFDict() ]
+				for event, key, value in iter_vdf(file):
+					if event == KEY_VALUE:
+						stack[-1][key] = value
+					elif event == BLOCK_START:
+						block = vdf.VDFDict()
+						stack[-1][key] = block
+						stack.append(block)
+					else:
+						stack.pop()
+			assert stack == [ parsed ], f
+
+
+	def test_partial_reading(self):
+		""" Tests reading only single value or block """
+		assert get_vdf_value(StringIO(LOCALCONFIG), "UserLocalConfigStore", "software") == "x"
+		with pytest.raises(KeyError):
+			get_vdf_value(StringIO(LOCALCONFIG), "UserLocalConfigStore", "1")
+		sio = StringIO(LOCALCONFIG)
+		block = parse_vdf_block(sio, "UserLocalConfigStore", "controller_config")
+		assert block["42"]["controller_steamcontroller_gordon"]["DEFAULT_FOR_TYPE"]["440"]["selected"] == "1234"
+		assert sio.readline().strip() == '"software" "x"'
+		with pytest.raises(KeyError):
+			parse_vdf_block(StringIO(LOCALCONFIG), "UserLocalConfigStore", "missing")
+
+
+	def test_index(self):
+		""" Tests that values are remembered and read again when file changes """
+		path = tempfile.mkdtemp()
+		try:
+			localconfig = os.path.join(path, "localconfig.vdf")
+			with open(localconfig, "w") as f:
+				f.write(LOCALCONFIG)
+			index = VdfIndex(os.path.join(path, "index.json"))
+			assert index.get_games(localconfig, "42") == [ ("440", "1234") ]
+			assert index.get_games(localconfig, "43") == []
+			profile = os.path.join("tests/vdfs", "dummy.vdf")
+			title = index.get_profile_title(profile)
+			assert title == parse_vdf(open(profile, "r"))["controller_mappings"]["title"]
+			index.save()
+
+			index = VdfIndex(os.path.join(path, "index.json"))
+			assert index.get_profile_title(profile) == title
+			with open(localconfig, "w") as f:
+				f.write(LOCALCONFIG.replace("1234", "12345"))
+			assert index.get_games(localconfig, "42") == [ ("440", "12345") ]
+			assert index.find_profile("1", lambda x: None) is None
+			assert index.find_profile("1", lambda x: profile) == profile
+			assert index.find_profile("1", lambda x: None) == profile
+		finally:
+			shutil.rmtree(path)
+
+
+	def test_convert(self):
+		"""
+		Tests if every *.vdf file in tests/vdfs is converted by
+		'scc convert-vdf' and if failures are reported.
+		"""
+		path = tempfile.mkdtemp()
+		try:
+			assert cmd_convert_vdf("scc", [ "-j", "2", "-o", path, "tests/vdfs" ]) == 0
+			for f in os.listdir("tests/vdfs"):
+				assert os.path.exists(os.path.join(path, f[0:-4] + ".sccprofile"))
+			broken = os.path.join(path, "broken.vdf")
+			with open(broken, "w") as file:
+				file.write('"controller_mappings" {')
+			assert cmd_convert_vdf("scc", [ "-o", path, broken ]) == 1
+			# Directory is not copied into profiles directory
+			assert cmd_convert_vdf("scc", [ "tests/vdfs" ]) == 1
+			# Two files with same name would overwrite each other
+			os.mkdir(os.path.join(path, "other"))
+			shutil.copy("tests/vdfs/dummy.vdf", os.path.join(path, "other"))
+			assert cmd_convert_vdf("scc", [ "-o", path, "tests/vdfs/dummy.vdf",
+				os.path.join(path, "other", "dummy.vdf") ]) == 1
+		finally:
+			shutil.rmtree(path)